@@ -1,11 +1,16 @@
 import os
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_migrate import Migrate
+from sqlalchemy import inspect
 from app.models import db
 from app.config import config
+from app.jobs import JobQueue
+from app.cache import FragmentCacheExtension
 
 
 migrate = Migrate()
+job_queue = JobQueue()
 
 
 def create_app(config_name='default'):
@@ -13,6 +18,16 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
 
+    # Compiled templates are kept on disk so a restarted worker skips recompiling;
+    # {% cache %} serves pre-rendered fragments keyed by project data version
+    bytecode_dir = os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(bytecode_dir, exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': FileSystemBytecodeCache(bytecode_dir),
+        'extensions': [FragmentCacheExtension]
+    }
+
     # Ensure instance directory exists
     if config_name == 'production':
         instance_path = os.path.join(
@@ -24,6 +39,7 @@ def create_app(config_name='default'):
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    job_queue.init_app(app)
 
     # Register blueprints
     from app.blueprints.main import main_bp
@@ -35,6 +51,8 @@ def create_app(config_name='default'):
     from app.blueprints.reports import reports_bp
     from app.blueprints.projects import projects_bp
     from app.blueprints.loans import loans_bp
+    from app.blueprints.counterparties import counterparties_bp
+    from app.blueprints.recurring import recurring_bp
 
     app.register_blueprint(main_bp, url_prefix='/')
     app.register_blueprint(income_bp, url_prefix='/income')
@@ -45,6 +63,16 @@ def create_app(config_name='default'):
     app.register_blueprint(reports_bp, url_prefix='/reports')
     app.register_blueprint(projects_bp, url_prefix='/projects')
     app.register_blueprint(loans_bp, url_prefix='/loans')
+    app.register_blueprint(counterparties_bp, url_prefix='/counterparties')
+    app.register_blueprint(recurring_bp, url_prefix='/recurring')
+
+    # ETag/Last-Modified on data pages, fingerprinted static URLs
+    from app.http_cache import init_http_cache
+    init_http_cache(app)
+
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
 
     # Register template filters
     from app.utils import format_currency, format_date_ar
@@ -62,13 +90,48 @@ def create_app(config_name='default'):
         return {'current_project': current_project}
 
     # Create database tables and initialize default data
+    from app.search import ensure_search_index
+    from app.counterparties import backfill_counterparties
     with app.app_context():
-        db.create_all()
-        init_default_data()
+        if schema_needs_upgrade():
+            # An existing database behind the models: create_all would pre-create
+            # the tables the pending migrations add, and the backfills read new
+            # columns, so leave everything to `flask db upgrade`
+            app.logger.warning('Database schema is out of date; run `flask db upgrade`')
+        else:
+            db.create_all()
+            ensure_search_index()
+            backfill_counterparties()
+            init_default_data()
 
     return app
 
 
+def start_job_workers(app):
+    """
+    Requeue jobs orphaned by a dead process and resume draining. Called from
+    the server entrypoints only: CLI commands must not touch running jobs.
+    """
+    with app.app_context():
+        if not schema_needs_upgrade():
+            job_queue.recover()
+
+
+def schema_needs_upgrade():
+    """True when the database has tables but lacks some model tables or columns"""
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    if not existing & set(db.metadata.tables):
+        return False  # New database: create_all builds it at head
+    for name, table in db.metadata.tables.items():
+        if name not in existing:
+            return True
+        columns = {column['name'] for column in inspector.get_columns(name)}
+        if not {column.name for column in table.columns} <= columns:
+            return True
+    return False
+
+
 def init_default_data():
     """Initialize default categories, account types, and default project"""
     from app.models import AccountType, IncomeCategory, ExpenseCategory, SystemSetting, Project
@@ -0,0 +1,154 @@
+"""
+Loan amortization and interest accrual, vectorized over all loans at once.
+
+Each unpaid loan's remaining principal is amortized in equal monthly
+installments (annuity at interest_rate / 12) from the current month until the
+month of its due_date. Loans without a due date use LOAN_DEFAULT_TERM_MONTHS.
+Overdue loans fall due in full in the current month. Installment k of every
+loan falls in calendar month (current month + k), so the per-loan matrices add
+up column-wise into a project debt-service schedule.
+"""
+from datetime import date
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app.models import db, Loan, LoanPayment
+
+
+def months_left(due_date, today, default_term):
+    """Number of monthly installments from the current month to the due month"""
+    if due_date is None:
+        return default_term
+    diff = (due_date.year - today.year) * 12 + (due_date.month - today.month)
+    return max(diff + 1, 1)
+
+
+def amortize(principal, annual_rate_pct, months):
+    """
+    Amortize principals (shape L) over `months` installments each.
+    Returns installment (L,) and interest/principal/balance matrices (L, K)
+    where K = max(months); entries past a loan's term are zero.
+    """
+    principal = np.asarray(principal, dtype=float)
+    months = np.asarray(months, dtype=int)
+    rate = np.asarray(annual_rate_pct, dtype=float) / 100 / 12
+
+    has_rate = rate > 0
+    safe_rate = np.where(has_rate, rate, 1.0)
+    annuity_factor = np.where(
+        has_rate, (1 - (1 + safe_rate) ** -months) / safe_rate, months
+    )
+    installment = principal / annuity_factor
+
+    k = np.arange(1, months.max(initial=0) + 1)
+    growth = (1 + rate[:, None]) ** k[None, :]
+    balance = np.where(
+        has_rate[:, None],
+        principal[:, None] * growth - installment[:, None] * (growth - 1) / safe_rate[:, None],
+        principal[:, None] - installment[:, None] * k[None, :]
+    )
+    balance = np.where(k[None, :] >= months[:, None], 0.0, np.maximum(balance, 0.0))
+
+    opening = np.concatenate([principal[:, None], balance[:, :-1]], axis=1)
+    active = k[None, :] <= months[:, None]
+    interest = np.where(active, opening * rate[:, None], 0.0)
+    principal_paid = np.where(active, opening - balance, 0.0)
+
+    return {
+        'installment': installment,
+        'interest': interest,
+        'principal': principal_paid,
+        'balance': balance
+    }
+
+
+def accrued_interest(principal, annual_rate_pct, since_dates, today):
+    """Simple interest accrued on each principal since its last payment"""
+    days = np.array([max((today - d).days, 0) for d in since_dates], dtype=float)
+    return (np.asarray(principal, dtype=float)
+            * np.asarray(annual_rate_pct, dtype=float) / 100 * days / 365)
+
+
+def project_debt_service(loans, last_payment_dates, today=None):
+    """
+    Build per-loan schedules and the combined monthly debt-service schedule.
+    `last_payment_dates` is aligned with `loans` (None when never paid).
+    """
+    today = today or date.today()
+    default_term = current_app.config['LOAN_DEFAULT_TERM_MONTHS']
+
+    principal = [float(loan.remaining_amount or 0) for loan in loans]
+    rates = [float(loan.interest_rate or 0) for loan in loans]
+    terms = [months_left(loan.due_date, today, default_term) for loan in loans]
+    since = [paid or loan.received_date for loan, paid in zip(loans, last_payment_dates)]
+
+    schedule = amortize(principal, rates, terms)
+    accrued = accrued_interest(principal, rates, since, today)
+
+    month_start = today.replace(day=1)
+    months = [month_start + relativedelta(months=i)
+              for i in range(schedule['balance'].shape[1])]
+
+    interest_by_month = schedule['interest'].sum(axis=0)
+    principal_by_month = schedule['principal'].sum(axis=0)
+
+    return {
+        'loans': [
+            {
+                'loan': loan,
+                'installment': float(schedule['installment'][i]),
+                'months_left': terms[i],
+                'accrued_interest': float(accrued[i]),
+                'total_interest': float(schedule['interest'][i].sum())
+            }
+            for i, loan in enumerate(loans)
+        ],
+        'months': months,
+        'schedule': schedule,
+        'interest_by_month': interest_by_month,
+        'principal_by_month': principal_by_month,
+        'payment_by_month': interest_by_month + principal_by_month,
+        'total_accrued_interest': float(accrued.sum()),
+        'total_interest': float(interest_by_month.sum())
+    }
+
+
+def _last_payment_dates():
+    return select(
+        LoanPayment.loan_id,
+        func.max(LoanPayment.payment_date).label('last_payment_date')
+    ).group_by(LoanPayment.loan_id).subquery()
+
+
+def get_project_debt_service(project_id, today=None):
+    """Debt-service projection for every unpaid loan of a project"""
+    last_paid = _last_payment_dates()
+    rows = db.session.query(Loan, last_paid.c.last_payment_date)\
+        .outerjoin(last_paid, last_paid.c.loan_id == Loan.id)\
+        .filter(Loan.project_id == project_id, Loan.is_paid == False)\
+        .order_by(Loan.id).all()
+
+    return project_debt_service([r[0] for r in rows], [r[1] for r in rows], today)
+
+
+def get_loan_schedule(loan, today=None):
+    """Month-by-month amortization rows for a single unpaid loan"""
+    if loan.is_paid:
+        return []
+
+    last_payment_date = db.session.query(func.max(LoanPayment.payment_date))\
+        .filter(LoanPayment.loan_id == loan.id).scalar()
+    projection = project_debt_service([loan], [last_payment_date], today)
+    schedule = projection['schedule']
+
+    return [
+        {
+            'month': month,
+            'payment': float(schedule['interest'][0, i] + schedule['principal'][0, i]),
+            'interest': float(schedule['interest'][0, i]),
+            'principal': float(schedule['principal'][0, i]),
+            'balance': float(schedule['balance'][0, i])
+        }
+        for i, month in enumerate(projection['months'])
+    ]
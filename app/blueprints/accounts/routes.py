@@ -1,6 +1,9 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, current_app
 from app.blueprints.accounts import accounts_bp
-from app.models import db, Account, AccountType, Project
+from app.models import db, Account, AccountType, Project, Transfer
+from app.utils import get_account_statement, format_statement_cursor, parse_statement_cursor
+from app.currency import get_base_currency, get_currencies, get_latest_rates, set_exchange_rate
+from app.transfers import create_transfer, delete_transfer, TransferError
 from datetime import date
 
 
@@ -31,16 +34,22 @@ def add_account():
         name = request.form.get('name', '').strip()
         account_type_id = request.form.get('account_type_id', type=int)
         initial_balance = request.form.get('initial_balance', type=float, default=0.00)
+        currency = request.form.get('currency', '').strip().upper() or get_base_currency()
 
         if not all([name, account_type_id is not None]):
             flash('الاسم ونوع الحساب مطلوبان', 'error')
             return redirect(url_for('accounts.add_account'))
 
+        if len(currency) != 3 or not currency.isalpha():
+            flash('رمز العملة يجب أن يكون 3 أحرف (مثل EGP أو USD)', 'error')
+            return redirect(url_for('accounts.add_account'))
+
         account = Account(
             name=name,
             account_type_id=account_type_id,
             initial_balance=initial_balance,
             current_balance=initial_balance,
+            currency=currency,
             project_id=project_id
         )
 
@@ -51,7 +60,10 @@ def add_account():
         return redirect(url_for('accounts.list_accounts'))
 
     account_types = AccountType.query.all()
-    return render_template('accounts/add.html', account_types=account_types)
+    return render_template('accounts/add.html',
+                         account_types=account_types,
+                         base_currency=get_base_currency(),
+                         currencies=get_currencies())
 
 
 @accounts_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
@@ -101,7 +113,7 @@ def delete_account(id):
 
 @accounts_bp.route('/details/<int:id>')
 def account_details(id):
-    """View account details and transaction history for the selected project"""
+    """View account details and its statement (read-only, keyset-paginated)"""
     project_id = session.get('selected_project_id')
     if not project_id:
         flash('يرجى اختيار مشروع أولاً', 'error')
@@ -111,5 +123,96 @@ def account_details(id):
         id=id,
         project_id=project_id
     ).first_or_404()
-    account.update_balance()
-    return render_template('accounts/details.html', account=account)
+
+    before = parse_statement_cursor(request.args.get('before'))
+    movements, next_cursor = get_account_statement(
+        account, before=before, limit=current_app.config['ITEMS_PER_PAGE']
+    )
+
+    return render_template('accounts/details.html',
+                         account=account,
+                         movements=movements,
+                         is_first_page=before is None,
+                         next_cursor=format_statement_cursor(next_cursor))
+
+
+@accounts_bp.route('/transfers', methods=['GET', 'POST'])
+def transfers():
+    """Transfer cash between accounts of the selected project, and list past transfers"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        from_account_id = request.form.get('from_account_id', type=int)
+        to_account_id = request.form.get('to_account_id', type=int)
+        amount = request.form.get('amount', type=float)
+        transfer_date_str = request.form.get('transfer_date')
+
+        if not all([from_account_id, to_account_id, amount, transfer_date_str]):
+            flash('الحقول المطلوبة: من حساب، إلى حساب، المبلغ، التاريخ', 'error')
+            return redirect(url_for('accounts.transfers'))
+
+        try:
+            create_transfer(project_id, from_account_id, to_account_id, amount,
+                            date.fromisoformat(transfer_date_str),
+                            request.form.get('notes', '').strip() or None)
+        except TransferError as e:
+            flash(str(e), 'error')
+        else:
+            flash('تم التحويل بنجاح وتم تحديث رصيدي الحسابين', 'success')
+        return redirect(url_for('accounts.transfers'))
+
+    accounts = Account.query.filter_by(project_id=project_id, is_active=True).all()
+    transfer_list = Transfer.query.filter_by(project_id=project_id)\
+        .order_by(Transfer.transfer_date.desc(), Transfer.id.desc())\
+        .limit(current_app.config['ITEMS_PER_PAGE']).all()
+
+    return render_template('accounts/transfers.html',
+                         accounts=accounts,
+                         transfers=transfer_list,
+                         today=date.today())
+
+
+@accounts_bp.route('/transfers/delete/<int:id>', methods=['POST'])
+def remove_transfer(id):
+    """Delete a transfer of the selected project and reverse it"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    transfer = Transfer.query.filter_by(id=id, project_id=project_id).first_or_404()
+    try:
+        delete_transfer(transfer)
+    except TransferError as e:
+        flash(str(e), 'error')
+    else:
+        flash('تم حذف التحويل بنجاح', 'success')
+    return redirect(url_for('accounts.transfers'))
+
+
+@accounts_bp.route('/exchange-rates', methods=['GET', 'POST'])
+def exchange_rates():
+    """Latest exchange rates and a form to record a new one"""
+    if request.method == 'POST':
+        currency = request.form.get('currency', '').strip().upper()
+        rate = request.form.get('rate', type=float)
+        rate_date_str = request.form.get('rate_date')
+
+        if len(currency) != 3 or not currency.isalpha() or not rate or rate <= 0:
+            flash('رمز العملة والسعر مطلوبان', 'error')
+            return redirect(url_for('accounts.exchange_rates'))
+
+        rate_date_val = date.fromisoformat(rate_date_str) if rate_date_str else date.today()
+        set_exchange_rate(currency, rate, rate_date_val)
+
+        flash(f'تم حفظ سعر {currency} بتاريخ {rate_date_val:%d/%m/%Y}', 'success')
+        return redirect(url_for('accounts.exchange_rates'))
+
+    return render_template('accounts/exchange_rates.html',
+                         rates=get_latest_rates(),
+                         base_currency=get_base_currency(),
+                         currencies=get_currencies(),
+                         today=date.today())
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+counterparties_bp = Blueprint('counterparties', __name__)
+
+from app.blueprints.counterparties import routes
@@ -0,0 +1,39 @@
+from flask import render_template, request, jsonify
+from app.blueprints.counterparties import counterparties_bp
+from app.models import Counterparty
+from app.counterparties import (
+    get_counterparty_exposure, get_counterparty_activity, search_counterparties
+)
+
+
+@counterparties_bp.route('/')
+def list_counterparties():
+    """Exposure per counterparty across all projects"""
+    q = request.args.get('q', '').strip()
+    exposure = get_counterparty_exposure(prefix=q)
+
+    return render_template('counterparties/list.html',
+                         exposure=exposure,
+                         q=q,
+                         total_owed_to_us=sum(float(r.owed_to_us) for r in exposure),
+                         total_owed_by_us=sum(float(r.owed_by_us) for r in exposure),
+                         total_loans=sum(float(r.loans_outstanding) for r in exposure))
+
+
+@counterparties_bp.route('/<int:id>')
+def counterparty_detail(id):
+    """Debts and loans of one counterparty in every project"""
+    counterparty = Counterparty.query.get_or_404(id)
+    debts, loans = get_counterparty_activity(id)
+
+    return render_template('counterparties/detail.html',
+                         counterparty=counterparty,
+                         debts=debts,
+                         loans=loans)
+
+
+@counterparties_bp.route('/api/autocomplete')
+def autocomplete():
+    """Counterparty names starting with q"""
+    q = request.args.get('q', '').strip()
+    return jsonify([c.name for c in search_counterparties(q)])
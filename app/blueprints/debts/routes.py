@@ -1,6 +1,11 @@
 from flask import render_template, request, redirect, url_for, flash, session
+from sqlalchemy import func
 from app.blueprints.debts import debts_bp
-from app.models import db, Debt, DebtPayment, Account, Project
+from app.models import db, Debt, Account, Project
+from app.jobs import enqueue_balance_update
+from app.period_locks import is_period_locked, LOCKED_PERIOD_MESSAGE
+from app.payments import pay_debt, OverpaymentError
+from app.utils import get_debt_aging, AGING_BUCKETS
 from datetime import date
 
 
@@ -29,8 +34,11 @@ def list_debts():
 
     debts = query.order_by(Debt.due_date.asc()).all()
 
-    total_owed_to_us = sum(float(d.remaining_amount) for d in debts if d.debt_type == 'owed_to_us' and not d.is_paid)
-    total_owed_by_us = sum(float(d.remaining_amount) for d in debts if d.debt_type == 'owed_by_us' and not d.is_paid)
+    # Outstanding totals of the filtered debts, aggregated in SQL from the same query
+    totals = dict(query.with_entities(Debt.debt_type, func.sum(Debt.remaining_amount))
+                  .filter(Debt.is_paid == False).group_by(Debt.debt_type).all())
+    total_owed_to_us = float(totals.get('owed_to_us') or 0)
+    total_owed_by_us = float(totals.get('owed_by_us') or 0)
 
     return render_template('debts/list.html',
                          debts=debts,
@@ -40,6 +48,22 @@ def list_debts():
                          status_filter=status)
 
 
+@debts_bp.route('/aging')
+def aging_report():
+    """Receivables/payables aging: unpaid debts by days past due date"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    aging = get_debt_aging(project_id)
+
+    return render_template('debts/aging.html',
+                         aging=aging,
+                         buckets=AGING_BUCKETS,
+                         today=date.today())
+
+
 @debts_bp.route('/add', methods=['GET', 'POST'])
 def add_debt():
     """Add new debt to the selected project"""
@@ -62,6 +86,11 @@ def add_debt():
 
         due_date_val = date.fromisoformat(due_date_str) if due_date_str else None
 
+        # A new debt is dated today (created_at), which may fall in a locked month
+        if is_period_locked(project_id, date.today()):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('debts.add_debt'))
+
         debt = Debt(
             debt_type=debt_type,
             person_name=person_name,
@@ -74,13 +103,9 @@ def add_debt():
         )
 
         db.session.add(debt)
-        db.session.commit()
-
         # Update account balance (debt affects cash)
-        if account_id:
-            account = Account.query.get(account_id)
-            if account:
-                account.update_balance()
+        enqueue_balance_update(account_id)
+        db.session.commit()
 
         flash('تم إضافة الدين بنجاح وتم تحديث الرصيد', 'success')
         return redirect(url_for('debts.list_debts'))
@@ -103,6 +128,10 @@ def edit_debt(id):
     ).first_or_404()
 
     if request.method == 'POST':
+        if is_period_locked(project_id, debt.created_at):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('debts.list_debts'))
+
         debt.person_name = request.form.get('person_name', '').strip()
         debt.due_date = date.fromisoformat(request.form.get('due_date')) if request.form.get('due_date') else None
         debt.notes = request.form.get('notes', '').strip()
@@ -138,33 +167,17 @@ def record_payment(id):
             flash('المبلغ غير صحيح', 'error')
             return redirect(url_for('debts.record_payment', id=id))
 
-        if amount > float(debt.remaining_amount):
-            flash('المبلغ أكبر من المتبقي من الدين', 'error')
-            return redirect(url_for('debts.record_payment', id=id))
-
         payment_date_val = date.fromisoformat(payment_date_str) if payment_date_str else date.today()
 
-        payment = DebtPayment(
-            debt_id=debt.id,
-            amount=amount,
-            payment_date=payment_date_val,
-            account_id=account_id,
-            notes=notes
-        )
-
-        db.session.add(payment)
-
-        debt.remaining_amount = float(debt.remaining_amount) - amount
-        debt.update_status()
-
-        db.session.commit()
+        if is_period_locked(project_id, payment_date_val):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('debts.record_payment', id=id))
 
-        # Recalculate balance for the payment account
-        if account_id:
-            Account.query.get(account_id).update_balance()
-        # Also recalculate the original debt account if different
-        if debt.account_id and debt.account_id != account_id:
-            Account.query.get(debt.account_id).update_balance()
+        try:
+            pay_debt(debt, amount, account_id, payment_date_val, notes)
+        except OverpaymentError:
+            flash('المبلغ أكبر من المتبقي من الدين', 'error')
+            return redirect(url_for('debts.record_payment', id=id))
 
         flash('تم تسجيل الدفعة بنجاح وتم تحديث الرصيد', 'success')
         return redirect(url_for('debts.list_debts'))
@@ -191,15 +204,14 @@ def delete_debt(id):
         id=id,
         project_id=project_id
     ).first_or_404()
-    account_id = debt.account_id
+    if is_period_locked(project_id, debt.created_at, *[p.payment_date for p in debt.payments]):
+        flash(LOCKED_PERIOD_MESSAGE, 'error')
+        return redirect(url_for('debts.list_debts'))
+    # Recalculate balances after deleting debt + its payments (payments may use other accounts);
+    # collected first, since deleting the debt cascades to its payments
+    enqueue_balance_update(debt.account_id, *[p.account_id for p in debt.payments])
     db.session.delete(debt)
     db.session.commit()
 
-    # Recalculate balance after deleting debt
-    if account_id:
-        account = Account.query.get(account_id)
-        if account:
-            account.update_balance()
-
     flash('تم حذف الدين بنجاح', 'success')
     return redirect(url_for('debts.list_debts'))
@@ -1,6 +1,9 @@
 from flask import render_template, request, redirect, url_for, flash, session
 from app.blueprints.employees import employees_bp
-from app.models import db, Employee, SalaryPayment, ExpenseTransaction, ExpenseCategory, Account, Project
+from app.models import db, Employee, SalaryPayment, ExpenseTransaction, ExpenseCategory, Account, Project, PayrollRun
+from app.payroll import run_payroll
+from app.jobs import enqueue_balance_update
+from app.period_locks import is_period_locked, LOCKED_PERIOD_MESSAGE
 from datetime import date
 
 
@@ -130,6 +133,11 @@ def salary_payment(employee_id):
 
         payment_date_val = date.fromisoformat(payment_date_str) if payment_date_str else date.today()
 
+        # The salary is booked as an expense, so locked months are off limits
+        if is_period_locked(project_id, payment_date_val):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('employees.salary_payment', employee_id=employee_id))
+
         salary_payment_obj = SalaryPayment(
             employee_id=employee_id,
             payment_date=payment_date_val,
@@ -160,10 +168,9 @@ def salary_payment(employee_id):
 
         salary_payment_obj.expense_transaction_id = expense.id
         db.session.add(salary_payment_obj)
+        enqueue_balance_update(account_id)
         db.session.commit()
 
-        Account.query.get(account_id).update_balance()
-
         flash('تم تسجيل صرف الراتب بنجاح', 'success')
         return redirect(url_for('employees.list_employees'))
 
@@ -175,3 +182,70 @@ def salary_payment(employee_id):
                          employee=employee,
                          accounts=accounts,
                          today=date.today())
+
+
+@employees_bp.route('/payroll-run', methods=['GET', 'POST'])
+def payroll_run():
+    """Pay salaries for the selected employees in a single batch"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    employees = Employee.query.filter_by(
+        project_id=project_id,
+        is_active=True
+    ).order_by(Employee.name).all()
+
+    if request.method == 'POST':
+        employee_ids = set(request.form.getlist('employee_ids', type=int))
+        account_id = request.form.get('account_id', type=int)
+        payment_date_str = request.form.get('payment_date')
+        notes = request.form.get('notes', '').strip()
+
+        account = Account.query.filter_by(
+            id=account_id,
+            project_id=project_id
+        ).first() if account_id else None
+
+        entries = [
+            {
+                'employee': employee,
+                'base_salary': request.form.get(f'base_salary_{employee.id}', type=float, default=0.00),
+                'deductions': request.form.get(f'deductions_{employee.id}', type=float, default=0.00),
+                'bonus': request.form.get(f'bonus_{employee.id}', type=float, default=0.00),
+                'commission': request.form.get(f'commission_{employee.id}', type=float, default=0.00)
+            }
+            for employee in employees if employee.id in employee_ids
+        ]
+
+        if not entries or not account:
+            flash('يرجى اختيار موظف واحد على الأقل والحساب', 'error')
+            return redirect(url_for('employees.payroll_run'))
+
+        if any(not e['base_salary'] for e in entries):
+            flash('الراتب الأساسي مطلوب لكل موظف محدد', 'error')
+            return redirect(url_for('employees.payroll_run'))
+
+        payment_date_val = date.fromisoformat(payment_date_str) if payment_date_str else date.today()
+
+        if is_period_locked(project_id, payment_date_val):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('employees.payroll_run'))
+
+        batch = run_payroll(project_id, account.id, payment_date_val, entries, notes)
+
+        flash(f'تم صرف رواتب {batch.employee_count} موظف بإجمالي {batch.total_net:,.2f} (دفعة رقم {batch.id})', 'success')
+        return redirect(url_for('employees.payroll_run'))
+
+    accounts = Account.query.filter_by(
+        project_id=project_id,
+        is_active=True
+    ).all()
+    recent_runs = PayrollRun.query.filter_by(project_id=project_id)\
+        .order_by(PayrollRun.id.desc()).limit(10).all()
+    return render_template('employees/payroll_run.html',
+                         employees=employees,
+                         accounts=accounts,
+                         recent_runs=recent_runs,
+                         today=date.today())
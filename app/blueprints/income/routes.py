@@ -1,6 +1,12 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, current_app
 from app.blueprints.income import income_bp
 from app.models import db, IncomeTransaction, IncomeCategory, Account, Project
+from app.jobs import enqueue_balance_update
+from app.period_locks import is_period_locked, LOCKED_PERIOD_MESSAGE
+from app.utils import (
+    parse_transaction_filters, transaction_filter_conditions,
+    get_transaction_facets, get_filtered_transactions
+)
 from datetime import date
 
 
@@ -12,14 +18,30 @@ def list_income():
         flash('يرجى اختيار مشروع أولاً', 'error')
         return redirect(url_for('main.index'))
 
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['ITEMS_PER_PAGE']
 
-    transactions = IncomeTransaction.query\
-        .filter_by(project_id=project_id)\
-        .order_by(IncomeTransaction.transaction_date.desc())\
-        .paginate(page=page, per_page=20, error_out=False)
+    filters = parse_transaction_filters(IncomeTransaction, request.args)
+    conditions = transaction_filter_conditions(IncomeTransaction, project_id, filters)
 
-    return render_template('income/list.html', transactions=transactions)
+    # Facets and totals come from one grouped query; its count also pages the list
+    summary = get_transaction_facets(IncomeTransaction, conditions, project_id)
+    transactions = get_filtered_transactions(IncomeTransaction, conditions, page, per_page)
+
+    accounts = Account.query.filter_by(project_id=project_id).all()
+    categories = IncomeCategory.query.all()
+
+    filter_args = {k: v for k, v in request.args.items() if k != 'page' and v}
+
+    return render_template('income/list.html',
+                         transactions=transactions,
+                         filters=filters,
+                         filter_args=filter_args,
+                         summary=summary,
+                         accounts=accounts,
+                         categories=categories,
+                         page=page,
+                         pages=max((summary['count'] + per_page - 1) // per_page, 1))
 
 
 @income_bp.route('/add', methods=['GET', 'POST'])
@@ -41,21 +63,24 @@ def add_income():
             flash('جميع الحقول مطلوبة', 'error')
             return redirect(url_for('income.add_income'))
 
+        transaction_date = date.fromisoformat(transaction_date_str)
+        if is_period_locked(project_id, transaction_date):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('income.add_income'))
+
         transaction = IncomeTransaction(
             account_id=account_id,
             category_id=category_id,
             amount=amount,
-            transaction_date=date.fromisoformat(transaction_date_str),
+            transaction_date=transaction_date,
             notes=notes,
             project_id=project_id
         )
 
         db.session.add(transaction)
+        enqueue_balance_update(account_id)
         db.session.commit()
 
-        account = Account.query.get(account_id)
-        account.update_balance()
-
         flash('تم إضافة الدخل بنجاح', 'success')
         return redirect(url_for('income.list_income'))
 
@@ -86,18 +111,20 @@ def edit_income(id):
     old_account_id = transaction.account_id
 
     if request.method == 'POST':
+        transaction_date = date.fromisoformat(request.form.get('transaction_date'))
+        if is_period_locked(project_id, transaction.transaction_date, transaction_date):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('income.list_income'))
+
         transaction.account_id = request.form.get('account_id', type=int)
         transaction.category_id = request.form.get('category_id', type=int)
         transaction.amount = request.form.get('amount', type=float)
-        transaction.transaction_date = date.fromisoformat(request.form.get('transaction_date'))
+        transaction.transaction_date = transaction_date
         transaction.notes = request.form.get('notes', '').strip()
 
+        enqueue_balance_update(old_account_id, transaction.account_id)
         db.session.commit()
 
-        if old_account_id != transaction.account_id:
-            Account.query.get(old_account_id).update_balance()
-        Account.query.get(transaction.account_id).update_balance()
-
         flash('تم تحديث الدخل بنجاح', 'success')
         return redirect(url_for('income.list_income'))
 
@@ -125,12 +152,14 @@ def delete_income(id):
         id=id,
         project_id=project_id
     ).first_or_404()
+    if is_period_locked(project_id, transaction.transaction_date):
+        flash(LOCKED_PERIOD_MESSAGE, 'error')
+        return redirect(url_for('income.list_income'))
     account_id = transaction.account_id
 
     db.session.delete(transaction)
+    enqueue_balance_update(account_id)
     db.session.commit()
 
-    Account.query.get(account_id).update_balance()
-
     flash('تم حذف الدخل بنجاح', 'success')
     return redirect(url_for('income.list_income'))
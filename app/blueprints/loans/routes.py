@@ -1,6 +1,10 @@
 from flask import render_template, request, redirect, url_for, flash, session
 from app.blueprints.loans import loans_bp
 from app.models import db, Loan, LoanPayment, Account, Project
+from app.jobs import enqueue_balance_update
+from app.period_locks import is_period_locked, LOCKED_PERIOD_MESSAGE
+from app.payments import pay_loan as apply_loan_payment, OverpaymentError
+from app.amortization import get_project_debt_service, get_loan_schedule
 from datetime import date
 
 
@@ -27,12 +31,18 @@ def list_loans():
     total_remaining = sum(float(l.remaining_amount) for l in loans if not l.is_paid)
     total_paid = total_loans - total_remaining
 
+    # Projected installments and accrued interest for unpaid loans
+    debt_service = get_project_debt_service(project_id)
+    loan_projections = {p['loan'].id: p for p in debt_service['loans']}
+
     return render_template('loans/list.html',
                          loans=loans,
                          total_loans=total_loans,
                          total_remaining=total_remaining,
                          total_paid=total_paid,
-                         status_filter=status)
+                         status_filter=status,
+                         debt_service=debt_service,
+                         loan_projections=loan_projections)
 
 
 @loans_bp.route('/add', methods=['GET', 'POST'])
@@ -59,6 +69,10 @@ def add_loan():
         received_date_val = date.fromisoformat(received_date_str)
         due_date_val = date.fromisoformat(due_date_str) if due_date_str else None
 
+        if is_period_locked(project_id, received_date_val):
+            flash(LOCKED_PERIOD_MESSAGE, 'error')
+            return redirect(url_for('loans.add_loan'))
+
         # Create the loan
         loan = Loan(
             project_id=project_id,
@@ -74,11 +88,9 @@ def add_loan():
 
         db.session.add(loan)
 
-        db.session.commit()
-
         # CRITICAL: Recalculate account balance (includes loans)
-        account = Account.query.get(account_id)
-        account.update_balance()
+        enqueue_balance_update(account_id)
+        db.session.commit()
 
         flash('تم إضافة القرض بنجاح وتم تحديث رصيد الحساب', 'success')
         return redirect(url_for('loans.list_loans'))
@@ -103,6 +115,7 @@ def loan_detail(id):
 
     loan = Loan.query.filter_by(id=id, project_id=project_id).first_or_404()
     payments = loan.payments.order_by(LoanPayment.payment_date.desc()).all()
+    schedule = get_loan_schedule(loan)
 
     accounts = Account.query.filter_by(
         project_id=project_id,
@@ -112,6 +125,7 @@ def loan_detail(id):
     return render_template('loans/detail.html',
                          loan=loan,
                          payments=payments,
+                         schedule=schedule,
                          accounts=accounts,
                          today=date.today())
 
@@ -135,35 +149,23 @@ def pay_loan(id):
         flash('المبلغ غير صحيح', 'error')
         return redirect(url_for('loans.loan_detail', id=id))
 
-    if amount > float(loan.remaining_amount):
-        flash('المبلغ أكبر من المتبقي من القرض', 'error')
-        return redirect(url_for('loans.loan_detail', id=id))
-
     if not account_id:
         flash('يرجى اختيار حساب الدفع', 'error')
         return redirect(url_for('loans.loan_detail', id=id))
 
     payment_date_val = date.fromisoformat(payment_date_str) if payment_date_str else date.today()
 
-    # Create loan payment record
-    payment = LoanPayment(
-        loan_id=loan.id,
-        amount=amount,
-        payment_date=payment_date_val,
-        account_id=account_id,
-        notes=notes
-    )
-    db.session.add(payment)
-
-    # Decrease remaining amount on loan
-    loan.remaining_amount = float(loan.remaining_amount) - amount
-    loan.update_status()
-
-    db.session.commit()
+    if is_period_locked(project_id, payment_date_val):
+        flash(LOCKED_PERIOD_MESSAGE, 'error')
+        return redirect(url_for('loans.loan_detail', id=id))
 
-    # CRITICAL: Recalculate account balance (includes loan payments)
-    account = Account.query.get(account_id)
-    account.update_balance()
+    # Decrease remaining amount and record the payment atomically; the
+    # paying account is rebalanced (loan payments are cash out)
+    try:
+        apply_loan_payment(loan, amount, account_id, payment_date_val, notes)
+    except OverpaymentError:
+        flash('المبلغ أكبر من المتبقي من القرض', 'error')
+        return redirect(url_for('loans.loan_detail', id=id))
 
     flash('تم تسجيل دفعة القرض بنجاح', 'success')
     return redirect(url_for('loans.loan_detail', id=id))
@@ -179,18 +181,14 @@ def delete_loan(id):
 
     loan = Loan.query.filter_by(id=id, project_id=project_id).first_or_404()
 
-    # Reverse the account balance effect (subtract the original amount, add back payments)
-    total_payments = sum(float(p.amount) for p in loan.payments.all())
-    net_effect = float(loan.amount) - total_payments  # what's still in the account from this loan
+    if is_period_locked(project_id, loan.received_date, *[p.payment_date for p in loan.payments]):
+        flash(LOCKED_PERIOD_MESSAGE, 'error')
+        return redirect(url_for('loans.loan_detail', id=id))
 
-    account_id = loan.account_id
+    # Recalculate balances after deleting loan + its payments (payments may use other accounts)
+    enqueue_balance_update(loan.account_id, *[p.account_id for p in loan.payments])
     db.session.delete(loan)
     db.session.commit()
 
-    # Recalculate account balance after deleting loan + its payments
-    account = Account.query.get(account_id)
-    if account:
-        account.update_balance()
-
     flash('تم حذف القرض بنجاح', 'success')
     return redirect(url_for('loans.list_loans'))
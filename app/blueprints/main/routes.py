@@ -1,4 +1,4 @@
-from flask import render_template, request, redirect, url_for, session
+from flask import render_template, request, redirect, url_for, session, jsonify, flash, current_app
 from datetime import date
 from dateutil.relativedelta import relativedelta
 from sqlalchemy import func
@@ -6,23 +6,32 @@ from app.blueprints.main import main_bp
 from app.models import (
     db, Account, Project, Loan, LoanPayment, ExpenseTransaction, IncomeTransaction
 )
+from app.amortization import get_project_debt_service
+from app.forecast import get_runway_forecast
+from app.cache import cached_for_project
+from app.http_cache import cross_project
+from app.kpi_snapshots import get_today_kpis
+from app.budgets import get_budget_alerts
+from app.search import search_notes
 from app.utils import (
     get_date_range_filter, calculate_total_income, calculate_total_expenses,
     calculate_profit_loss, calculate_total_balance, get_upcoming_debts,
-    get_project_summary
+    get_project_summary, get_debt_warning_days, get_due_calendar
 )
 
 
 @main_bp.route('/')
+@cross_project
 def index():
     """Landing page - show all projects as cards"""
     projects = Project.query.filter_by(is_active=True)\
         .order_by(Project.created_at.desc()).all()
 
-    # Get summary for each project
+    # Get summary for each project (recomputed only when its data changed)
     project_data = []
     for project in projects:
-        summary = get_project_summary(project.id)
+        summary = cached_for_project(project.id, 'project_summary',
+                                     lambda: get_project_summary(project.id))
         project_data.append({
             'project': project,
             'summary': summary
@@ -62,8 +71,9 @@ def project_dashboard(project_id):
     total_expenses = calculate_total_expenses(start_date, end_date, account_id, project_id=project_id)
     profit_loss = calculate_profit_loss(start_date, end_date, account_id, project_id=project_id)
 
-    # Get upcoming debts for this project
-    upcoming_debts = get_upcoming_debts(days=7, project_id=project_id)
+    # Get upcoming debts for this project (configured warning window)
+    warning_days = get_debt_warning_days()
+    upcoming_debts = get_upcoming_debts(days=warning_days, project_id=project_id)
 
     # Get accounts for this project only
     accounts = Account.query.filter_by(
@@ -95,12 +105,12 @@ def project_dashboard(project_id):
     )
     total_loan_debt = float(total_loan_debt_query.scalar() or 0)
 
-    # Upcoming loan payments (loans due within 30 days)
+    # Upcoming loan payments (loans due within the warning window)
     upcoming_loans = Loan.query.filter(
         Loan.project_id == project_id,
         Loan.is_paid == False,
         Loan.due_date.isnot(None),
-        Loan.due_date <= date.today() + relativedelta(days=30),
+        Loan.due_date <= date.today() + relativedelta(days=warning_days),
         Loan.due_date >= date.today()
     ).order_by(Loan.due_date).all()
 
@@ -116,43 +126,22 @@ def project_dashboard(project_id):
         project_id=project_id, is_paid=False
     ).count()
 
-    # === KPIs ===
-    today = date.today()
-    six_months_ago = today - relativedelta(months=6)
+    # Projected debt service (installments + interest) over the next 12 months
+    debt_service = get_project_debt_service(project_id)
+    next_month_debt_service = float(debt_service['payment_by_month'][:1].sum())
+    year_debt_service = float(debt_service['payment_by_month'][:12].sum())
 
-    # Burn Rate (avg monthly operating expenses, last 6 months)
-    recent_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.transaction_date >= six_months_ago,
-        ExpenseTransaction.transaction_date <= today
-    )
-    recent_expenses = float(recent_expenses_query.scalar() or 0)
-
-    months_query = db.session.query(
-        func.distinct(func.strftime('%Y-%m', ExpenseTransaction.transaction_date))
-    ).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.transaction_date >= six_months_ago,
-        ExpenseTransaction.transaction_date <= today
-    )
-    months_with_data = months_query.count() or 1
-    burn_rate = recent_expenses / months_with_data
+    # === KPIs (today's snapshot, recomputed only after data changes) ===
+    kpi_snapshot = get_today_kpis(project)
+    burn_rate = float(kpi_snapshot.burn_rate)
+    gross_margin_pct = float(kpi_snapshot.gross_margin_pct)
 
-    # Runway
+    # Runway against the (possibly account-filtered) balance shown above
     runway_months = (total_balance / burn_rate) if burn_rate > 0 else float('inf')
+    runway_forecast = get_runway_forecast(project_id)
 
-    # Gross Margin (all time)
-    all_income = calculate_total_income(project_id=project_id)
-    direct_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.is_direct_cost == True
-    )
-    direct_costs = float(direct_costs_query.scalar() or 0)
-    gross_profit = all_income - direct_costs
-    gross_margin_pct = (gross_profit / all_income * 100) if all_income > 0 else 0
+    # Budget burn for the current month (one grouped query for all categories)
+    budget_alerts = get_budget_alerts(project_id)
 
     return render_template('main/dashboard.html',
                          project=project,
@@ -175,10 +164,100 @@ def project_dashboard(project_id):
                          upcoming_loans=upcoming_loans,
                          overdue_loans=overdue_loans,
                          active_loans_count=active_loans_count,
+                         next_month_debt_service=next_month_debt_service,
+                         year_debt_service=year_debt_service,
+                         accrued_loan_interest=debt_service['total_accrued_interest'],
                          # KPIs
                          burn_rate=burn_rate,
                          runway_months=runway_months,
-                         gross_margin_pct=gross_margin_pct)
+                         runway_forecast=runway_forecast,
+                         gross_margin_pct=gross_margin_pct,
+                         budget_alerts=budget_alerts)
+
+
+def _calendar_days():
+    """Calendar horizon from the query string, clamped to 1..365 days (None for the default)"""
+    days = request.args.get('days', type=int)
+    if days is None:
+        return None
+    return min(max(days, 1), 365)
+
+
+@main_bp.route('/calendar')
+@cross_project
+def due_calendar():
+    """Agenda of overdue and upcoming debt and loan obligations across all projects"""
+    days = _calendar_days()
+    obligations = get_due_calendar(days=days)
+
+    return render_template('main/calendar.html',
+                         obligations=obligations,
+                         days=days if days is not None else get_debt_warning_days(),
+                         today=date.today())
+
+
+@main_bp.route('/api/calendar')
+@cross_project
+def due_calendar_api():
+    """JSON variant of the due-date calendar"""
+    days = _calendar_days()
+    obligations = get_due_calendar(days=days)
+
+    return jsonify([
+        dict(o, due_date=o['due_date'].isoformat()) for o in obligations
+    ])
+
+
+@main_bp.route('/search')
+def search():
+    """Ranked full-text search over notes in the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['ITEMS_PER_PAGE']
+
+    results, total = search_notes(project_id, query, page=page, per_page=per_page)
+
+    return render_template('main/search.html',
+                         query=query,
+                         results=results,
+                         total=total,
+                         page=page,
+                         pages=(total + per_page - 1) // per_page)
+
+
+@main_bp.route('/api/search')
+def search_api():
+    """JSON variant of the notes search"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        return jsonify({'error': 'no project selected'}), 400
+
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['ITEMS_PER_PAGE']
+
+    results, total = search_notes(project_id, query, page=page, per_page=per_page)
+
+    return jsonify({
+        'query': query,
+        'page': page,
+        'total': total,
+        'results': [
+            {
+                'kind': r['kind'],
+                'id': r['id'],
+                'date': r['date'].isoformat() if r['date'] else None,
+                'amount': r['amount'],
+                'snippet': str(r['snippet'])
+            }
+            for r in results
+        ]
+    })
 
 
 @main_bp.route('/dashboard')
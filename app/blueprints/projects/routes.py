@@ -2,6 +2,11 @@ from flask import render_template, request, redirect, url_for, flash, session
 from app.blueprints.projects import projects_bp
 from app.models import db, Project
 from app.utils import get_project_summary
+from app.period_locks import (
+    get_period_locks, lock_period, unlock_period, month_start, PeriodLockError
+)
+from datetime import date
+from dateutil.relativedelta import relativedelta
 
 
 @projects_bp.route('/')
@@ -131,3 +136,56 @@ def change_pin(id):
         return redirect(url_for('main.project_dashboard', project_id=id))
     
     return render_template('projects/change_pin.html', project=project)
+
+
+@projects_bp.route('/period-locks')
+def period_locks():
+    """Locked months of the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    return render_template('projects/period_locks.html',
+                         locks=get_period_locks(project_id),
+                         last_month=month_start(date.today()) - relativedelta(months=1))
+
+
+@projects_bp.route('/period-locks/lock', methods=['POST'])
+def lock_month():
+    """Lock a finished month of the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    try:
+        month = date.fromisoformat(request.form.get('month', '') + '-01')
+        lock_period(project_id, month)
+    except PeriodLockError:
+        flash('لا يمكن إقفال هذا الشهر (لم ينته بعد أو مقفل مسبقاً)', 'error')
+    except ValueError:
+        flash('الشهر غير صحيح', 'error')
+    else:
+        flash(f'تم إقفال شهر {month:%Y-%m}', 'success')
+    return redirect(url_for('projects.period_locks'))
+
+
+@projects_bp.route('/period-locks/unlock', methods=['POST'])
+def unlock_month():
+    """Unlock a month of the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    try:
+        month = date.fromisoformat(request.form.get('month', ''))
+        unlock_period(project_id, month)
+    except PeriodLockError:
+        flash('هذا الشهر غير مقفل', 'error')
+    except ValueError:
+        flash('الشهر غير صحيح', 'error')
+    else:
+        flash(f'تم فتح شهر {month:%Y-%m}', 'success')
+    return redirect(url_for('projects.period_locks'))
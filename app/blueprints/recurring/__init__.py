@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+recurring_bp = Blueprint('recurring', __name__)
+
+from app.blueprints.recurring import routes
@@ -0,0 +1,138 @@
+from flask import render_template, request, redirect, url_for, flash, session
+from app.blueprints.recurring import recurring_bp
+from app.models import db, RecurringTransaction, Account, IncomeCategory, ExpenseCategory
+from app.recurring import FREQUENCIES, FREQUENCY_LABELS, materialize_recurring, resume_template
+from datetime import date
+
+
+@recurring_bp.route('/')
+def list_recurring():
+    """List recurring income/expense templates of the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    templates = RecurringTransaction.query.filter_by(project_id=project_id)\
+        .order_by(RecurringTransaction.is_active.desc(), RecurringTransaction.next_date).all()
+    category_names = {
+        'income': dict(db.session.query(IncomeCategory.id, IncomeCategory.name_ar)),
+        'expense': dict(db.session.query(ExpenseCategory.id, ExpenseCategory.name_ar))
+    }
+
+    return render_template('recurring/list.html',
+                         templates=templates,
+                         category_names=category_names,
+                         frequency_labels=FREQUENCY_LABELS,
+                         today=date.today())
+
+
+@recurring_bp.route('/add', methods=['GET', 'POST'])
+def add_recurring():
+    """Add a recurring income/expense template to the selected project"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        kind, _, category_id = request.form.get('category', '').partition(':')
+        account_id = request.form.get('account_id', type=int)
+        amount = request.form.get('amount', type=float)
+        frequency = request.form.get('frequency')
+        start_date_str = request.form.get('start_date')
+        end_date_str = request.form.get('end_date')
+
+        if kind not in ('income', 'expense') or not category_id.isdigit() \
+                or not all([account_id, amount, start_date_str]) or frequency not in FREQUENCIES:
+            flash('الحقول المطلوبة: الفئة، الحساب، المبلغ، التكرار، تاريخ البدء', 'error')
+            return redirect(url_for('recurring.add_recurring'))
+
+        start_date_val = date.fromisoformat(start_date_str)
+        end_date_val = date.fromisoformat(end_date_str) if end_date_str else None
+        if end_date_val and end_date_val < start_date_val:
+            flash('تاريخ الانتهاء يجب أن يكون بعد تاريخ البدء', 'error')
+            return redirect(url_for('recurring.add_recurring'))
+
+        Account.query.filter_by(id=account_id, project_id=project_id).first_or_404()
+
+        template = RecurringTransaction(
+            project_id=project_id,
+            kind=kind,
+            account_id=account_id,
+            category_id=int(category_id),
+            amount=amount,
+            frequency=frequency,
+            start_date=start_date_val,
+            end_date=end_date_val,
+            next_date=start_date_val,
+            phase=request.form.get('phase', 'operating'),
+            is_direct_cost=request.form.get('is_direct_cost') == 'on',
+            notes=request.form.get('notes', '').strip()
+        )
+        db.session.add(template)
+        db.session.commit()
+
+        flash('تم إضافة المعاملة المتكررة بنجاح', 'success')
+        return redirect(url_for('recurring.list_recurring'))
+
+    accounts = Account.query.filter_by(project_id=project_id, is_active=True).all()
+    income_categories = IncomeCategory.query.filter_by(is_active=True).all()
+    expense_categories = ExpenseCategory.query.filter_by(is_active=True).all()
+
+    return render_template('recurring/add.html',
+                         accounts=accounts,
+                         income_categories=income_categories,
+                         expense_categories=expense_categories,
+                         frequency_labels=FREQUENCY_LABELS,
+                         today=date.today())
+
+
+@recurring_bp.route('/toggle/<int:id>', methods=['POST'])
+def toggle_recurring(id):
+    """Pause a template, or resume it from its next occurrence on or after today"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    template = RecurringTransaction.query.filter_by(id=id, project_id=project_id).first_or_404()
+    if template.is_active:
+        template.is_active = False
+    else:
+        resume_template(template)
+    db.session.commit()
+
+    flash('تم تحديث حالة المعاملة المتكررة', 'success')
+    return redirect(url_for('recurring.list_recurring'))
+
+
+@recurring_bp.route('/delete/<int:id>', methods=['POST'])
+def delete_recurring(id):
+    """Delete a template; transactions it already created are kept"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    template = RecurringTransaction.query.filter_by(id=id, project_id=project_id).first_or_404()
+    db.session.delete(template)
+    db.session.commit()
+
+    flash('تم حذف المعاملة المتكررة بنجاح', 'success')
+    return redirect(url_for('recurring.list_recurring'))
+
+
+@recurring_bp.route('/run', methods=['POST'])
+def run_recurring():
+    """Create the selected project's due occurrences now instead of waiting for the scheduler"""
+    project_id = session.get('selected_project_id')
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
+
+    created, skipped = materialize_recurring(project_id=project_id)
+    flash(f'تم إنشاء {created} معاملة مستحقة', 'success')
+    if skipped:
+        flash(f'تم تخطي {skipped} معاملة في فترات مقفلة', 'warning')
+    return redirect(url_for('recurring.list_recurring'))
@@ -1,16 +1,24 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, make_response
 from app.blueprints.reports import reports_bp
 from datetime import date, datetime
-from dateutil.relativedelta import relativedelta
 from sqlalchemy import func
 from app.models import (
-    db, Project, IncomeTransaction, ExpenseTransaction, Account,
-    Loan, LoanPayment, Debt
+    db, Project, IncomeTransaction, ExpenseTransaction, ExpenseCategory, Account,
+    Loan, LoanPayment
+)
+from app.consolidation import get_consolidated_statements
+from app.cache import cached_global
+from app.payroll import get_payroll_by_month, get_payroll_by_employee
+from app.http_cache import cross_project
+from app.report_jobs import get_report_result, request_report, get_report_job_status
+from app.kpi_snapshots import KPI_FIELDS, get_kpi_trend, trend_chart
+from app.budgets import get_budget_report, set_budget
+from app.currency import (
+    get_base_currency, get_currencies, missing_rates, conversion_target, converted
 )
 from app.utils import (
     get_date_range_filter, calculate_total_income, calculate_total_expenses,
-    calculate_profit_loss, calculate_equity, get_income_by_category, get_expense_by_category,
-    calculate_total_balance
+    calculate_profit_loss, calculate_equity, get_income_by_category, get_expense_by_category
 )
 
 
@@ -22,6 +30,20 @@ def _get_project_id():
     return project_id
 
 
+def _get_currency():
+    """Reporting currency from the query string (None means the base currency)"""
+    currency = request.args.get('currency', '').strip().upper()
+    return currency or None
+
+
+def _currency_context(project_id, currency):
+    return {
+        'report_currency': currency or get_base_currency(),
+        'currencies': get_currencies(),
+        'missing_rates': missing_rates(project_id, currency)
+    }
+
+
 @reports_bp.route('/profit-loss')
 def profit_loss():
     """Enhanced Profit & Loss statement - excludes building phase expenses and loans"""
@@ -41,48 +63,33 @@ def profit_loss():
 
     start_date, end_date = get_date_range_filter(period, custom_start, custom_end)
 
+    currency = _get_currency()
+
     # Operating Revenue (all income)
-    total_income = calculate_total_income(start_date, end_date, project_id=project_id)
+    total_income = calculate_total_income(start_date, end_date, project_id=project_id, currency=currency)
 
     # Direct Costs (operating phase, is_direct_cost=True)
-    direct_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.is_direct_cost == True,
-        ExpenseTransaction.transaction_date >= start_date,
-        ExpenseTransaction.transaction_date <= end_date
-    )
-    direct_costs = float(direct_costs_query.scalar() or 0)
+    direct_costs = calculate_total_expenses(start_date, end_date, project_id=project_id, currency=currency,
+                                            phase='operating', is_direct_cost=True)
 
     # Gross Profit
     gross_profit = total_income - direct_costs
     gross_margin_pct = (gross_profit / total_income * 100) if total_income > 0 else 0
 
     # Operating Expenses (operating phase, NOT direct cost)
-    operating_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.is_direct_cost == False,
-        ExpenseTransaction.transaction_date >= start_date,
-        ExpenseTransaction.transaction_date <= end_date
-    )
-    operating_expenses = float(operating_expenses_query.scalar() or 0)
+    operating_expenses = calculate_total_expenses(start_date, end_date, project_id=project_id, currency=currency,
+                                                  phase='operating', is_direct_cost=False)
 
     # Net Profit (Operating Revenue - Direct Costs - Operating Expenses)
     net_profit = gross_profit - operating_expenses
     net_margin_pct = (net_profit / total_income * 100) if total_income > 0 else 0
 
     # Building phase expenses (shown as info, NOT included in P&L)
-    building_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'building',
-        ExpenseTransaction.transaction_date >= start_date,
-        ExpenseTransaction.transaction_date <= end_date
-    )
-    building_expenses = float(building_expenses_query.scalar() or 0)
+    building_expenses = calculate_total_expenses(start_date, end_date, project_id=project_id, currency=currency,
+                                                 phase='building')
 
     # Income by category
-    income_by_category = get_income_by_category(start_date, end_date, project_id=project_id)
+    income_by_category = get_income_by_category(start_date, end_date, project_id=project_id, currency=currency)
 
     return render_template('reports/profit_loss.html',
                          total_income=total_income,
@@ -96,7 +103,8 @@ def profit_loss():
                          income_by_category=income_by_category,
                          start_date=start_date,
                          end_date=end_date,
-                         selected_period=period)
+                         selected_period=period,
+                         **_currency_context(project_id, currency))
 
 
 @reports_bp.route('/cash-flow')
@@ -118,12 +126,19 @@ def cash_flow():
 
     start_date, end_date = get_date_range_filter(period, custom_start, custom_end)
 
+    currency = _get_currency()
+    target = conversion_target(project_id, currency)
+
     # === CASH IN ===
     # Operating income
-    income_total = calculate_total_income(start_date, end_date, project_id=project_id)
+    income_total = calculate_total_income(start_date, end_date, project_id=project_id, currency=currency)
 
     # Loans received
-    loans_received_query = db.session.query(func.sum(Loan.amount)).filter(
+    loan_amount = Loan.amount
+    if target:
+        loan_amount = converted(Loan.amount, Account.currency, Loan.received_date, target)
+    loans_received_query = db.session.query(func.sum(loan_amount))\
+        .join(Account, Account.id == Loan.account_id).filter(
         Loan.project_id == project_id,
         Loan.received_date >= start_date,
         Loan.received_date <= end_date
@@ -134,10 +149,14 @@ def cash_flow():
 
     # === CASH OUT ===
     # All expenses (including building phase)
-    expenses_total = calculate_total_expenses(start_date, end_date, project_id=project_id)
+    expenses_total = calculate_total_expenses(start_date, end_date, project_id=project_id, currency=currency)
 
     # Loan payments
-    loan_payments_query = db.session.query(func.sum(LoanPayment.amount)).join(Loan).filter(
+    payment_amount = LoanPayment.amount
+    if target:
+        payment_amount = converted(LoanPayment.amount, Account.currency, LoanPayment.payment_date, target)
+    loan_payments_query = db.session.query(func.sum(payment_amount)).join(Loan)\
+        .join(Account, Account.id == LoanPayment.account_id).filter(
         Loan.project_id == project_id,
         LoanPayment.payment_date >= start_date,
         LoanPayment.payment_date <= end_date
@@ -159,7 +178,8 @@ def cash_flow():
                          net_cash_flow=net_cash_flow,
                          start_date=start_date,
                          end_date=end_date,
-                         selected_period=period)
+                         selected_period=period,
+                         **_currency_context(project_id, currency))
 
 
 @reports_bp.route('/income-summary')
@@ -181,15 +201,17 @@ def income_summary():
 
     start_date, end_date = get_date_range_filter(period, custom_start, custom_end)
 
-    income_by_category = get_income_by_category(start_date, end_date, project_id=project_id)
-    total_income = calculate_total_income(start_date, end_date, project_id=project_id)
+    currency = _get_currency()
+    income_by_category = get_income_by_category(start_date, end_date, project_id=project_id, currency=currency)
+    total_income = calculate_total_income(start_date, end_date, project_id=project_id, currency=currency)
 
     return render_template('reports/income_summary.html',
                          income_by_category=income_by_category,
                          total_income=total_income,
                          start_date=start_date,
                          end_date=end_date,
-                         selected_period=period)
+                         selected_period=period,
+                         **_currency_context(project_id, currency))
 
 
 @reports_bp.route('/expense-summary')
@@ -211,20 +233,21 @@ def expense_summary():
 
     start_date, end_date = get_date_range_filter(period, custom_start, custom_end)
 
-    expense_by_category = get_expense_by_category(start_date, end_date, project_id=project_id)
-    total_expenses = calculate_total_expenses(start_date, end_date, project_id=project_id)
+    currency = _get_currency()
+    expense_by_category = get_expense_by_category(start_date, end_date, project_id=project_id, currency=currency)
+    total_expenses = calculate_total_expenses(start_date, end_date, project_id=project_id, currency=currency)
 
     return render_template('reports/expense_summary.html',
                          expense_by_category=expense_by_category,
                          total_expenses=total_expenses,
                          start_date=start_date,
                          end_date=end_date,
-                         selected_period=period)
+                         selected_period=period,
+                         **_currency_context(project_id, currency))
 
 
-@reports_bp.route('/equity')
-def equity():
-    """Enhanced Equity Report: Owner Capital + Retained Earnings - Liabilities"""
+def _render_report(report, template, title, extra_context=None):
+    """Render a stored report result, or queue its computation and show the job page"""
     project_id = _get_project_id()
     if not project_id:
         flash('يرجى اختيار مشروع أولاً', 'error')
@@ -232,222 +255,145 @@ def equity():
 
     project = Project.query.get_or_404(project_id)
 
-    # Owner Capital
-    owner_capital = float(project.owner_capital or 0)
+    result = get_report_result(project_id, report)
+    if result is not None:
+        if extra_context:
+            result.update(extra_context(project_id))
+        return render_template(template, project=project, **result)
 
-    # Total income (all time)
-    total_income = calculate_total_income(project_id=project_id)
+    job_id = request_report(project_id, report)
+    response = make_response(render_template('reports/job_pending.html',
+                                             project=project, job_id=job_id, title=title))
+    response.cache_control.no_store = True
+    return response
 
-    # Total operating expenses (all time, operating phase only)
-    operating_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating'
-    )
-    total_operating_expenses = float(operating_expenses_query.scalar() or 0)
-
-    # Retained Earnings = Total Income - Total Operating Expenses
-    retained_earnings = total_income - total_operating_expenses
 
-    # Building costs (investment)
-    building_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'building'
-    )
-    building_costs = float(building_costs_query.scalar() or 0)
-
-    # Liabilities: Unpaid loans + Debts owed by us
-    unpaid_loans_query = db.session.query(func.sum(Loan.remaining_amount)).filter(
-        Loan.project_id == project_id,
-        Loan.is_paid == False
-    )
-    unpaid_loans = float(unpaid_loans_query.scalar() or 0)
-
-    debts_by_us_query = db.session.query(func.sum(Debt.remaining_amount)).filter(
-        Debt.project_id == project_id,
-        Debt.debt_type == 'owed_by_us',
-        Debt.is_paid == False
-    )
-    debts_by_us = float(debts_by_us_query.scalar() or 0)
-
-    total_liabilities = unpaid_loans + debts_by_us
-
-    # Assets: Account balances + Debts owed to us
-    total_balance = calculate_total_balance(project_id=project_id)
-    debts_to_us_query = db.session.query(func.sum(Debt.remaining_amount)).filter(
-        Debt.project_id == project_id,
-        Debt.debt_type == 'owed_to_us',
-        Debt.is_paid == False
-    )
-    debts_to_us = float(debts_to_us_query.scalar() or 0)
-    total_assets = total_balance + debts_to_us
-
-    # Net Project Value = Owner Capital + Retained Earnings - Liabilities
-    net_project_value = owner_capital + retained_earnings - total_liabilities
-
-    return render_template('reports/equity.html',
-                         project=project,
-                         owner_capital=owner_capital,
-                         retained_earnings=retained_earnings,
-                         building_costs=building_costs,
-                         unpaid_loans=unpaid_loans,
-                         debts_by_us=debts_by_us,
-                         total_liabilities=total_liabilities,
-                         total_assets=total_assets,
-                         debts_to_us=debts_to_us,
-                         total_balance=total_balance,
-                         net_project_value=net_project_value)
+@reports_bp.route('/equity')
+def equity():
+    """Enhanced Equity Report: Owner Capital + Retained Earnings - Liabilities"""
+    return _render_report('equity', 'reports/equity.html', 'تقرير حقوق الملكية')
 
 
 @reports_bp.route('/roi')
 def roi_report():
     """ROI Report: Total Investment | Net Profit | ROI %"""
-    project_id = _get_project_id()
-    if not project_id:
-        flash('يرجى اختيار مشروع أولاً', 'error')
-        return redirect(url_for('main.index'))
+    return _render_report('roi', 'reports/roi.html', 'تقرير العائد على الاستثمار')
 
-    project = Project.query.get_or_404(project_id)
 
-    # Owner Capital
-    owner_capital = float(project.owner_capital or 0)
+@reports_bp.route('/kpis')
+def kpis():
+    """KPIs Dashboard"""
+    def trends(project_id):
+        trend = get_kpi_trend(project_id)
+        return {
+            'kpi_trend': trend,
+            'trend_charts': {field: trend_chart(trend, field) for field in KPI_FIELDS}
+        }
 
-    # Building costs
-    building_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'building'
-    )
-    building_costs = float(building_costs_query.scalar() or 0)
+    return _render_report('kpis', 'reports/kpis.html', 'مؤشرات الأداء', trends)
 
-    # Total Investment = Owner Capital + Building Costs
-    total_investment = owner_capital + building_costs
 
-    # Total income (all time)
-    total_income = calculate_total_income(project_id=project_id)
+@reports_bp.route('/jobs/<int:job_id>')
+def report_job_status(job_id):
+    """Polled by the job page until the report result is stored"""
+    response = jsonify(get_report_job_status(job_id))
+    response.cache_control.no_store = True
+    return response
 
-    # Operating expenses (all time)
-    operating_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating'
-    )
-    total_operating_expenses = float(operating_expenses_query.scalar() or 0)
 
-    # Net Profit = Total Income - Operating Expenses
-    net_profit = total_income - total_operating_expenses
+@reports_bp.route('/consolidated')
+@cross_project
+def consolidated():
+    """Consolidated statements: all projects side by side plus the combined totals"""
+    period = request.args.get('period', 'month')
+    custom_start = request.args.get('start_date')
+    custom_end = request.args.get('end_date')
 
-    # ROI % = (Net Profit / Total Investment) × 100
-    roi_pct = (net_profit / total_investment * 100) if total_investment > 0 else 0
+    if custom_start:
+        custom_start = date.fromisoformat(custom_start)
+    if custom_end:
+        custom_end = date.fromisoformat(custom_end)
 
-    return render_template('reports/roi.html',
-                         project=project,
-                         owner_capital=owner_capital,
-                         building_costs=building_costs,
-                         total_investment=total_investment,
-                         total_income=total_income,
-                         total_operating_expenses=total_operating_expenses,
-                         net_profit=net_profit,
-                         roi_pct=roi_pct)
+    start_date, end_date = get_date_range_filter(period, custom_start, custom_end)
 
+    # Recomputed only when some project's data changed, and at least daily
+    # (burn rate and outstanding balances are measured against today)
+    today = date.today()
+    statements = cached_global(('consolidated', start_date, end_date, today),
+                               lambda: get_consolidated_statements(start_date, end_date, today))
 
-@reports_bp.route('/kpis')
-def kpis():
-    """KPIs Dashboard"""
+    return render_template('reports/consolidated.html',
+                         projects=statements['projects'],
+                         consolidated=statements['consolidated'],
+                         start_date=start_date,
+                         end_date=end_date,
+                         today=today,
+                         selected_period=period)
+
+
+@reports_bp.route('/payroll')
+def payroll():
+    """Payroll cost per month and per employee for a year"""
     project_id = _get_project_id()
     if not project_id:
         flash('يرجى اختيار مشروع أولاً', 'error')
         return redirect(url_for('main.index'))
 
-    project = Project.query.get_or_404(project_id)
-
-    # Calculate time range for burn rate (last 6 months)
-    today = date.today()
-    six_months_ago = today - relativedelta(months=6)
-
-    # Total operating expenses in last 6 months
-    recent_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.transaction_date >= six_months_ago,
-        ExpenseTransaction.transaction_date <= today
-    )
-    recent_expenses = float(recent_expenses_query.scalar() or 0)
-
-    # Count months with data
-    months_query = db.session.query(
-        func.distinct(func.strftime('%Y-%m', ExpenseTransaction.transaction_date))
-    ).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.transaction_date >= six_months_ago,
-        ExpenseTransaction.transaction_date <= today
-    )
-    months_with_data = months_query.count() or 1
-
-    # Burn Rate (average monthly operating expenses)
-    burn_rate = recent_expenses / months_with_data
-
-    # Current Cash (total account balances)
-    total_cash = calculate_total_balance(project_id=project_id)
+    year = request.args.get('year', type=int) or date.today().year
 
-    # Runway (months of cash remaining at current burn rate)
-    runway_months = (total_cash / burn_rate) if burn_rate > 0 else float('inf')
+    by_month = get_payroll_by_month(project_id, year)
+    by_employee = get_payroll_by_employee(project_id, year)
 
-    # Total Income
-    total_income = calculate_total_income(project_id=project_id)
+    return render_template('reports/payroll.html',
+                         year=year,
+                         by_month=by_month,
+                         by_employee=by_employee,
+                         total_net=float(by_month[-1].ytd_net) if by_month else 0.0)
 
-    # Direct Costs (all time)
-    direct_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.is_direct_cost == True
-    )
-    total_direct_costs = float(direct_costs_query.scalar() or 0)
 
-    # Gross Profit & Margin
-    gross_profit = total_income - total_direct_costs
-    gross_margin_pct = (gross_profit / total_income * 100) if total_income > 0 else 0
+@reports_bp.route('/budget')
+def budget():
+    """Budget vs actual per expense category and month"""
+    project_id = _get_project_id()
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
 
-    # Operating Expenses (all time)
-    operating_expenses_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'operating',
-        ExpenseTransaction.is_direct_cost == False
-    )
-    total_operating_expenses = float(operating_expenses_query.scalar() or 0)
+    year = request.args.get('year', type=int) or date.today().year
+    report = get_budget_report(project_id, year)
 
-    # Net Profit & Net Margin
-    net_profit = gross_profit - total_operating_expenses
-    net_margin_pct = (net_profit / total_income * 100) if total_income > 0 else 0
+    return render_template('reports/budget.html',
+                         year=year,
+                         categories=ExpenseCategory.query.filter_by(is_active=True).all(),
+                         base_currency=get_base_currency(),
+                         today=date.today(),
+                         **report)
 
-    # Total All Operating Expenses
-    total_all_operating = total_direct_costs + total_operating_expenses
 
-    # Operating Cost Ratio
-    operating_cost_ratio = (total_all_operating / total_income * 100) if total_income > 0 else 0
+@reports_bp.route('/budget/set', methods=['POST'])
+def set_category_budget():
+    """Set a category's budget for one month, or every month of its year"""
+    project_id = _get_project_id()
+    if not project_id:
+        flash('يرجى اختيار مشروع أولاً', 'error')
+        return redirect(url_for('main.index'))
 
-    # ROI
-    owner_capital = float(project.owner_capital or 0)
-    building_costs_query = db.session.query(func.sum(ExpenseTransaction.amount)).filter(
-        ExpenseTransaction.project_id == project_id,
-        ExpenseTransaction.phase == 'building'
-    )
-    building_costs = float(building_costs_query.scalar() or 0)
-    total_investment = owner_capital + building_costs
-    roi_pct = (net_profit / total_investment * 100) if total_investment > 0 else 0
-
-    return render_template('reports/kpis.html',
-                         project=project,
-                         burn_rate=burn_rate,
-                         total_cash=total_cash,
-                         runway_months=runway_months,
-                         gross_margin_pct=gross_margin_pct,
-                         net_margin_pct=net_margin_pct,
-                         roi_pct=roi_pct,
-                         operating_cost_ratio=operating_cost_ratio,
-                         total_income=total_income,
-                         total_direct_costs=total_direct_costs,
-                         gross_profit=gross_profit,
-                         total_operating_expenses=total_operating_expenses,
-                         net_profit=net_profit,
-                         total_investment=total_investment,
-                         building_costs=building_costs,
-                         owner_capital=owner_capital)
+    category_id = request.form.get('category_id', type=int)
+    amount = request.form.get('amount', type=float)
+    month_str = request.form.get('month', '')
+
+    try:
+        month = date.fromisoformat(month_str + '-01')
+    except ValueError:
+        month = None
+    if not category_id or amount is None or amount < 0 or month is None:
+        flash('الفئة والشهر والمبلغ مطلوبة', 'error')
+        return redirect(url_for('reports.budget'))
+
+    months = [month]
+    if request.form.get('whole_year'):
+        months = [date(month.year, m, 1) for m in range(1, 13)]
+    set_budget(project_id, category_id, months, amount)
+
+    flash('تم حفظ الموازنة بنجاح', 'success')
+    return redirect(url_for('reports.budget', year=month.year))
@@ -0,0 +1,189 @@
+"""
+Monthly expense budgets per project and category.
+
+Actuals come from one grouped query over the expense detail (plus the frozen
+totals of locked months and the archived rows of closed fiscal years), keyed by (category, month) and matched to the
+budget rows in Python. The dashboard's burn alerts run the same query for the
+current month, so the query count does not grow with the number of categories.
+"""
+import calendar
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import func, select, union_all, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import (
+    db, bump_data_version, Account, Budget, ExpenseCategory, ExpenseTransaction, PeriodTotal,
+    expense_archive
+)
+from app.currency import conversion_target, converted
+from app.period_locks import frozen_months, outside_months, month_start
+
+
+def _month_key(day):
+    return day.strftime('%Y-%m')
+
+
+def get_monthly_actuals(project_id, start_date, end_date):
+    """{(category_id, 'YYYY-MM'): spent} for expenses in the range, in the base currency"""
+    currency = conversion_target(project_id)
+    months = [] if currency else frozen_months(project_id, start_date, end_date)
+    amount = ExpenseTransaction.amount
+    if currency:
+        amount = converted(amount, Account.currency, ExpenseTransaction.transaction_date, currency)
+
+    detail = select(
+        ExpenseTransaction.category_id.label('category_id'),
+        func.strftime('%Y-%m', ExpenseTransaction.transaction_date).label('month'),
+        amount.label('amount')
+    ).where(
+        ExpenseTransaction.project_id == project_id,
+        ExpenseTransaction.transaction_date >= start_date,
+        ExpenseTransaction.transaction_date <= end_date,
+        *outside_months(ExpenseTransaction.transaction_date, months)
+    )
+    if currency:
+        detail = detail.join(Account, Account.id == ExpenseTransaction.account_id)
+    frozen = select(
+        PeriodTotal.category_id, func.strftime('%Y-%m', PeriodTotal.period_start), PeriodTotal.amount
+    ).where(
+        PeriodTotal.kind == 'expense',
+        PeriodTotal.project_id == project_id,
+        PeriodTotal.period_start.in_(months)
+    )
+
+    # Closed fiscal years keep their detail only in the archive
+    archive = expense_archive
+    amount = archive.c.amount
+    if currency:
+        amount = converted(amount, Account.currency, archive.c.transaction_date, currency)
+    archived = select(
+        archive.c.category_id, func.strftime('%Y-%m', archive.c.transaction_date), amount
+    ).where(
+        archive.c.project_id == project_id,
+        archive.c.transaction_date >= start_date,
+        archive.c.transaction_date <= end_date
+    )
+    if currency:
+        archived = archived.join(Account, Account.id == archive.c.account_id)
+
+    rows = union_all(detail, frozen, archived).subquery()
+    result = db.session.execute(
+        select(rows.c.category_id, rows.c.month, func.sum(rows.c.amount).label('spent'))
+        .group_by(rows.c.category_id, rows.c.month)
+    )
+    return {(row.category_id, row.month): float(row.spent or 0) for row in result}
+
+
+def set_budget(project_id, category_id, months, amount):
+    """Set (or clear, when amount is 0) a category's budget for each given month"""
+    months = [month_start(month) for month in months]
+    try:
+        if amount:
+            now = datetime.utcnow()
+            stmt = sqlite_insert(Budget).values([
+                {'project_id': project_id, 'category_id': category_id, 'month': month,
+                 'amount': amount, 'created_at': now, 'updated_at': now}
+                for month in months
+            ])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['project_id', 'month', 'category_id'],
+                set_={'amount': stmt.excluded.amount, 'updated_at': stmt.excluded.updated_at}
+            ))
+        else:
+            db.session.execute(delete(Budget).where(
+                Budget.project_id == project_id,
+                Budget.category_id == category_id,
+                Budget.month.in_(months)
+            ))
+        bump_data_version([project_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def get_budget_report(project_id, year):
+    """Budget, actual and variance per category and month of a year"""
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    budgets = {
+        (b.category_id, _month_key(b.month)): float(b.amount)
+        for b in Budget.query.filter(
+            Budget.project_id == project_id, Budget.month.between(start, end)
+        )
+    }
+    actuals = get_monthly_actuals(project_id, start, end)
+    names = dict(db.session.query(ExpenseCategory.id, ExpenseCategory.name_ar))
+
+    rows = []
+    by_category = {}
+    for category_id, month in sorted(budgets.keys() | actuals.keys(), key=lambda k: (k[1], names.get(k[0], ''))):
+        budget = budgets.get((category_id, month), 0.0)
+        actual = actuals.get((category_id, month), 0.0)
+        rows.append({
+            'month': month,
+            'category_id': category_id,
+            'category': names.get(category_id, '-'),
+            'budget': budget,
+            'actual': actual,
+            'variance': budget - actual,
+            'used_pct': (actual / budget * 100) if budget else None
+        })
+        entry = by_category.setdefault(category_id, {
+            'category': names.get(category_id, '-'), 'budget': 0.0, 'actual': 0.0
+        })
+        entry['budget'] += budget
+        entry['actual'] += actual
+
+    for entry in by_category.values():
+        entry['variance'] = entry['budget'] - entry['actual']
+        entry['used_pct'] = (entry['actual'] / entry['budget'] * 100) if entry['budget'] else None
+
+    total_budget = sum(budgets.values())
+    total_actual = sum(actuals.values())
+    return {
+        'rows': rows,
+        'by_category': sorted(by_category.values(), key=lambda e: e['category']),
+        'total_budget': total_budget,
+        'total_actual': total_actual,
+        'total_variance': total_budget - total_actual
+    }
+
+
+def get_budget_alerts(project_id, today=None):
+    """
+    Categories of the current month that used at least BUDGET_ALERT_PCT of
+    their budget, or whose spending pace projects past it by month end
+    """
+    today = today or date.today()
+    first = today.replace(day=1)
+    budgets = db.session.query(Budget.category_id, Budget.amount, ExpenseCategory.name_ar)\
+        .join(ExpenseCategory, ExpenseCategory.id == Budget.category_id)\
+        .filter(Budget.project_id == project_id, Budget.month == first).all()
+    if not budgets:
+        return []
+
+    actuals = get_monthly_actuals(project_id, first, today)
+    elapsed = today.day / calendar.monthrange(today.year, today.month)[1]
+    threshold = current_app.config['BUDGET_ALERT_PCT']
+
+    alerts = []
+    for category_id, amount, name in budgets:
+        budget = float(amount)
+        actual = actuals.get((category_id, _month_key(first)), 0.0)
+        used_pct = actual / budget * 100 if budget else 0
+        projected = actual / elapsed
+        if used_pct >= 100:
+            level = 'over'
+        elif used_pct >= threshold or projected > budget:
+            level = 'warning'
+        else:
+            continue
+        alerts.append({
+            'category': name,
+            'budget': budget,
+            'actual': actual,
+            'used_pct': used_pct,
+            'projected': projected,
+            'level': level
+        })
+    return sorted(alerts, key=lambda a: -a['used_pct'])
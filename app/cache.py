@@ -0,0 +1,87 @@
+"""
+In-process cache for values derived from a project's data.
+
+Entries are keyed by (project_id, key) and tagged with the project's
+data_version at compute time; a lookup only hits while the version is unchanged.
+Cross-project values use the sum of all data versions instead. The cache
+holds at most CACHE_MAX_ENTRIES entries and evicts the least recently used,
+so keys that vary by date or request arguments cannot grow it without bound.
+
+FragmentCacheExtension applies the same cache to rendered template regions.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import func
+from app.models import db, Project
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_data_version(project_id):
+    """Current data version of a project (one primary-key lookup)"""
+    return db.session.query(Project.data_version)\
+        .filter(Project.id == project_id).scalar() or 0
+
+
+def _lookup(cache_key, version, compute):
+    with _lock:
+        hit = _cache.get(cache_key)
+        if hit is not None and hit[0] == version:
+            _cache.move_to_end(cache_key)
+            return hit[1]
+
+    value = compute()
+    limit = current_app.config['CACHE_MAX_ENTRIES']
+    with _lock:
+        _cache[cache_key] = (version, value)
+        _cache.move_to_end(cache_key)
+        while len(_cache) > limit:
+            _cache.popitem(last=False)
+    return value
+
+
+def cached_for_project(project_id, key, compute):
+    """Return the cached value for this project version, computing it on a miss"""
+    return _lookup((project_id, key), get_data_version(project_id), compute)
+
+
+def get_global_data_version():
+    """Changes whenever any project's data changes"""
+    return db.session.query(func.coalesce(func.sum(Project.data_version), 0)).scalar()
+
+
+def cached_global(key, compute):
+    """Like cached_for_project, for values spanning all projects"""
+    return _lookup((None, key), get_global_data_version(), compute)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache 'name', project_id[, vary...] %}...{% endcache %}
+
+    Renders the block once per project data version (global version when
+    project_id is none) and extra vary values, then serves the stored HTML.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_fragment', [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, args, caller):
+        name, project_id, *vary = args
+        key = ('fragment', name, *vary)
+        if project_id is None:
+            return cached_global(key, caller)
+        return cached_for_project(project_id, key, caller)
@@ -0,0 +1,174 @@
+"""
+Change-data capture for financial tables.
+
+An after_flush hook appends one compact row per insert, update and delete of
+a financial model to change_log: table, row id, op, project, account, old and
+new amount and the transaction date. Debts and loans are logged by their
+outstanding (remaining) amount, so payments show up as updates of their
+parent row as well as inserts of the payment. Bulk Core writes call log_rows()
+explicitly. SQLite serializes writers, so seq order is commit order and a
+consumer that resumes from its checkpoint (seq > last_seq) never misses a row.
+"""
+from datetime import datetime
+from sqlalchemy import event, insert, select, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import (
+    db, ChangeLog, ChangeLogCheckpoint, IncomeTransaction, ExpenseTransaction,
+    SalaryPayment, Debt, DebtPayment, Loan, LoanPayment, Transfer, _project_id_of
+)
+
+
+# model -> (amount attribute, date attribute)
+TRACKED_MODELS = {
+    IncomeTransaction: ('amount', 'transaction_date'),
+    ExpenseTransaction: ('amount', 'transaction_date'),
+    SalaryPayment: ('net_salary', 'payment_date'),
+    Debt: ('remaining_amount', 'created_at'),
+    DebtPayment: ('amount', 'payment_date'),
+    Loan: ('remaining_amount', 'received_date'),
+    LoanPayment: ('amount', 'payment_date'),
+    Transfer: ('amount', 'transfer_date'),
+}
+
+
+def _account_legs(obj):
+    """
+    (account_id, sign) for each account a row is logged against. A transfer
+    is logged once per account, with negated amounts on the sending side.
+    """
+    if isinstance(obj, Transfer):
+        return [(obj.from_account_id, -1), (obj.to_account_id, 1)]
+    if isinstance(obj, SalaryPayment):
+        return [(obj.expense_transaction.account_id if obj.expense_transaction else None, 1)]
+    return [(obj.account_id, 1)]
+
+
+def _signed(amount, sign):
+    return amount if amount is None or sign > 0 else -amount
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _records(session, obj, op, amounts=None):
+    amount_attr, date_attr = TRACKED_MODELS[type(obj)]
+    amount = getattr(obj, amount_attr)
+    old_amount = new_amount = amount
+    if amounts is not None:
+        old_amount, new_amount = amounts
+    elif op == 'insert':
+        old_amount = None
+    elif op == 'delete':
+        new_amount = None
+    else:
+        history = inspect(obj).attrs[amount_attr].history
+        if history.deleted:
+            old_amount = history.deleted[0]
+
+    return [{
+        'table_name': obj.__tablename__,
+        'row_id': obj.id,
+        'op': op,
+        'project_id': _project_id_of(session, obj),
+        'account_id': account_id,
+        'old_amount': _signed(old_amount, sign),
+        'new_amount': _signed(new_amount, sign),
+        'txn_date': _as_date(getattr(obj, date_attr)),
+        'changed_at': datetime.utcnow()
+    } for account_id, sign in _account_legs(obj)]
+
+
+@event.listens_for(Session, 'after_flush')
+def _capture_changes(session, flush_context):
+    records = []
+    with session.no_autoflush:
+        for obj in session.new:
+            if type(obj) in TRACKED_MODELS:
+                records.extend(_records(session, obj, 'insert'))
+        for obj in session.dirty:
+            if type(obj) in TRACKED_MODELS and obj not in session.deleted and session.is_modified(obj):
+                records.extend(_records(session, obj, 'update'))
+        for obj in session.deleted:
+            if type(obj) in TRACKED_MODELS:
+                records.extend(_records(session, obj, 'delete'))
+    if records:
+        session.connection().execute(insert(ChangeLog), records)
+
+
+def log_rows(model, ids, op, amounts=None):
+    """
+    Log rows written with bulk INSERT/UPDATE, which bypass the flush hook.
+    A Core UPDATE leaves the session's copies stale, so its callers pass
+    `amounts`: row id -> (old, new) tracked amount.
+    """
+    if not ids:
+        return
+    amounts = amounts or {}
+    objs = model.query.filter(model.id.in_(list(ids))).all()
+    records = [record for obj in objs
+               for record in _records(db.session, obj, op, amounts.get(obj.id))]
+    if records:
+        db.session.execute(insert(ChangeLog), records)
+
+
+def get_checkpoint(consumer):
+    """Last seq processed by a consumer (0 before its first run)"""
+    return db.session.query(ChangeLogCheckpoint.last_seq)\
+        .filter(ChangeLogCheckpoint.consumer == consumer).scalar() or 0
+
+
+def read_changes(after_seq, limit=1000):
+    """Change rows with seq greater than after_seq, oldest first"""
+    return db.session.execute(
+        select(ChangeLog).where(ChangeLog.seq > after_seq).order_by(ChangeLog.seq).limit(limit)
+    ).scalars().all()
+
+
+def advance_checkpoint(consumer, seq):
+    """Move a consumer's checkpoint forward (never backwards) in the current transaction"""
+    stmt = sqlite_insert(ChangeLogCheckpoint).values(
+        consumer=consumer, last_seq=seq, updated_at=datetime.utcnow()
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['consumer'],
+        set_={'last_seq': stmt.excluded.last_seq, 'updated_at': stmt.excluded.updated_at},
+        where=ChangeLogCheckpoint.last_seq < stmt.excluded.last_seq
+    ))
+
+
+def consume_changes(consumer, handler, batch_size=1000):
+    """
+    Feed unprocessed changes to handler(rows) in batches, committing the
+    checkpoint after each batch. Returns the number of rows processed.
+    """
+    processed = 0
+    while True:
+        rows = read_changes(get_checkpoint(consumer), batch_size)
+        if not rows:
+            return processed
+        try:
+            handler(rows)
+            advance_checkpoint(consumer, rows[-1].seq)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        processed += len(rows)
+
+
+def change_to_dict(row):
+    """JSON-friendly form of a change row"""
+    return {
+        'seq': row.seq,
+        'table': row.table_name,
+        'id': row.row_id,
+        'op': row.op,
+        'project_id': row.project_id,
+        'account_id': row.account_id,
+        'old_amount': float(row.old_amount) if row.old_amount is not None else None,
+        'new_amount': float(row.new_amount) if row.new_amount is not None else None,
+        'date': row.txn_date.isoformat() if row.txn_date else None,
+        'changed_at': row.changed_at.isoformat() if row.changed_at else None
+    }
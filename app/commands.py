@@ -0,0 +1,229 @@
+"""Flask CLI commands (run with `flask --app "app:create_app()" <command>`)"""
+import json
+import sys
+import click
+from flask.cli import with_appcontext
+
+
+def _echo_drift(drift):
+    """Print drifted rows per table"""
+    for row in drift['accounts']:
+        click.echo(f"  account #{row.id} ({row.name}) project {row.project_id}: "
+                   f"stored {float(row.stored_balance or 0):,.2f} "
+                   f"expected {float(row.expected_balance):,.2f}")
+    for row in drift['debts']:
+        click.echo(f"  debt #{row.id} ({row.person_name}) project {row.project_id}: "
+                   f"stored {float(row.stored_remaining or 0):,.2f}/{row.stored_status} "
+                   f"expected {float(row.expected_remaining):,.2f}/{row.expected_status}")
+    for row in drift['loans']:
+        click.echo(f"  loan #{row.id} ({row.lender_name}) project {row.project_id}: "
+                   f"stored {float(row.stored_remaining or 0):,.2f} paid={bool(row.stored_is_paid)} "
+                   f"expected {float(row.expected_remaining):,.2f} paid={bool(row.expected_is_paid)}")
+
+    click.echo(f"accounts: {len(drift['accounts'])}, "
+               f"debts: {len(drift['debts'])}, "
+               f"loans: {len(drift['loans'])} drifted")
+
+
+@click.command('verify-ledger')
+@click.option('--project-id', type=int, default=None, help='Limit to one project')
+@with_appcontext
+def verify_ledger_command(project_id):
+    """Report derived balances and debt/loan statuses that drifted"""
+    from app.ledger import verify_ledger
+
+    drift = verify_ledger(project_id)
+    _echo_drift(drift)
+    if any(drift.values()):
+        sys.exit(1)
+
+
+@click.command('rebuild-ledger')
+@click.option('--project-id', type=int, default=None, help='Limit to one project')
+@with_appcontext
+def rebuild_ledger_command(project_id):
+    """Recompute all derived columns and fix drift in one transaction"""
+    from app.ledger import rebuild_ledger
+
+    drift = rebuild_ledger(project_id)
+    _echo_drift(drift)
+    click.echo('Ledger rebuilt.')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Repopulate the notes full-text index from all source tables"""
+    from app.search import rebuild_search_index
+
+    count = rebuild_search_index()
+    click.echo(f'Indexed {count} rows.')
+
+
+@click.command('backfill-counterparties')
+@with_appcontext
+def backfill_counterparties_command():
+    """Link debts and loans without a counterparty to one by normalized name"""
+    from app.counterparties import backfill_counterparties
+
+    linked = backfill_counterparties()
+    click.echo(f'Linked {linked} rows.')
+
+
+@click.command('snapshot-kpis')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Snapshot date (default: today)')
+@with_appcontext
+def snapshot_kpis_command(day):
+    """Store the day's KPI snapshot for every active project (run nightly)"""
+    from app.kpi_snapshots import take_kpi_snapshots
+
+    taken = take_kpi_snapshots(day.date() if day else None)
+    click.echo(f'Snapshotted {taken} projects.')
+
+
+@click.command('export-changes')
+@click.argument('consumer')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+@with_appcontext
+def export_changes_command(consumer, batch_size):
+    """Print changes not yet seen by CONSUMER as JSON lines and advance its checkpoint"""
+    from app.change_log import consume_changes, change_to_dict
+
+    def emit(rows):
+        for row in rows:
+            click.echo(json.dumps(change_to_dict(row), ensure_ascii=False))
+
+    processed = consume_changes(consumer, emit, batch_size)
+    click.echo(f'Exported {processed} changes.', err=True)
+
+
+@click.command('close-fiscal-year')
+@click.option('--project-id', type=int, required=True)
+@click.option('--year', type=int, required=True)
+@with_appcontext
+def close_fiscal_year_command(project_id, year):
+    """Store a year's closing totals and archive its income/expense rows"""
+    from app.fiscal import close_fiscal_year, FiscalCloseError
+
+    try:
+        archived = close_fiscal_year(project_id, year)
+    except FiscalCloseError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Closed {year}: archived {archived} rows.')
+
+
+@click.command('reopen-fiscal-year')
+@click.option('--project-id', type=int, required=True)
+@click.option('--year', type=int, required=True)
+@with_appcontext
+def reopen_fiscal_year_command(project_id, year):
+    """Restore a closed year's archived rows and drop its closing totals"""
+    from app.fiscal import reopen_fiscal_year, FiscalCloseError
+
+    try:
+        restored = reopen_fiscal_year(project_id, year)
+    except FiscalCloseError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Reopened {year}: restored {restored} rows.')
+
+
+@click.command('lock-period')
+@click.option('--project-id', type=int, required=True)
+@click.option('--month', type=click.DateTime(formats=['%Y-%m']), required=True,
+              help='Month to lock (YYYY-MM)')
+@with_appcontext
+def lock_period_command(project_id, month):
+    """Lock a finished month and freeze its income/expense totals"""
+    from app.period_locks import lock_period, PeriodLockError
+
+    try:
+        lock_period(project_id, month.date())
+    except PeriodLockError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Locked {month:%Y-%m}.')
+
+
+@click.command('unlock-period')
+@click.option('--project-id', type=int, required=True)
+@click.option('--month', type=click.DateTime(formats=['%Y-%m']), required=True,
+              help='Month to unlock (YYYY-MM)')
+@with_appcontext
+def unlock_period_command(project_id, month):
+    """Unlock a month and drop its frozen totals"""
+    from app.period_locks import unlock_period, PeriodLockError
+
+    try:
+        unlock_period(project_id, month.date())
+    except PeriodLockError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Unlocked {month:%Y-%m}.')
+
+
+@click.command('set-exchange-rate')
+@click.argument('currency')
+@click.argument('rate', type=float)
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Date the rate applies from (default: today)')
+@with_appcontext
+def set_exchange_rate_command(currency, rate, day):
+    """Record the base-currency value of one unit of CURRENCY"""
+    from app.currency import set_exchange_rate
+
+    if rate <= 0:
+        raise click.BadParameter('rate must be positive', param_hint='RATE')
+    set_exchange_rate(currency, rate, day.date() if day else None)
+    click.echo(f'{currency.upper()} = {rate}')
+
+
+@click.command('materialize-recurring')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Create occurrences due up to this date (default: today)')
+@click.option('--project-id', type=int, default=None, help='Limit to one project')
+@with_appcontext
+def materialize_recurring_command(day, project_id):
+    """Create every due recurring income/expense occurrence (run daily; safe to re-run)"""
+    from app.recurring import materialize_recurring
+
+    created, skipped = materialize_recurring(day.date() if day else None, project_id)
+    click.echo(f'Created {created} transactions.')
+    if skipped:
+        click.echo(f'Skipped {skipped} occurrences in locked periods.')
+
+
+@click.command('failed-jobs')
+@click.option('--retry', is_flag=True, help='Requeue the failed jobs')
+@with_appcontext
+def failed_jobs_command(retry):
+    """List background jobs that exhausted their retries"""
+    from flask import current_app
+    from app.models import db, BackgroundJob
+
+    jobs = BackgroundJob.query.filter_by(status='failed').order_by(BackgroundJob.id).all()
+    for job in jobs:
+        click.echo(f'  job #{job.id} {job.job_type} {job.payload} '
+                   f'attempts={job.attempts} at {job.updated_at:%Y-%m-%d %H:%M}: {job.last_error}')
+    click.echo(f'{len(jobs)} failed jobs.')
+    if retry and jobs:
+        for job in jobs:
+            job.status, job.attempts, job.run_after = 'pending', 0, None
+        db.session.commit()
+        current_app.extensions['job_queue'].drain()
+        click.echo(f'Requeued {len(jobs)} jobs.')
+
+
+def register_commands(app):
+    """Attach CLI commands to the app"""
+    app.cli.add_command(verify_ledger_command)
+    app.cli.add_command(rebuild_ledger_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(backfill_counterparties_command)
+    app.cli.add_command(snapshot_kpis_command)
+    app.cli.add_command(export_changes_command)
+    app.cli.add_command(close_fiscal_year_command)
+    app.cli.add_command(reopen_fiscal_year_command)
+    app.cli.add_command(lock_period_command)
+    app.cli.add_command(unlock_period_command)
+    app.cli.add_command(set_exchange_rate_command)
+    app.cli.add_command(materialize_recurring_command)
+    app.cli.add_command(failed_jobs_command)
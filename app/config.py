@@ -18,6 +18,30 @@ class Config:
     # Pagination
     ITEMS_PER_PAGE = 20
 
+    # Background jobs (post-commit balance recompute etc.)
+    JOB_WORKERS = 2
+    JOB_LEASE_SECONDS = 600  # A job running longer than this is presumed orphaned
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_SECONDS = 30  # First retry delay, doubled on each further failure
+
+    # In-process cache of derived values; least recently used entries are evicted beyond this
+    CACHE_MAX_ENTRIES = 1000
+
+    # Loans without a due date are projected over this many monthly installments
+    LOAN_DEFAULT_TERM_MONTHS = 12
+
+    # Monte Carlo runway forecast
+    FORECAST_SIMULATIONS = 5000
+    FORECAST_HORIZON_MONTHS = 60
+    FORECAST_HISTORY_MONTHS = 12
+
+    # A fiscal year can be closed (detail archived) once it ended this many months ago;
+    # must cover the longest trailing report window (forecast history, KPI burn rate)
+    FISCAL_CLOSE_MIN_AGE_MONTHS = 12
+
+    # Budget alerts: warn once a category has used this share of its monthly budget
+    BUDGET_ALERT_PCT = 80
+
     # Debt notification settings
     DEBT_WARNING_DAYS = 7  # Warn 7 days before due date
 
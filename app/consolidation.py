@@ -0,0 +1,266 @@
+"""
+Consolidated financial statements across all projects.
+
+Each table is read once with GROUP BY project_id; period and all-time figures
+come from conditional sums in the same pass. The per-project raw totals are
+then turned into the same P&L, cash-flow, equity and KPI figures the
+single-project reports show, and summed for the consolidated column. When any
+account holds a foreign currency, every sum converts its rows into the base
+currency inside the grouped query, as the single-project reports do. Closed
+fiscal years add their closing totals, or their archived rows for a period
+that covers only part of the year.
+"""
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, case, and_
+from app.models import (
+    db, column_matches, Project, Account, IncomeTransaction, ExpenseTransaction, Debt, Loan, LoanPayment,
+    ClosingTotal, income_archive, expense_archive
+)
+from app.currency import conversion_target, converted, get_base_currency
+from app.fiscal import closed_years_filter, partial_years_filter
+
+
+# Raw per-project sums; every metric is derived from these
+RAW_FIELDS = [
+    'income_period', 'income_all',
+    'direct_period', 'opex_period', 'building_period', 'expenses_period',
+    'direct_all', 'opex_all', 'building_all', 'recent_operating', 'burn_months',
+    'loans_received_period', 'unpaid_loans', 'loan_payments_period',
+    'debts_to_us', 'debts_by_us', 'total_balance', 'owner_capital'
+]
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+def _merge(raw, rows):
+    for row in rows:
+        entry = raw.get(row.project_id)
+        if entry is None:
+            continue
+        for key, value in row._mapping.items():
+            if key != 'project_id':
+                entry[key] = float(value or 0)
+
+
+def _accumulate(raw, rows):
+    for row in rows:
+        entry = raw.get(row.project_id)
+        if entry is None:
+            continue
+        for key, value in row._mapping.items():
+            if key != 'project_id':
+                entry[key] += float(value or 0)
+
+
+def get_raw_project_totals(start_date, end_date, today=None):
+    """Raw sums for every active project, one grouped query per table"""
+    today = today or date.today()
+    six_months_ago = today - relativedelta(months=6)
+
+    projects = Project.query.filter_by(is_active=True).order_by(Project.id).all()
+    raw = {p.id: dict.fromkeys(RAW_FIELDS, 0.0) for p in projects}
+    for p in projects:
+        raw[p.id]['owner_capital'] = float(p.owner_capital or 0)
+
+    # Base currency when some account holds another one, else None (no conversion)
+    target = conversion_target()
+    base = get_base_currency()
+
+    def money(amount, on_date):
+        """Amount in the base currency; the query must join the row's Account"""
+        if not target:
+            return amount
+        return converted(amount, func.coalesce(Account.currency, base), on_date, target)
+
+    def joined(query, account_id):
+        return query.outerjoin(Account, Account.id == account_id) if target else query
+
+    income_in_period = IncomeTransaction.transaction_date.between(start_date, end_date)
+    amount = money(IncomeTransaction.amount, IncomeTransaction.transaction_date)
+    _merge(raw, joined(db.session.query(
+        IncomeTransaction.project_id,
+        _sum_if(income_in_period, amount).label('income_period'),
+        func.coalesce(func.sum(amount), 0).label('income_all')
+    ), IncomeTransaction.account_id).group_by(IncomeTransaction.project_id).all())
+
+    in_period = ExpenseTransaction.transaction_date.between(start_date, end_date)
+    operating = ExpenseTransaction.phase == 'operating'
+    building = ExpenseTransaction.phase == 'building'
+    direct = ExpenseTransaction.is_direct_cost == True
+    indirect = column_matches(ExpenseTransaction.is_direct_cost, False)
+    recent = and_(operating, ExpenseTransaction.transaction_date.between(six_months_ago, today))
+    amount = money(ExpenseTransaction.amount, ExpenseTransaction.transaction_date)
+    _merge(raw, joined(db.session.query(
+        ExpenseTransaction.project_id,
+        _sum_if(and_(in_period, operating, direct), amount).label('direct_period'),
+        _sum_if(and_(in_period, operating, indirect), amount).label('opex_period'),
+        _sum_if(and_(in_period, building), amount).label('building_period'),
+        _sum_if(in_period, amount).label('expenses_period'),
+        _sum_if(and_(operating, direct), amount).label('direct_all'),
+        _sum_if(and_(operating, indirect), amount).label('opex_all'),
+        _sum_if(building, amount).label('building_all'),
+        _sum_if(recent, amount).label('recent_operating'),
+        func.count(func.distinct(case(
+            (recent, func.strftime('%Y-%m', ExpenseTransaction.transaction_date))
+        ))).label('burn_months')
+    ), ExpenseTransaction.account_id).group_by(ExpenseTransaction.project_id).all())
+
+    # Closed fiscal years contribute their stored totals to the all-time figures,
+    # and to the period figures when the period covers the whole year,
+    # converted at each year's year-end rate
+    income = ClosingTotal.kind == 'income'
+    expense = ClosingTotal.kind == 'expense'
+    closed_operating = and_(expense, ClosingTotal.phase == 'operating')
+    closed_direct = and_(closed_operating, ClosingTotal.is_direct_cost == True)
+    closed_opex = and_(closed_operating, column_matches(ClosingTotal.is_direct_cost, False))
+    closed_building = and_(expense, ClosingTotal.phase == 'building')
+    covered = and_(*closed_years_filter(start_date, end_date))
+    amount = money(ClosingTotal.amount, func.date(func.printf('%04d-12-31', ClosingTotal.fiscal_year)))
+    _accumulate(raw, joined(db.session.query(
+        ClosingTotal.project_id,
+        _sum_if(income, amount).label('income_all'),
+        _sum_if(closed_direct, amount).label('direct_all'),
+        _sum_if(closed_opex, amount).label('opex_all'),
+        _sum_if(closed_building, amount).label('building_all'),
+        _sum_if(and_(covered, income), amount).label('income_period'),
+        _sum_if(and_(covered, closed_direct), amount).label('direct_period'),
+        _sum_if(and_(covered, closed_opex), amount).label('opex_period'),
+        _sum_if(and_(covered, closed_building), amount).label('building_period'),
+        _sum_if(and_(covered, expense), amount).label('expenses_period')
+    ), ClosingTotal.account_id).group_by(ClosingTotal.project_id).all())
+
+    # Closed years the period covers only in part are read from their archived rows
+    archive = income_archive
+    amount = money(archive.c.amount, archive.c.transaction_date)
+    _accumulate(raw, joined(db.session.query(
+        archive.c.project_id,
+        func.coalesce(func.sum(amount), 0).label('income_period')
+    ).select_from(archive), archive.c.account_id)
+        .filter(*partial_years_filter(archive, start_date, end_date))
+        .group_by(archive.c.project_id).all())
+
+    archive = expense_archive
+    archived_operating = archive.c.phase == 'operating'
+    archived_direct = archive.c.is_direct_cost == True
+    archived_opex = column_matches(archive.c.is_direct_cost, False)
+    amount = money(archive.c.amount, archive.c.transaction_date)
+    _accumulate(raw, joined(db.session.query(
+        archive.c.project_id,
+        _sum_if(and_(archived_operating, archived_direct), amount).label('direct_period'),
+        _sum_if(and_(archived_operating, archived_opex), amount).label('opex_period'),
+        _sum_if(archive.c.phase == 'building', amount).label('building_period'),
+        func.coalesce(func.sum(amount), 0).label('expenses_period')
+    ).select_from(archive), archive.c.account_id)
+        .filter(*partial_years_filter(archive, start_date, end_date))
+        .group_by(archive.c.project_id).all())
+
+    # Loans: received amounts at their date, outstanding amounts at today's rate
+    _merge(raw, joined(db.session.query(
+        Loan.project_id,
+        _sum_if(Loan.received_date.between(start_date, end_date),
+                money(Loan.amount, Loan.received_date)).label('loans_received_period'),
+        _sum_if(Loan.is_paid == False, money(Loan.remaining_amount, today)).label('unpaid_loans')
+    ), Loan.account_id).group_by(Loan.project_id).all())
+
+    _merge(raw, joined(db.session.query(
+        Loan.project_id,
+        _sum_if(LoanPayment.payment_date.between(start_date, end_date),
+                money(LoanPayment.amount, LoanPayment.payment_date)).label('loan_payments_period')
+    ).join(Loan, LoanPayment.loan_id == Loan.id), LoanPayment.account_id).group_by(Loan.project_id).all())
+
+    unpaid = Debt.is_paid == False
+    remaining = money(Debt.remaining_amount, today)
+    _merge(raw, joined(db.session.query(
+        Debt.project_id,
+        _sum_if(and_(unpaid, Debt.debt_type == 'owed_to_us'), remaining).label('debts_to_us'),
+        _sum_if(and_(unpaid, Debt.debt_type == 'owed_by_us'), remaining).label('debts_by_us')
+    ), Debt.account_id).group_by(Debt.project_id).all())
+
+    _merge(raw, db.session.query(
+        Account.project_id,
+        func.coalesce(func.sum(money(Account.current_balance, today)), 0).label('total_balance')
+    ).filter(Account.is_active == True).group_by(Account.project_id).all())
+
+    for entry in raw.values():
+        entry['burn_rate'] = entry['recent_operating'] / (entry['burn_months'] or 1)
+
+    return projects, raw
+
+
+def _pct(part, whole):
+    return (part / whole * 100) if whole > 0 else 0
+
+
+def compute_statements(r):
+    """Derive P&L, cash-flow, equity and KPI figures from raw sums"""
+    gross_profit = r['income_period'] - r['direct_period']
+    net_profit = gross_profit - r['opex_period']
+    total_cash_in = r['income_period'] + r['loans_received_period']
+    total_cash_out = r['expenses_period'] + r['loan_payments_period']
+
+    retained_earnings = r['income_all'] - (r['direct_all'] + r['opex_all'])
+    total_liabilities = r['unpaid_loans'] + r['debts_by_us']
+    total_assets = r['total_balance'] + r['debts_to_us']
+
+    gross_profit_all = r['income_all'] - r['direct_all']
+    net_profit_all = gross_profit_all - r['opex_all']
+    total_investment = r['owner_capital'] + r['building_all']
+    burn_rate = r['burn_rate']
+
+    return {
+        # Profit & Loss (period)
+        'total_income': r['income_period'],
+        'direct_costs': r['direct_period'],
+        'gross_profit': gross_profit,
+        'gross_margin_pct': _pct(gross_profit, r['income_period']),
+        'operating_expenses': r['opex_period'],
+        'net_profit': net_profit,
+        'net_margin_pct': _pct(net_profit, r['income_period']),
+        'building_expenses': r['building_period'],
+        # Cash flow (period)
+        'loans_received': r['loans_received_period'],
+        'total_cash_in': total_cash_in,
+        'expenses_total': r['expenses_period'],
+        'loan_payments_total': r['loan_payments_period'],
+        'total_cash_out': total_cash_out,
+        'net_cash_flow': total_cash_in - total_cash_out,
+        # Equity (all time)
+        'owner_capital': r['owner_capital'],
+        'retained_earnings': retained_earnings,
+        'unpaid_loans': r['unpaid_loans'],
+        'debts_by_us': r['debts_by_us'],
+        'total_liabilities': total_liabilities,
+        'total_balance': r['total_balance'],
+        'debts_to_us': r['debts_to_us'],
+        'total_assets': total_assets,
+        'net_project_value': r['owner_capital'] + retained_earnings - total_liabilities,
+        # KPIs (all time, burn over last 6 months)
+        'burn_rate': burn_rate,
+        'runway_months': (r['total_balance'] / burn_rate) if burn_rate > 0 else float('inf'),
+        'all_time_gross_margin_pct': _pct(gross_profit_all, r['income_all']),
+        'all_time_net_margin_pct': _pct(net_profit_all, r['income_all']),
+        'operating_cost_ratio': _pct(r['direct_all'] + r['opex_all'], r['income_all']),
+        'total_investment': total_investment,
+        'roi_pct': _pct(net_profit_all, total_investment)
+    }
+
+
+def get_consolidated_statements(start_date, end_date, today=None):
+    """Per-project statements plus the consolidated (summed) statement"""
+    projects, raw = get_raw_project_totals(start_date, end_date, today)
+
+    totals = dict.fromkeys(RAW_FIELDS + ['burn_rate'], 0.0)
+    for entry in raw.values():
+        for key in totals:
+            totals[key] += entry[key]
+
+    return {
+        'projects': [
+            {'project': p, 'statements': compute_statements(raw[p.id])}
+            for p in projects
+        ],
+        'consolidated': compute_statements(totals)
+    }
@@ -0,0 +1,191 @@
+"""
+Counterparty directory shared by debts and loans across all projects.
+
+Debt.person_name and Loan.lender_name stay as entered. A before_flush hook
+links each row to the counterparty with the same name key, creating it on
+first use. The key only folds spelling variants of the same name (hamza forms
+of alef, alef maqsura/ya, ta marbuta/ha, case and whitespace); unlike search
+normalization it keeps the definite article, so "الشروق" and "شروق" stay
+distinct counterparties. The unique index on name_key backs both the link lookup and prefix autocomplete.
+"""
+from datetime import date, datetime
+from sqlalchemy import event, func, case, select, bindparam, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import db, Account, Counterparty, Debt, Loan, Project
+from app.currency import conversion_target, converted, get_base_currency
+
+
+# model -> name attribute linked to a counterparty
+LINKED_NAMES = {Debt: 'person_name', Loan: 'lender_name'}
+
+_KEY_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه'
+})
+
+
+def counterparty_key(name):
+    """Lookup key for a counterparty name"""
+    return ' '.join((name or '').translate(_KEY_CHAR_MAP).lower().split())
+
+
+def _ensure_counterparties(connection, names):
+    """Insert missing counterparties and return {name_key: id} for the given names"""
+    by_key = {}
+    for name in names:
+        key = counterparty_key(name)
+        if key:
+            by_key.setdefault(key, ' '.join(name.split()))
+    if not by_key:
+        return {}
+
+    connection.execute(
+        sqlite_insert(Counterparty.__table__).on_conflict_do_nothing(index_elements=['name_key']),
+        [{'name': name, 'name_key': key, 'created_at': datetime.utcnow()} for key, name in by_key.items()]
+    )
+    rows = connection.execute(
+        select(Counterparty.name_key, Counterparty.id)
+        .where(Counterparty.name_key.in_(list(by_key)))
+    ).all()
+    return dict(rows)
+
+
+@event.listens_for(Session, 'before_flush')
+def _link_counterparties(session, flush_context, instances):
+    pending = []
+    for obj in list(session.new) + list(session.dirty):
+        attr = LINKED_NAMES.get(type(obj))
+        if attr and obj not in session.deleted and inspect(obj).attrs[attr].history.has_changes():
+            pending.append((obj, getattr(obj, attr)))
+    if not pending:
+        return
+
+    ids = _ensure_counterparties(session.connection(), [name for _, name in pending])
+    for obj, name in pending:
+        obj.counterparty_id = ids.get(counterparty_key(name))
+
+
+def backfill_counterparties():
+    """Link every debt and loan without a counterparty; returns rows linked"""
+    linked = 0
+    try:
+        connection = db.session.connection()
+        for model, attr in LINKED_NAMES.items():
+            table = model.__table__
+            name_column = table.c[attr]
+            names = connection.execute(
+                select(name_column).where(table.c.counterparty_id.is_(None)).distinct()
+            ).scalars().all()
+            if not names:
+                continue
+
+            ids = _ensure_counterparties(connection, names)
+            params = [
+                {'match_name': name, 'link_id': ids[counterparty_key(name)]}
+                for name in names if counterparty_key(name) in ids
+            ]
+            if params:
+                result = connection.execute(
+                    table.update()
+                    .where(name_column == bindparam('match_name'), table.c.counterparty_id.is_(None))
+                    .values(counterparty_id=bindparam('link_id')),
+                    params
+                )
+                linked += result.rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return linked
+
+
+def search_counterparties(prefix, limit=10):
+    """Counterparties whose normalized name starts with prefix (index range scan)"""
+    key = counterparty_key(prefix)
+    if not key:
+        return []
+    return Counterparty.query.filter(
+        Counterparty.name_key >= key,
+        Counterparty.name_key < key + '\U0010ffff'
+    ).order_by(Counterparty.name_key).limit(limit).all()
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+def get_counterparty_exposure(prefix=None):
+    """
+    Outstanding exposure per counterparty across all projects:
+    owed to us, owed by us, loans outstanding and the net position.
+    Amounts are in the base currency at today's rates when accounts mix
+    currencies (debts without an account count as base currency).
+    """
+    target = conversion_target()
+    base = get_base_currency()
+
+    def outstanding(model):
+        if not target:
+            return model.remaining_amount
+        return converted(model.remaining_amount, func.coalesce(Account.currency, base), date.today(), target)
+
+    def joined(query, model):
+        return query.outerjoin(Account, Account.id == model.account_id) if target else query
+
+    unpaid_debt = Debt.is_paid == False
+    remaining = outstanding(Debt)
+    debts = joined(select(
+        Debt.counterparty_id,
+        _sum_if(unpaid_debt & (Debt.debt_type == 'owed_to_us'), remaining).label('owed_to_us'),
+        _sum_if(unpaid_debt & (Debt.debt_type == 'owed_by_us'), remaining).label('owed_by_us'),
+        func.count(Debt.id).label('debt_count')
+    ), Debt).where(Debt.counterparty_id.isnot(None)).group_by(Debt.counterparty_id).subquery()
+
+    loans = joined(select(
+        Loan.counterparty_id,
+        _sum_if(Loan.is_paid == False, outstanding(Loan)).label('loans_outstanding'),
+        func.count(Loan.id).label('loan_count')
+    ), Loan).where(Loan.counterparty_id.isnot(None)).group_by(Loan.counterparty_id).subquery()
+
+    owed_to_us = func.coalesce(debts.c.owed_to_us, 0)
+    owed_by_us = func.coalesce(debts.c.owed_by_us, 0)
+    loans_outstanding = func.coalesce(loans.c.loans_outstanding, 0)
+
+    query = db.session.query(
+        Counterparty.id,
+        Counterparty.name,
+        owed_to_us.label('owed_to_us'),
+        owed_by_us.label('owed_by_us'),
+        loans_outstanding.label('loans_outstanding'),
+        (owed_to_us - owed_by_us - loans_outstanding).label('net'),
+        func.coalesce(debts.c.debt_count, 0).label('debt_count'),
+        func.coalesce(loans.c.loan_count, 0).label('loan_count')
+    ).outerjoin(debts, debts.c.counterparty_id == Counterparty.id)\
+     .outerjoin(loans, loans.c.counterparty_id == Counterparty.id)
+
+    key = counterparty_key(prefix)
+    if key:
+        query = query.filter(
+            Counterparty.name_key >= key,
+            Counterparty.name_key < key + '\U0010ffff'
+        )
+
+    return query.order_by(
+        (owed_to_us + owed_by_us + loans_outstanding).desc(),
+        Counterparty.name_key
+    ).all()
+
+
+def get_counterparty_activity(counterparty_id):
+    """All debts and loans of one counterparty across projects, with project names"""
+    debts = db.session.query(Debt, Project.name_ar)\
+        .join(Project, Debt.project_id == Project.id)\
+        .filter(Debt.counterparty_id == counterparty_id)\
+        .order_by(Debt.due_date.is_(None), Debt.due_date).all()
+    loans = db.session.query(Loan, Project.name_ar)\
+        .join(Project, Loan.project_id == Project.id)\
+        .filter(Loan.counterparty_id == counterparty_id)\
+        .order_by(Loan.received_date.desc()).all()
+    return debts, loans
@@ -0,0 +1,106 @@
+"""
+Account currencies and dated exchange rates.
+
+Every account holds one currency; the `currency` system setting is the base
+currency. exchange_rates stores, per currency and date, the base-currency
+value of one unit. Reports convert inside their aggregate queries: each row's
+amount is multiplied by the as-of rate of its account's currency on the row's
+date (the latest rate on or before it, else the earliest known rate) and
+divided by the reporting currency's as-of rate. The lookups are correlated
+subqueries that seek the (currency, rate_date) unique index, so a report stays
+one query. Projects whose accounts all hold the base currency, reported in the
+base currency, skip conversion entirely.
+"""
+from datetime import date
+from sqlalchemy import select, case, func, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import db, bump_data_version, Account, Project, ExchangeRate, SystemSetting
+
+
+DEFAULT_CURRENCY = 'EGP'
+
+
+def get_base_currency():
+    value = db.session.query(SystemSetting.setting_value)\
+        .filter(SystemSetting.setting_key == 'currency').scalar()
+    return value or DEFAULT_CURRENCY
+
+
+def rate_expr(currency, on_date, base):
+    """SQL expression: base-currency value of one unit of `currency` on `on_date`"""
+    as_of = select(ExchangeRate.rate).where(
+        ExchangeRate.currency == currency, ExchangeRate.rate_date <= on_date
+    ).order_by(ExchangeRate.rate_date.desc()).limit(1).scalar_subquery()
+    earliest = select(ExchangeRate.rate).where(
+        ExchangeRate.currency == currency
+    ).order_by(ExchangeRate.rate_date).limit(1).scalar_subquery()
+    return case((currency == base, 1), else_=func.coalesce(as_of, earliest))
+
+
+def converted(amount, currency, on_date, target):
+    """SQL expression converting `amount`, held in `currency`, into `target` as of `on_date`"""
+    base = get_base_currency()
+    value = amount * rate_expr(currency, on_date, base)
+    if target != base:
+        value = value / rate_expr(literal(target), on_date, base)
+    return value
+
+
+def conversion_target(project_id=None, currency=None):
+    """
+    Currency amounts must be converted into for a report, or None when every
+    account in scope already holds the requested (or base) currency.
+    """
+    base = get_base_currency()
+    target = (currency or base).upper()
+    query = db.session.query(Account.id).filter(Account.currency != target)
+    if project_id:
+        query = query.filter(Account.project_id == project_id)
+    if target == base and query.first() is None:
+        return None
+    return target
+
+
+def get_currencies():
+    """Base currency first, then every currency used by an account or a rate"""
+    base = get_base_currency()
+    used = {c for (c,) in db.session.query(Account.currency).distinct()}
+    used |= {c for (c,) in db.session.query(ExchangeRate.currency).distinct()}
+    return [base] + sorted(used - {base})
+
+
+def missing_rates(project_id=None, currency=None):
+    """Non-base currencies in scope that have no exchange rate at all"""
+    base = get_base_currency()
+    query = db.session.query(Account.currency).filter(Account.currency != base)
+    if project_id:
+        query = query.filter(Account.project_id == project_id)
+    needed = {c for (c,) in query.distinct()}
+    if currency and currency != base:
+        needed.add(currency)
+    known = {c for (c,) in db.session.query(ExchangeRate.currency).distinct()}
+    return sorted(needed - known)
+
+
+def get_latest_rates():
+    """Most recent rate of every currency"""
+    latest = select(
+        ExchangeRate.currency, func.max(ExchangeRate.rate_date).label('rate_date')
+    ).group_by(ExchangeRate.currency).subquery()
+    return ExchangeRate.query.join(latest, (ExchangeRate.currency == latest.c.currency) &
+                                   (ExchangeRate.rate_date == latest.c.rate_date))\
+        .order_by(ExchangeRate.currency).all()
+
+
+def set_exchange_rate(currency, rate, rate_date=None):
+    """Insert or replace a currency's rate for a day"""
+    stmt = sqlite_insert(ExchangeRate).values(
+        currency=currency.upper(), rate_date=rate_date or date.today(), rate=rate
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['currency', 'rate_date'],
+        set_={'rate': stmt.excluded.rate}
+    ))
+    # Rates are global: every project's converted figures may change
+    bump_data_version([project_id for (project_id,) in db.session.query(Project.id)])
+    db.session.commit()
@@ -0,0 +1,311 @@
+"""
+Fiscal-year close for income and expense detail.
+
+Closing a (calendar) year writes its per-account, per-category totals into
+closing_totals, moves the detail rows into income_transactions_archive /
+expense_transactions_archive and records the close, all in one transaction.
+All-time figures (account balances, ledger checks, total income/expenses,
+category summaries, equity/ROI/KPIs, consolidated totals) add the stored
+totals to the remaining detail. A date range reads a closed year's totals
+when it covers the whole year and the year's archived rows when it covers
+only part of it. A year may only be closed once it is older than every
+trailing window the reports use (FISCAL_CLOSE_MIN_AGE_MONTHS), and no rows
+can be added, edited or deleted in a closed year (see is_period_locked).
+
+Income and expense ids are AUTOINCREMENT, so an archived id is never handed
+out again and reopening a year can restore its rows under their own ids.
+Links from salary payments and recurring occurrences to archived rows are
+cleared when the year is closed.
+"""
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import func, select, insert, update, delete, literal, case, and_
+from app.models import (
+    db, bump_data_version, column_matches, Account, FiscalYearClose, ClosingTotal, ChangeLog, PeriodTotal,
+    IncomeTransaction, ExpenseTransaction, SalaryPayment, RecurringOccurrence, RecurringTransaction,
+    income_archive, expense_archive
+)
+from app.currency import converted
+
+
+# kind -> (model, archive table, extra grouping columns)
+CLOSED_KINDS = {
+    'income': (IncomeTransaction, income_archive, ()),
+    'expense': (ExpenseTransaction, expense_archive, ('phase', 'is_direct_cost', 'is_salary')),
+}
+
+
+class FiscalCloseError(ValueError):
+    """Raised when a year cannot be closed or reopened"""
+
+
+def closed_years_filter(start_date=None, end_date=None, column=None):
+    """
+    Conditions selecting years lying entirely inside the range, on `column`
+    (ClosingTotal.fiscal_year by default)
+    """
+    column = ClosingTotal.fiscal_year if column is None else column
+    conditions = []
+    if start_date:
+        first = start_date.year if (start_date.month, start_date.day) == (1, 1) else start_date.year + 1
+        conditions.append(column >= first)
+    if end_date:
+        last = end_date.year if (end_date.month, end_date.day) == (12, 31) else end_date.year - 1
+        conditions.append(column <= last)
+    return conditions
+
+
+def partial_years_filter(archive, start_date=None, end_date=None):
+    """
+    Conditions selecting archived rows inside the range from closed years the
+    range covers only in part (the closing totals account for the rest).
+    None when the range is unbounded, since every closed year is then covered.
+    """
+    covered = closed_years_filter(start_date, end_date, archive.c.fiscal_year)
+    if not covered:
+        return None
+    conditions = [~and_(*covered)]
+    if start_date:
+        conditions.append(archive.c.transaction_date >= start_date)
+    if end_date:
+        conditions.append(archive.c.transaction_date <= end_date)
+    return conditions
+
+
+def closed_total(kind, start_date=None, end_date=None, account_id=None, project_id=None,
+                 currency=None, **filters):
+    """
+    Sum of closing totals of one kind; filters match ClosingTotal columns.
+    With a currency, totals are converted at each closed year's year-end rate.
+    """
+    amount = ClosingTotal.amount
+    if currency:
+        year_end = func.date(func.printf('%04d-12-31', ClosingTotal.fiscal_year))
+        amount = converted(amount, Account.currency, year_end, currency)
+    query = db.session.query(func.sum(amount)).filter(
+        ClosingTotal.kind == kind, *closed_years_filter(start_date, end_date)
+    )
+    if currency:
+        query = query.join(Account, Account.id == ClosingTotal.account_id)
+    if project_id:
+        query = query.filter(ClosingTotal.project_id == project_id)
+    if account_id:
+        query = query.filter(ClosingTotal.account_id == account_id)
+    for column, value in filters.items():
+        query = query.filter(column_matches(getattr(ClosingTotal, column), value))
+    return float(query.scalar() or 0)
+
+
+def archived_total(kind, start_date=None, end_date=None, account_id=None, project_id=None,
+                   currency=None, **filters):
+    """
+    Sum of archived rows of one kind in closed years the range covers only in
+    part; filters match archive columns. With a currency, rows are converted
+    at their own dates.
+    """
+    archive = CLOSED_KINDS[kind][1]
+    conditions = partial_years_filter(archive, start_date, end_date)
+    if conditions is None:
+        return 0.0
+    amount = archive.c.amount
+    if currency:
+        amount = converted(amount, Account.currency, archive.c.transaction_date, currency)
+    query = db.session.query(func.sum(amount)).select_from(archive).filter(*conditions)
+    if currency:
+        query = query.join(Account, Account.id == archive.c.account_id)
+    if project_id:
+        query = query.filter(archive.c.project_id == project_id)
+    if account_id:
+        query = query.filter(archive.c.account_id == account_id)
+    for column, value in filters.items():
+        query = query.filter(column_matches(archive.c[column], value))
+    return float(query.scalar() or 0)
+
+
+def is_year_closed(project_id, *years):
+    """True if any of the years is closed for the project"""
+    if not years:
+        return False
+    return db.session.query(FiscalYearClose.id).filter(
+        FiscalYearClose.project_id == project_id,
+        FiscalYearClose.fiscal_year.in_(set(years))
+    ).first() is not None
+
+
+def latest_closable_year(today=None):
+    """Latest year old enough to close without cutting into trailing report windows"""
+    today = today or date.today()
+    months = current_app.config.get('FISCAL_CLOSE_MIN_AGE_MONTHS', 12)
+    return (today - relativedelta(months=months)).year - 1
+
+
+def get_fiscal_closes(project_id):
+    return FiscalYearClose.query.filter_by(project_id=project_id)\
+        .order_by(FiscalYearClose.fiscal_year).all()
+
+
+def _log_bulk(source, op, condition):
+    """Record archived/restored rows in the change log (bulk writes bypass its hook)"""
+    archiving = op == 'archive'
+    db.session.execute(insert(ChangeLog).from_select(
+        ['table_name', 'row_id', 'op', 'project_id', 'account_id',
+         'old_amount', 'new_amount', 'txn_date', 'changed_at'],
+        select(
+            literal(source.name.removesuffix('_archive')), source.c.id, literal(op),
+            source.c.project_id, source.c.account_id,
+            source.c.amount if archiving else literal(None),
+            literal(None) if archiving else source.c.amount,
+            source.c.transaction_date, literal(datetime.utcnow())
+        ).where(condition)
+    ))
+
+
+def _unlink(kind, ids):
+    """Clear references to rows that are about to be archived"""
+    if not ids:
+        return
+    if kind == 'expense':
+        db.session.execute(
+            update(SalaryPayment)
+            .where(SalaryPayment.expense_transaction_id.in_(ids))
+            .values(expense_transaction_id=None)
+        )
+    db.session.execute(
+        update(RecurringOccurrence)
+        .where(
+            RecurringOccurrence.transaction_id.in_(ids),
+            RecurringOccurrence.recurring_id.in_(
+                select(RecurringTransaction.id).where(RecurringTransaction.kind == kind)
+            )
+        )
+        .values(transaction_id=None)
+    )
+
+
+def _free_archived_ids(table, archive, in_year):
+    """
+    Give archived rows whose id was reused by a detail row (possible only for
+    rows archived before ids became AUTOINCREMENT) fresh ids above both tables
+    """
+    taken = db.session.scalars(
+        select(archive.c.id).where(in_year, archive.c.id.in_(select(table.c.id)))
+    ).all()
+    if not taken:
+        return
+    next_id = max(
+        db.session.scalar(select(func.max(table.c.id))) or 0,
+        db.session.scalar(select(func.max(archive.c.id))) or 0
+    ) + 1
+    for offset, old_id in enumerate(taken):
+        db.session.execute(
+            update(archive).where(archive.c.id == old_id).values(id=next_id + offset)
+        )
+
+
+def close_fiscal_year(project_id, year, today=None):
+    """Summarize and archive a project's income/expense detail for one year"""
+    from app.search import unindex_rows
+
+    if year > latest_closable_year(today):
+        raise FiscalCloseError(f'Year {year} is too recent to close')
+    if FiscalYearClose.query.filter_by(project_id=project_id, fiscal_year=year).first():
+        raise FiscalCloseError(f'Year {year} is already closed')
+
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    totals = {}
+    archived = 0
+    try:
+        for kind, (model, archive, extra) in CLOSED_KINDS.items():
+            table = model.__table__
+            in_year = (table.c.project_id == project_id) & table.c.transaction_date.between(start, end)
+            group = [table.c.account_id, table.c.category_id] + [table.c[name] for name in extra]
+
+            db.session.execute(insert(ClosingTotal).from_select(
+                ['project_id', 'fiscal_year', 'kind', 'account_id', 'category_id', *extra,
+                 'amount', 'row_count'],
+                select(
+                    literal(project_id), literal(year), literal(kind), *group,
+                    func.sum(table.c.amount), func.count()
+                ).where(in_year).group_by(*group)
+            ))
+
+            ids = db.session.scalars(select(table.c.id).where(in_year)).all()
+            unindex_rows(model, ids)
+            _log_bulk(table, 'archive', in_year)
+            _unlink(kind, ids)
+
+            columns = [c.name for c in table.columns]
+            db.session.execute(insert(archive).from_select(
+                columns + ['fiscal_year'],
+                select(*table.c, literal(year)).where(in_year)
+            ))
+            archived += db.session.execute(delete(table).where(in_year)).rowcount
+            totals[kind] = closed_total(kind, start, end, project_id=project_id)
+
+        # Closing totals replace the frozen totals of the year's locked months
+        db.session.execute(delete(PeriodTotal).where(
+            PeriodTotal.project_id == project_id, PeriodTotal.period_start.between(start, end)
+        ))
+        db.session.add(FiscalYearClose(
+            project_id=project_id,
+            fiscal_year=year,
+            income_total=totals['income'],
+            expense_total=totals['expense'],
+            archived_rows=archived
+        ))
+        bump_data_version([project_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return archived
+
+
+def reopen_fiscal_year(project_id, year):
+    """Move a closed year's archived rows back into the detail tables"""
+    from app.search import index_rows
+    from app.period_locks import freeze_months, frozen_months
+
+    closed = FiscalYearClose.query.filter_by(project_id=project_id, fiscal_year=year).first()
+    if closed is None:
+        raise FiscalCloseError(f'Year {year} is not closed')
+
+    restored = 0
+    try:
+        for kind, (model, archive, _) in CLOSED_KINDS.items():
+            table = model.__table__
+            in_year = (archive.c.project_id == project_id) & (archive.c.fiscal_year == year)
+            columns = [c.name for c in table.columns]
+
+            _free_archived_ids(table, archive, in_year)
+            db.session.execute(insert(table).from_select(
+                columns, select(*[archive.c[name] for name in columns]).where(in_year)
+            ))
+            _log_bulk(archive, 'restore', in_year)
+            ids = db.session.scalars(select(archive.c.id).where(in_year)).all()
+            db.session.execute(delete(archive).where(in_year))
+            index_rows(model, ids)
+            restored += len(ids)
+
+        db.session.execute(delete(ClosingTotal).where(
+            ClosingTotal.project_id == project_id, ClosingTotal.fiscal_year == year
+        ))
+        freeze_months(project_id, frozen_months(project_id, date(year, 1, 1), date(year, 12, 31)))
+        db.session.delete(closed)
+        bump_data_version([project_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return restored
+
+
+def closed_account_flows():
+    """Net closed-year cash flow per account, for the ledger's balance check"""
+    return select(
+        ClosingTotal.account_id,
+        func.sum(case((ClosingTotal.kind == 'income', ClosingTotal.amount), else_=-ClosingTotal.amount))
+    ).group_by(ClosingTotal.account_id)
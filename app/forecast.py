@@ -0,0 +1,128 @@
+"""
+Monte Carlo runway forecast.
+
+Historical months of income and operating expenses are bootstrapped
+(each simulated month draws one real month, keeping its income and expenses
+together) and combined with the scheduled loan repayments from the
+amortization engine. Cash paths are simulated for every run at once with
+NumPy. The result is the distribution of months until cash drops below zero.
+"""
+from datetime import date
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import func
+from app.models import db, Account, IncomeTransaction, ExpenseTransaction
+from app.amortization import get_project_debt_service
+from app.cache import cached_for_project
+from app.currency import conversion_target, converted
+from app.utils import calculate_total_balance
+
+
+def get_monthly_history(project_id, months, today=None):
+    """
+    Income and operating expenses per completed month over the last `months`
+    months, starting at the first month with any data. Returns two arrays.
+    """
+    today = today or date.today()
+    current_month = today.replace(day=1)
+    window_start = current_month - relativedelta(months=months)
+    # Amounts in the base currency when the project's accounts mix currencies
+    target = conversion_target(project_id)
+
+    def monthly(model, *filters):
+        month_key = func.strftime('%Y-%m', model.transaction_date)
+        amount = model.amount
+        if target:
+            amount = converted(amount, Account.currency, model.transaction_date, target)
+        query = db.session.query(month_key, func.sum(amount)).filter(
+            model.project_id == project_id,
+            model.transaction_date >= window_start,
+            model.transaction_date < current_month,
+            *filters
+        )
+        if target:
+            query = query.join(Account, Account.id == model.account_id)
+        return dict(query.group_by(month_key).all())
+
+    income = monthly(IncomeTransaction)
+    expenses = monthly(ExpenseTransaction, ExpenseTransaction.phase == 'operating')
+
+    keys = [(window_start + relativedelta(months=i)).strftime('%Y-%m') for i in range(months)]
+    active = [k for k in keys if k in income or k in expenses]
+    if active:
+        keys = keys[keys.index(active[0]):]
+    else:
+        keys = []
+
+    return (np.array([float(income.get(k) or 0) for k in keys]),
+            np.array([float(expenses.get(k) or 0) for k in keys]))
+
+
+def simulate_runway(cash, income, expenses, scheduled, simulations, horizon, seed=None):
+    """
+    Simulate `simulations` cash paths over `horizon` months.
+    `scheduled` holds fixed monthly outflows (loan repayments) from month 0.
+    Returns an array of runway months per path (inf when cash never runs out).
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(income), size=(simulations, horizon))
+
+    fixed = np.zeros(horizon)
+    fixed[:min(len(scheduled), horizon)] = scheduled[:horizon]
+
+    net = income[picks] - expenses[picks] - fixed[None, :]
+    paths = cash + np.cumsum(net, axis=1)
+
+    below = paths < 0
+    ran_out = below.any(axis=1)
+    first = below.argmax(axis=1)
+
+    # Interpolate inside the month cash crosses zero
+    rows = np.arange(simulations)
+    before = np.where(first > 0, paths[rows, np.maximum(first - 1, 0)], cash)
+    drop = before - paths[rows, first]
+    fraction = np.divide(before, drop, out=np.zeros(simulations), where=drop > 0)
+    runway = first + np.clip(fraction, 0, 1)
+
+    if cash < 0:
+        return np.zeros(simulations)
+    return np.where(ran_out, runway, np.inf)
+
+
+def _compute_runway_forecast(project_id):
+    config = current_app.config
+    horizon = config['FORECAST_HORIZON_MONTHS']
+    simulations = config['FORECAST_SIMULATIONS']
+
+    income, expenses = get_monthly_history(project_id, config['FORECAST_HISTORY_MONTHS'])
+    if len(income) == 0:
+        return None
+
+    cash = calculate_total_balance(project_id=project_id)
+    scheduled = get_project_debt_service(project_id)['payment_by_month']
+
+    runway = simulate_runway(cash, income, expenses, scheduled,
+                             simulations, horizon, seed=project_id)
+    p10, p50, p90 = np.percentile(runway, [10, 50, 90], method='inverted_cdf')
+
+    return {
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'prob_out_6': float((runway <= 6).mean() * 100),
+        'prob_out_12': float((runway <= 12).mean() * 100),
+        'history_months': len(income),
+        'simulations': simulations,
+        'horizon': horizon
+    }
+
+
+def get_runway_forecast(project_id):
+    """
+    Runway distribution for a project, cached per project data version and
+    calendar month (the history window and loan schedule move with the month)
+    """
+    month = date.today().replace(day=1)
+    return cached_for_project(project_id, ('runway_forecast', month),
+                              lambda: _compute_runway_forecast(project_id))
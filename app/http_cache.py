@@ -0,0 +1,163 @@
+"""
+HTTP validators for read-only pages and fingerprinted static assets.
+
+GET responses in the data blueprints carry an ETag built from the project's
+data version (or the global version for cross-project views), the request path
+and query parameters, today's date and the code build; Last-Modified is the
+later of projects.updated_at (which moves with every version bump) and the
+start of today, since pages such as the dashboard, due calendar and aging
+report change with the date alone. A matching conditional request is
+answered with 304 before the view runs.
+
+Static URLs get a ?v=<content hash> suffix and are served with a one-year
+immutable Cache-Control, so changed files are picked up through a new URL.
+"""
+import hashlib
+import os
+from datetime import date, datetime, time, timezone
+from flask import request, session, g, current_app
+from flask.globals import request_ctx
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+from app.models import db, Project
+
+
+CONDITIONAL_BLUEPRINTS = {'main', 'reports', 'income', 'expenses', 'loans', 'debts'}
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+_static_hashes = {}
+
+
+def cross_project(view):
+    """Mark a view whose output depends on all projects, not just the selected one"""
+    view.cross_project = True
+    return view
+
+
+def _build_token(app):
+    """Changes when code or templates are deployed, identical across workers"""
+    latest = 0
+    for root, _, files in os.walk(app.root_path):
+        for name in files:
+            if name.endswith(('.py', '.html')):
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return str(int(latest))
+
+
+def _project_state(project_id):
+    """(data_version, updated_at) of one project, or of all projects when None"""
+    if project_id is None:
+        return db.session.query(
+            func.coalesce(func.sum(Project.data_version), 0), func.max(Project.updated_at)
+        ).one()
+    return db.session.query(Project.data_version, Project.updated_at)\
+        .filter(Project.id == project_id).first()
+
+
+def _request_validators():
+    """(etag, last_modified) for the current request, or None when it must not be cached"""
+    view = current_app.view_functions.get(request.endpoint)
+    selected_id = session.get('selected_project_id')
+
+    if getattr(view, 'cross_project', False):
+        project_id = None
+    else:
+        project_id = (request.view_args or {}).get('project_id', selected_id)
+        # Views that switch the selected project have to run to update the session
+        if project_id is None or project_id != selected_id:
+            return None
+
+    state = _project_state(project_id)
+    if state is None:
+        return None
+    version, updated_at = state
+
+    key = repr((
+        current_app.config['HTTP_CACHE_BUILD'], request.path,
+        sorted(request.args.items(multi=True)), selected_id, project_id, version,
+        date.today().isoformat()
+    ))
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    # updated_at is naive UTC; local midnight is converted to match
+    start_of_today = datetime.combine(date.today(), time.min).astimezone(timezone.utc).replace(tzinfo=None)
+    last_modified = max(updated_at or start_of_today, start_of_today).replace(microsecond=0)
+    return etag, last_modified
+
+
+def _short_circuit_not_modified():
+    if request.method != 'GET' or request.blueprint not in CONDITIONAL_BLUEPRINTS:
+        return None
+    # A pending flash message is rendered into the page, so it cannot be a 304
+    if '_flashes' in session:
+        return None
+
+    validators = _request_validators()
+    if validators is None:
+        return None
+    g.http_validators = validators
+
+    etag, last_modified = validators
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+        return _apply_validators(response, etag, last_modified)
+    return None
+
+
+def _apply_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def _add_cache_headers(response):
+    if request.endpoint == 'static':
+        if 'v' in request.args and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    validators = g.pop('http_validators', None)
+    if validators is None or response.status_code != 200 or response.cache_control.no_store:
+        return response
+    # Messages flashed and rendered during this request make the page one-off
+    if request_ctx.flashes or '_flashes' in session:
+        return response
+    return _apply_validators(response, *validators)
+
+
+def _static_hash(filename):
+    """Content hash of a static file, recomputed only when its mtime changes"""
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _static_hashes.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:12]
+    _static_hashes[filename] = (mtime, digest)
+    return digest
+
+
+def _fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        digest = _static_hash(values['filename'])
+        if digest:
+            values['v'] = digest
+
+
+def init_http_cache(app):
+    """Register conditional GET handling and static fingerprinting on the app"""
+    app.config.setdefault('HTTP_CACHE_BUILD', _build_token(app))
+    app.before_request(_short_circuit_not_modified)
+    app.after_request(_add_cache_headers)
+    app.url_defaults(_fingerprint_static_url)
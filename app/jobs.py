@@ -0,0 +1,188 @@
+"""
+In-process background jobs for derived work (balance recompute, rollups, cache warming).
+
+Jobs are rows in `background_jobs`, inserted in the same transaction as the
+write that caused them, so they survive a restart. After the transaction
+commits, a small thread pool drains the table. While a job is pending its
+dedupe_key is set, so a burst of writes to one account queues a single
+recompute; the key is cleared when a worker claims the job, so writes that
+land during the recompute queue a fresh one.
+
+Claiming a job stamps updated_at, which acts as a lease: a job still
+`running` after JOB_LEASE_SECONDS belonged to a process that died, and
+recover() (called from the server entrypoints, never from CLI commands)
+requeues only those, so a job a live worker is executing never runs twice.
+A failed job is retried with exponential backoff (JOB_RETRY_SECONDS,
+doubling) until it has been attempted JOB_MAX_ATTEMPTS times; after that it
+stays `failed` with its last_error, and `flask failed-jobs --retry` requeues it.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, update, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import db, Account, BackgroundJob
+
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+
+
+def job_handler(job_type):
+    """Register a function as the handler for a job type"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """Thread pool that drains the background_jobs table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self._lock = threading.Lock()
+        self._wake_pending = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(app.config.get('JOB_WORKERS', 2), 1),
+            thread_name_prefix='jobs'
+        )
+        app.extensions['job_queue'] = self
+
+    def recover(self):
+        """Requeue jobs whose lease expired (their worker died) and resume draining"""
+        self._requeue_expired()
+        db.session.commit()
+        if BackgroundJob.query.filter_by(status='pending').first() is not None:
+            self.wake()
+
+    def _requeue_expired(self):
+        lease = timedelta(seconds=self.app.config['JOB_LEASE_SECONDS'])
+        db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.status == 'running',
+                   BackgroundJob.updated_at < datetime.utcnow() - lease)
+            .values(status='pending', run_after=None, updated_at=datetime.utcnow())
+        )
+
+    def wake_later(self, seconds):
+        """Wake the workers once a delayed retry becomes due"""
+        timer = threading.Timer(seconds, self.wake)
+        timer.daemon = True
+        timer.start()
+
+    def wake(self):
+        """Schedule a drain unless one is already waiting to start"""
+        with self._lock:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        self.executor.submit(self._drain_in_context)
+
+    def _drain_in_context(self):
+        with self._lock:
+            self._wake_pending = False
+        with self.app.app_context():
+            try:
+                self.drain()
+            finally:
+                db.session.remove()
+
+    def drain(self):
+        """Run due pending jobs until none are left"""
+        while True:
+            job = BackgroundJob.query.filter(
+                BackgroundJob.status == 'pending',
+                or_(BackgroundJob.run_after.is_(None), BackgroundJob.run_after <= datetime.utcnow())
+            ).order_by(BackgroundJob.id).first()
+            if job is None:
+                return
+            job_id, job_type, payload = job.id, job.job_type, job.payload
+            attempts = (job.attempts or 0) + 1
+
+            # Claim atomically; another worker may have taken it already
+            claimed = db.session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.status == 'pending')
+                .values(status='running', dedupe_key=None,
+                        attempts=BackgroundJob.attempts + 1,
+                        updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+
+            self._run(job_id, job_type, payload, attempts)
+
+    def _run(self, job_id, job_type, payload, attempts):
+        handler = JOB_HANDLERS.get(job_type)
+        try:
+            if handler is None:
+                raise LookupError(f'No handler registered for job type {job_type!r}')
+            handler(**json.loads(payload or '{}'))
+            db.session.commit()
+            BackgroundJob.query.filter_by(id=job_id).delete()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Background job %s (%s) failed (attempt %s)', job_id, job_type, attempts)
+            values = {'status': 'failed', 'last_error': str(e), 'updated_at': datetime.utcnow()}
+            if attempts < self.app.config['JOB_MAX_ATTEMPTS']:
+                delay = self.app.config['JOB_RETRY_SECONDS'] * 2 ** (attempts - 1)
+                values.update(status='pending', run_after=datetime.utcnow() + timedelta(seconds=delay))
+                self.wake_later(delay)
+            db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values))
+        db.session.commit()
+
+
+def enqueue_job(job_type, dedupe_key=None, **payload):
+    """
+    Add a job to the current transaction. Workers are woken when it commits.
+    Jobs of the same type and dedupe_key coalesce while pending.
+    """
+    stmt = sqlite_insert(BackgroundJob).values(
+        job_type=job_type,
+        payload=json.dumps(payload),
+        dedupe_key=f'{job_type}:{dedupe_key}' if dedupe_key is not None else None,
+        status='pending',
+        attempts=0,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['dedupe_key'])
+    db.session.execute(stmt)
+    db.session.info['job_queue'] = current_app.extensions['job_queue']
+
+
+def enqueue_balance_update(*account_ids):
+    """Queue a coalesced balance recompute for each given account"""
+    for account_id in {a for a in account_ids if a}:
+        enqueue_job('recompute_balance', dedupe_key=account_id, account_id=account_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session):
+    queue = session.info.pop('job_queue', None)
+    if queue is not None:
+        queue.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('job_queue', None)
+
+
+@job_handler('recompute_balance')
+def recompute_balance(account_id):
+    account = db.session.get(Account, account_id)
+    if account:
+        account.update_balance()
@@ -0,0 +1,139 @@
+"""
+Daily KPI snapshots per project.
+
+`flask snapshot-kpis` (run nightly from cron) stores burn rate, cash, runway,
+margins, ROI and operating cost ratio for every active project. Computing the
+KPI report refreshes the day's row as well, and the dashboard reads today's
+values from the table, recomputing only when the project's data version has
+moved on. Trends use the last snapshot of each month.
+"""
+import math
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import db, Project, KpiSnapshot
+from app.cache import get_data_version
+
+
+KPI_FIELDS = (
+    'burn_rate', 'total_cash', 'runway_months', 'gross_margin_pct',
+    'net_margin_pct', 'roi_pct', 'operating_cost_ratio'
+)
+
+
+def save_kpi_snapshot(project_id, day, values, data_version):
+    """Insert or replace the project's snapshot for the day"""
+    row = {field: values[field] for field in KPI_FIELDS}
+    if math.isinf(row['runway_months']):
+        row['runway_months'] = None
+    row = {field: round(value, 2) if value is not None else None for field, value in row.items()}
+
+    stmt = sqlite_insert(KpiSnapshot).values(
+        project_id=project_id,
+        snapshot_date=day,
+        data_version=data_version,
+        created_at=datetime.utcnow(),
+        **row
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['project_id', 'snapshot_date'],
+        set_={key: stmt.excluded[key] for key in ('data_version', 'created_at') + KPI_FIELDS}
+    ))
+
+
+def get_kpi_snapshot(project_id, day=None):
+    """The day's snapshot if it still matches the project's data, else None"""
+    snapshot = KpiSnapshot.query.filter_by(
+        project_id=project_id, snapshot_date=day or date.today()
+    ).first()
+    if snapshot is None or snapshot.data_version != get_data_version(project_id):
+        return None
+    return snapshot
+
+
+def _snapshot_project(project, day):
+    from app.report_jobs import build_kpis
+
+    version = get_data_version(project.id)
+    save_kpi_snapshot(project.id, day, build_kpis(project, day), version)
+
+
+def get_today_kpis(project):
+    """Today's snapshot for a project, computed and stored on a miss"""
+    snapshot = get_kpi_snapshot(project.id)
+    if snapshot is None:
+        _snapshot_project(project, date.today())
+        db.session.commit()
+        snapshot = get_kpi_snapshot(project.id)
+    return snapshot
+
+
+def take_kpi_snapshots(day=None):
+    """Snapshot every active project whose row for the day is missing or stale"""
+    day = day or date.today()
+    taken = 0
+    try:
+        for project in Project.query.filter_by(is_active=True).order_by(Project.id):
+            if get_kpi_snapshot(project.id, day) is None:
+                _snapshot_project(project, day)
+                taken += 1
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return taken
+
+
+def get_kpi_trend(project_id, months=12, today=None):
+    """Last snapshot of each month over the trailing months, oldest first"""
+    today = today or date.today()
+    start = today.replace(day=1) - relativedelta(months=months - 1)
+
+    month = func.strftime('%Y-%m', KpiSnapshot.snapshot_date)
+    ranked = select(
+        KpiSnapshot,
+        month.label('month'),
+        func.row_number().over(
+            partition_by=month, order_by=KpiSnapshot.snapshot_date.desc()
+        ).label('rank')
+    ).where(
+        KpiSnapshot.project_id == project_id,
+        KpiSnapshot.snapshot_date >= start,
+        KpiSnapshot.snapshot_date <= today
+    ).subquery()
+
+    rows = db.session.execute(
+        select(ranked).where(ranked.c.rank == 1).order_by(ranked.c.snapshot_date)
+    ).mappings().all()
+
+    return [
+        dict(month=row['month'], snapshot_date=row['snapshot_date'],
+             **{field: float(row[field]) if row[field] is not None else None for field in KPI_FIELDS})
+        for row in rows
+    ]
+
+
+def trend_chart(trend, field, width=300, height=80, pad=6):
+    """SVG polyline points for one KPI across the trend, or None with fewer than two values"""
+    points = [(i, row[field]) for i, row in enumerate(trend) if row[field] is not None]
+    if len(points) < 2:
+        return None
+
+    values = [value for _, value in points]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    step = (width - 2 * pad) / max(len(trend) - 1, 1)
+    coords = [
+        (pad + i * step, pad + (high - value) / span * (height - 2 * pad))
+        for i, value in points
+    ]
+    return {
+        'points': ' '.join(f'{x:.1f},{y:.1f}' for x, y in coords),
+        'last_x': coords[-1][0],
+        'last_y': coords[-1][1],
+        'min': low,
+        'max': high,
+        'first_month': trend[points[0][0]]['month'],
+        'last_month': trend[points[-1][0]]['month']
+    }
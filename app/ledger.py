@@ -0,0 +1,209 @@
+"""
+Set-based verification and rebuild of derived financial state.
+
+Account.current_balance, Debt.remaining_amount/payment_status/is_paid and
+Loan.remaining_amount/is_paid are all derivable from the transaction tables.
+Each check below recomputes one of them for every row with grouped queries and
+returns only the rows whose stored value drifted.
+"""
+from sqlalchemy import func, select, union_all, case, update
+from app.models import (
+    db, bump_data_version, Account, IncomeTransaction, ExpenseTransaction,
+    Debt, DebtPayment, Loan, LoanPayment, Transfer
+)
+from app.change_log import log_rows
+from app.fiscal import closed_account_flows
+
+
+# Cash effect of a debt on its account:
+# owed BY us = someone gave us money (cash IN), owed TO us = we gave money (cash OUT)
+debt_cash_flow = case(
+    (Debt.debt_type == 'owed_by_us', Debt.original_amount),
+    else_=-Debt.original_amount
+)
+
+# Cash effect of a debt payment: they pay us back (IN) or we pay back (OUT)
+debt_payment_cash_flow = case(
+    (Debt.debt_type == 'owed_to_us', DebtPayment.amount),
+    else_=-DebtPayment.amount
+)
+
+
+def _money(value):
+    return func.round(func.coalesce(value, 0), 2)
+
+
+def account_flow_totals():
+    """Net cash flow per account across all movement tables, one row per account"""
+    flows = union_all(
+        select(IncomeTransaction.account_id.label('account_id'),
+               func.sum(IncomeTransaction.amount).label('total'))
+        .group_by(IncomeTransaction.account_id),
+        select(ExpenseTransaction.account_id, -func.sum(ExpenseTransaction.amount))
+        .group_by(ExpenseTransaction.account_id),
+        select(Loan.account_id, func.sum(Loan.amount))
+        .group_by(Loan.account_id),
+        select(LoanPayment.account_id, -func.sum(LoanPayment.amount))
+        .group_by(LoanPayment.account_id),
+        select(Debt.account_id, func.sum(debt_cash_flow))
+        .where(Debt.account_id.isnot(None))
+        .group_by(Debt.account_id),
+        select(DebtPayment.account_id, func.sum(debt_payment_cash_flow))
+        .join(Debt, DebtPayment.debt_id == Debt.id)
+        .where(DebtPayment.account_id.isnot(None))
+        .group_by(DebtPayment.account_id),
+        select(Transfer.to_account_id, func.sum(Transfer.amount))
+        .group_by(Transfer.to_account_id),
+        select(Transfer.from_account_id, -func.sum(Transfer.amount))
+        .group_by(Transfer.from_account_id),
+        closed_account_flows()
+    ).subquery()
+
+    return select(
+        flows.c.account_id,
+        func.sum(flows.c.total).label('total')
+    ).group_by(flows.c.account_id).subquery()
+
+
+def find_account_drift(project_id=None):
+    """Accounts whose current_balance differs from initial balance + net flows"""
+    totals = account_flow_totals()
+    expected = func.coalesce(Account.initial_balance, 0) + func.coalesce(totals.c.total, 0)
+
+    query = select(
+        Account.id,
+        Account.project_id,
+        Account.name,
+        Account.current_balance.label('stored_balance'),
+        expected.label('expected_balance')
+    ).outerjoin(totals, totals.c.account_id == Account.id)\
+     .where(_money(Account.current_balance) != _money(expected))
+
+    if project_id:
+        query = query.where(Account.project_id == project_id)
+
+    return db.session.execute(query.order_by(Account.id)).all()
+
+
+def find_debt_drift(project_id=None):
+    """Debts whose remaining amount or payment status disagrees with their payments"""
+    paid = select(
+        DebtPayment.debt_id,
+        func.sum(DebtPayment.amount).label('paid')
+    ).group_by(DebtPayment.debt_id).subquery()
+
+    expected_remaining = Debt.original_amount - func.coalesce(paid.c.paid, 0)
+    expected_status = case(
+        (_money(expected_remaining) <= 0, 'paid'),
+        (_money(expected_remaining) < _money(Debt.original_amount), 'partial'),
+        else_='unpaid'
+    )
+    expected_is_paid = case((_money(expected_remaining) <= 0, True), else_=False)
+
+    query = select(
+        Debt.id,
+        Debt.project_id,
+        Debt.person_name,
+        Debt.remaining_amount.label('stored_remaining'),
+        expected_remaining.label('expected_remaining'),
+        Debt.payment_status.label('stored_status'),
+        expected_status.label('expected_status'),
+        Debt.is_paid.label('stored_is_paid'),
+        expected_is_paid.label('expected_is_paid')
+    ).outerjoin(paid, paid.c.debt_id == Debt.id)\
+     .where(
+        (_money(Debt.remaining_amount) != _money(expected_remaining))
+        | (func.coalesce(Debt.payment_status, '') != expected_status)
+        | (func.coalesce(Debt.is_paid, False) != expected_is_paid)
+    )
+
+    if project_id:
+        query = query.where(Debt.project_id == project_id)
+
+    return db.session.execute(query.order_by(Debt.id)).all()
+
+
+def find_loan_drift(project_id=None):
+    """Loans whose remaining amount or paid flag disagrees with their payments"""
+    paid = select(
+        LoanPayment.loan_id,
+        func.sum(LoanPayment.amount).label('paid')
+    ).group_by(LoanPayment.loan_id).subquery()
+
+    outstanding = Loan.amount - func.coalesce(paid.c.paid, 0)
+    expected_remaining = case((_money(outstanding) <= 0, 0), else_=outstanding)
+    expected_is_paid = case((_money(outstanding) <= 0, True), else_=False)
+
+    query = select(
+        Loan.id,
+        Loan.project_id,
+        Loan.lender_name,
+        Loan.remaining_amount.label('stored_remaining'),
+        expected_remaining.label('expected_remaining'),
+        Loan.is_paid.label('stored_is_paid'),
+        expected_is_paid.label('expected_is_paid')
+    ).outerjoin(paid, paid.c.loan_id == Loan.id)\
+     .where(
+        (_money(Loan.remaining_amount) != _money(expected_remaining))
+        | (func.coalesce(Loan.is_paid, False) != expected_is_paid)
+    )
+
+    if project_id:
+        query = query.where(Loan.project_id == project_id)
+
+    return db.session.execute(query.order_by(Loan.id)).all()
+
+
+def verify_ledger(project_id=None):
+    """Return all drifted rows, keyed by table"""
+    return {
+        'accounts': find_account_drift(project_id),
+        'debts': find_debt_drift(project_id),
+        'loans': find_loan_drift(project_id)
+    }
+
+
+def rebuild_ledger(project_id=None):
+    """
+    Recompute every derived column and write back the drifted rows
+    in a single transaction. Returns the drift that was fixed.
+    """
+    drift = verify_ledger(project_id)
+
+    try:
+        if drift['accounts']:
+            db.session.execute(update(Account), [
+                {'id': row.id, 'current_balance': round(float(row.expected_balance), 2)}
+                for row in drift['accounts']
+            ])
+        if drift['debts']:
+            db.session.execute(update(Debt), [
+                {
+                    'id': row.id,
+                    'remaining_amount': round(float(row.expected_remaining), 2),
+                    'payment_status': row.expected_status,
+                    'is_paid': bool(row.expected_is_paid)
+                }
+                for row in drift['debts']
+            ])
+        if drift['loans']:
+            db.session.execute(update(Loan), [
+                {
+                    'id': row.id,
+                    'remaining_amount': round(float(row.expected_remaining), 2),
+                    'is_paid': bool(row.expected_is_paid)
+                }
+                for row in drift['loans']
+            ])
+        # Bulk updates bypass the flush hooks, so bump versions and log explicitly
+        bump_data_version(row.project_id for rows in drift.values() for row in rows)
+        for model, rows in ((Debt, drift['debts']), (Loan, drift['loans'])):
+            log_rows(model, [row.id for row in rows], 'update', {
+                row.id: (row.stored_remaining, round(float(row.expected_remaining), 2)) for row in rows
+            })
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return drift
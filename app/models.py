@@ -1,6 +1,7 @@
 from datetime import datetime, date, timedelta
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, case, event, update, or_
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -16,6 +17,7 @@ class Project(db.Model):
     phase = db.Column(db.String(20), default='building')  # 'building' or 'operating'
     owner_capital = db.Column(db.Numeric(15, 2), default=0.00)  # Initial investment/capital
     is_active = db.Column(db.Boolean, default=True)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every financial write
 
     def set_pin(self, pin):
         """Hash and store the PIN"""
@@ -58,6 +60,7 @@ class Account(db.Model):
     account_type_id = db.Column(db.Integer, db.ForeignKey('account_types.id'), nullable=False)
     initial_balance = db.Column(db.Numeric(15, 2), default=0.00)
     current_balance = db.Column(db.Numeric(15, 2), default=0.00)
+    currency = db.Column(db.String(3), nullable=False, default='EGP')  # ISO code; amounts are in this currency
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -102,6 +105,17 @@ class Account(db.Model):
                 Debt.debt_type == 'owed_to_us'
             ).scalar() or 0
 
+        # Transfers between accounts (cash IN to the receiving account, OUT of the sender)
+        transfers_in = db.session.query(func.sum(Transfer.amount))\
+            .filter(Transfer.to_account_id == self.id).scalar() or 0
+        transfers_out = db.session.query(func.sum(Transfer.amount))\
+            .filter(Transfer.from_account_id == self.id).scalar() or 0
+
+        # Closed fiscal years: archived income/expenses are kept as totals
+        closed_net = db.session.query(func.sum(case(
+            (ClosingTotal.kind == 'income', ClosingTotal.amount), else_=-ClosingTotal.amount
+        ))).filter(ClosingTotal.account_id == self.id).scalar() or 0
+
         self.current_balance = (float(self.initial_balance) 
                                 + float(total_income) 
                                 - float(total_expenses)
@@ -110,7 +124,10 @@ class Account(db.Model):
                                 + float(total_debts_by_us)
                                 - float(total_debts_to_us)
                                 - float(debt_payments_by_us)
-                                + float(debt_payments_to_us))
+                                + float(debt_payments_to_us)
+                                + float(transfers_in)
+                                - float(transfers_out)
+                                + float(closed_net))
         db.session.commit()
 
 
@@ -142,10 +159,16 @@ class ExpenseCategory(db.Model):
 
 class IncomeTransaction(db.Model):
     __tablename__ = 'income_transactions'
+    __table_args__ = (
+        db.Index('ix_income_project_date', 'project_id', 'transaction_date'),
+        db.Index('ix_income_project_category', 'project_id', 'category_id', 'transaction_date'),
+        db.Index('ix_income_project_account', 'project_id', 'account_id', 'transaction_date'),
+        {'sqlite_autoincrement': True},  # Archived ids must never be reused (fiscal close)
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('income_categories.id'), nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     transaction_date = db.Column(db.Date, nullable=False, default=date.today)
@@ -156,10 +179,18 @@ class IncomeTransaction(db.Model):
 
 class ExpenseTransaction(db.Model):
     __tablename__ = 'expense_transactions'
+    __table_args__ = (
+        db.Index('ix_expense_project_date', 'project_id', 'transaction_date'),
+        db.Index('ix_expense_project_category', 'project_id', 'category_id', 'transaction_date'),
+        db.Index('ix_expense_project_account', 'project_id', 'account_id', 'transaction_date'),
+        db.Index('ix_expense_project_phase', 'project_id', 'phase', 'is_direct_cost', 'transaction_date'),
+        db.Index('ix_expense_project_salary', 'project_id', 'is_salary', 'transaction_date'),
+        {'sqlite_autoincrement': True},  # Archived ids must never be reused (fiscal close)
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('expense_categories.id'), nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     transaction_date = db.Column(db.Date, nullable=False, default=date.today)
@@ -192,6 +223,9 @@ class Employee(db.Model):
 
 class SalaryPayment(db.Model):
     __tablename__ = 'salary_payments'
+    __table_args__ = (
+        db.Index('ix_salary_payments_employee_date', 'employee_id', 'payment_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
@@ -202,6 +236,7 @@ class SalaryPayment(db.Model):
     commission = db.Column(db.Numeric(15, 2), default=0.00)
     net_salary = db.Column(db.Numeric(15, 2), nullable=False)
     expense_transaction_id = db.Column(db.Integer, db.ForeignKey('expense_transactions.id'))
+    payroll_run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id'), index=True)  # Set when paid in a batch
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -213,8 +248,40 @@ class SalaryPayment(db.Model):
                          float(self.bonus or 0) + float(self.commission or 0)
 
 
+class PayrollRun(db.Model):
+    __tablename__ = 'payroll_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    payment_date = db.Column(db.Date, nullable=False, default=date.today)
+    employee_count = db.Column(db.Integer, nullable=False, default=0)
+    total_net = db.Column(db.Numeric(15, 2), nullable=False, default=0.00)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    account = db.relationship('Account')
+    salary_payments = db.relationship('SalaryPayment', backref='payroll_run', lazy='dynamic')
+
+
+class Counterparty(db.Model):
+    __tablename__ = 'counterparties'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)  # Spelling as first entered
+    name_key = db.Column(db.String(200), nullable=False, unique=True)  # Normalized, for lookup and prefix search
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    debts = db.relationship('Debt', backref='counterparty', lazy='dynamic')
+    loans = db.relationship('Loan', backref='counterparty', lazy='dynamic')
+
+
 class Debt(db.Model):
     __tablename__ = 'debts'
+    __table_args__ = (
+        db.Index('ix_debts_aging', 'project_id', 'debt_type', 'is_paid', 'due_date'),
+        db.Index('ix_debts_due', 'is_paid', 'due_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -222,10 +289,11 @@ class Debt(db.Model):
     person_name = db.Column(db.String(200), nullable=False)
     original_amount = db.Column(db.Numeric(15, 2), nullable=False)
     remaining_amount = db.Column(db.Numeric(15, 2), nullable=False)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))  # Account linked to debt
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), index=True)  # Account linked to debt
     due_date = db.Column(db.Date)
     is_paid = db.Column(db.Boolean, default=False)
     payment_status = db.Column(db.String(20), default='unpaid')  # unpaid, partial, paid
+    counterparty_id = db.Column(db.Integer, db.ForeignKey('counterparties.id'), index=True)  # Linked from person_name
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -263,7 +331,7 @@ class DebtPayment(db.Model):
     debt_id = db.Column(db.Integer, db.ForeignKey('debts.id'), nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     payment_date = db.Column(db.Date, nullable=False, default=date.today)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), index=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -272,6 +340,9 @@ class DebtPayment(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        db.Index('ix_loans_due', 'is_paid', 'due_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -282,8 +353,9 @@ class Loan(db.Model):
     interest_rate = db.Column(db.Numeric(5, 2), default=0.00)
     remaining_amount = db.Column(db.Numeric(15, 2), nullable=False)
     is_paid = db.Column(db.Boolean, default=False)
+    counterparty_id = db.Column(db.Integer, db.ForeignKey('counterparties.id'), index=True)  # Linked from lender_name
     notes = db.Column(db.Text)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -317,13 +389,30 @@ class LoanPayment(db.Model):
     loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     payment_date = db.Column(db.Date, nullable=False, default=date.today)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     account = db.relationship('Account', foreign_keys=[account_id])
 
 
+class Transfer(db.Model):
+    """Cash moved between two accounts of a project; neither income nor expense"""
+    __tablename__ = 'transfers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    from_account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
+    to_account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    transfer_date = db.Column(db.Date, nullable=False, default=date.today)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    from_account = db.relationship('Account', foreign_keys=[from_account_id])
+    to_account = db.relationship('Account', foreign_keys=[to_account_id])
+
+
 class SystemSetting(db.Model):
     __tablename__ = 'system_settings'
 
@@ -332,3 +421,305 @@ class SystemSetting(db.Model):
     setting_value = db.Column(db.Text)
     description = db.Column(db.Text)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ExchangeRate(db.Model):
+    """Base-currency value of one unit of a currency from rate_date on"""
+    __tablename__ = 'exchange_rates'
+    __table_args__ = (
+        db.UniqueConstraint('currency', 'rate_date', name='uq_exchange_rates_currency_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    currency = db.Column(db.String(3), nullable=False)
+    rate_date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Numeric(18, 6), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)  # JSON keyword arguments for the handler
+    dedupe_key = db.Column(db.String(200), unique=True)  # Set while pending so bursts coalesce
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, running, failed
+    attempts = db.Column(db.Integer, default=0)
+    run_after = db.Column(db.DateTime)  # Retry backoff: a pending job waits until then
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReportResult(db.Model):
+    """Last computed result of an all-time report, valid while data_version matches"""
+    __tablename__ = 'report_results'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'report_type', name='uq_report_results_project_report'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    report_type = db.Column(db.String(30), nullable=False)  # equity, roi, kpis
+    params_key = db.Column(db.String(50), nullable=False, default='')  # e.g. as-of date for date-relative reports
+    data_version = db.Column(db.Integer, nullable=False)  # Project version the result was computed from
+    result = db.Column(db.Text, nullable=False)  # JSON template values
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class KpiSnapshot(db.Model):
+    """Daily KPI values per project, kept for month-over-month trends"""
+    __tablename__ = 'kpi_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'snapshot_date', name='uq_kpi_snapshots_project_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    data_version = db.Column(db.Integer, nullable=False)  # Project version the values were computed from
+    burn_rate = db.Column(db.Numeric(15, 2), nullable=False)
+    total_cash = db.Column(db.Numeric(15, 2), nullable=False)
+    runway_months = db.Column(db.Numeric(10, 2))  # NULL when there is no burn (infinite runway)
+    gross_margin_pct = db.Column(db.Numeric(10, 2), nullable=False)
+    net_margin_pct = db.Column(db.Numeric(10, 2), nullable=False)
+    roi_pct = db.Column(db.Numeric(10, 2), nullable=False)
+    operating_cost_ratio = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ChangeLog(db.Model):
+    """Append-only record of every write to a financial table, ordered by seq"""
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}  # seq values are never reused
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    project_id = db.Column(db.Integer)
+    account_id = db.Column(db.Integer)
+    old_amount = db.Column(db.Numeric(15, 2))
+    new_amount = db.Column(db.Numeric(15, 2))
+    txn_date = db.Column(db.Date)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ChangeLogCheckpoint(db.Model):
+    """Last change_log seq processed by a named consumer"""
+    __tablename__ = 'change_log_checkpoints'
+
+    consumer = db.Column(db.String(100), primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FiscalYearClose(db.Model):
+    """A project's closed fiscal (calendar) year; its detail rows live in the archive tables"""
+    __tablename__ = 'fiscal_year_closes'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'fiscal_year', name='uq_fiscal_year_closes_project_year'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    fiscal_year = db.Column(db.Integer, nullable=False)
+    income_total = db.Column(db.Numeric(15, 2), nullable=False)
+    expense_total = db.Column(db.Numeric(15, 2), nullable=False)
+    archived_rows = db.Column(db.Integer, nullable=False)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ClosingTotal(db.Model):
+    """Per-account and per-category totals of a closed year, standing in for its archived rows"""
+    __tablename__ = 'closing_totals'
+    __table_args__ = (
+        db.Index('ix_closing_totals_project_kind', 'project_id', 'kind', 'fiscal_year'),
+        db.Index('ix_closing_totals_account', 'account_id', 'kind'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    fiscal_year = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    category_id = db.Column(db.Integer)
+    phase = db.Column(db.String(20))  # Expenses only
+    is_direct_cost = db.Column(db.Boolean)  # Expenses only
+    is_salary = db.Column(db.Boolean)  # Expenses only
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+
+
+class Budget(db.Model):
+    """Planned spend of an expense category in one month of a project"""
+    __tablename__ = 'budgets'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'month', 'category_id', name='uq_budgets_project_month_category'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('expense_categories.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    amount = db.Column(db.Numeric(15, 2), nullable=False)  # Base currency
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    category = db.relationship('ExpenseCategory')
+
+
+class RecurringTransaction(db.Model):
+    """Template for an income or expense that repeats on a fixed schedule"""
+    __tablename__ = 'recurring_transactions'
+    __table_args__ = (
+        db.Index('ix_recurring_due', 'is_active', 'next_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)  # income or expense category, by kind
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    frequency = db.Column(db.String(20), nullable=False)  # 'weekly', 'monthly', 'quarterly', 'yearly'
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)
+    next_date = db.Column(db.Date)  # Next occurrence not yet materialized; NULL once finished
+    phase = db.Column(db.String(20), default='operating')  # Expenses only
+    is_direct_cost = db.Column(db.Boolean, default=False)  # Expenses only
+    notes = db.Column(db.Text)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    account = db.relationship('Account')
+    occurrences = db.relationship('RecurringOccurrence', backref='template', lazy='dynamic',
+                                  cascade='all, delete-orphan')
+
+
+class RecurringOccurrence(db.Model):
+    """One materialized occurrence; the unique key makes re-runs insert nothing twice"""
+    __tablename__ = 'recurring_occurrences'
+    __table_args__ = (
+        db.UniqueConstraint('recurring_id', 'occurrence_date', name='uq_recurring_occurrences_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recurring_id = db.Column(db.Integer, db.ForeignKey('recurring_transactions.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    transaction_id = db.Column(db.Integer)  # income_transactions or expense_transactions id, by kind
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PeriodLock(db.Model):
+    """A locked month of a project; its income/expense totals are frozen in period_totals"""
+    __tablename__ = 'period_locks'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'period_start', name='uq_period_locks_project_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)  # First day of the month
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PeriodTotal(db.Model):
+    """Frozen per-account and per-category totals of a locked month"""
+    __tablename__ = 'period_totals'
+    __table_args__ = (
+        db.Index('ix_period_totals_project_kind', 'project_id', 'kind', 'period_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    category_id = db.Column(db.Integer)
+    phase = db.Column(db.String(20))  # Expenses only
+    is_direct_cost = db.Column(db.Boolean)  # Expenses only
+    is_salary = db.Column(db.Boolean)  # Expenses only
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+
+
+def _archive_table(table):
+    """Same columns as a transaction table plus the fiscal year it was closed in"""
+    return db.Table(
+        f'{table.name}_archive', db.metadata,
+        *[db.Column(c.name, c.type, primary_key=c.primary_key) for c in table.columns],
+        db.Column('fiscal_year', db.Integer, nullable=False),
+        db.Index(f'ix_{table.name}_archive_project_year', 'project_id', 'fiscal_year')
+    )
+
+
+income_archive = _archive_table(IncomeTransaction.__table__)
+expense_archive = _archive_table(ExpenseTransaction.__table__)
+
+
+# === COLUMN FILTERS ===
+
+def column_matches(column, value):
+    """
+    Equality condition for report filters. Boolean flags default to False, so
+    a False filter also matches NULL (e.g. expenses with no is_direct_cost
+    flag count as operating expenses in every report).
+    """
+    if value is False:
+        return or_(column == False, column.is_(None))
+    return column == value
+
+
+# === PROJECT DATA VERSION ===
+# Any flush that touches a project's financial rows bumps projects.data_version
+# in the same transaction, so caches keyed by (project_id, data_version) are
+# invalidated exactly when the underlying data changes.
+
+VERSIONED_MODELS = (
+    Project, Account, IncomeTransaction, ExpenseTransaction, Employee,
+    SalaryPayment, Debt, DebtPayment, Loan, LoanPayment, Transfer
+)
+
+
+def _project_id_of(session, obj):
+    """Resolve the owning project of a financial row"""
+    if isinstance(obj, Project):
+        return obj.id
+    if isinstance(obj, DebtPayment):
+        parent = obj.debt or session.get(Debt, obj.debt_id)
+    elif isinstance(obj, LoanPayment):
+        parent = obj.loan or session.get(Loan, obj.loan_id)
+    elif isinstance(obj, SalaryPayment):
+        parent = obj.employee or session.get(Employee, obj.employee_id)
+    else:
+        return obj.project_id
+    return parent.project_id if parent is not None else None
+
+
+def bump_data_version(project_ids, session=None):
+    """Increment data_version for the given projects"""
+    project_ids = {p for p in project_ids if p}
+    if not project_ids:
+        return
+    projects = Project.__table__
+    (session or db.session).connection().execute(
+        update(projects)
+        .where(projects.c.id.in_(project_ids))
+        .values(data_version=projects.c.data_version + 1)
+    )
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_versions_before_flush(session, flush_context, instances):
+    project_ids = set()
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if not isinstance(obj, VERSIONED_MODELS):
+                continue
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            project_ids.add(_project_id_of(session, obj))
+    bump_data_version(project_ids, session)
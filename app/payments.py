@@ -0,0 +1,92 @@
+"""
+Debt and loan payments.
+
+A payment is applied with one conditional UPDATE that decrements the
+outstanding amount only while it still covers the payment, and derives the
+paid/partial status from the new amount in the same statement. The payment
+row is inserted in the same transaction. Two concurrent payments cannot both
+pass the check and overwrite each other: the second one matches no row and
+is rejected, with no read-modify-write window in between.
+"""
+from sqlalchemy import func, case, update
+from app.models import db, Debt, DebtPayment, Loan, LoanPayment
+from app.jobs import enqueue_balance_update
+from app.change_log import log_rows
+
+
+class OverpaymentError(ValueError):
+    """Raised when a payment exceeds the amount still outstanding"""
+
+
+def _decrement(model, row_id, amount, status_values):
+    """
+    Conditionally decrement remaining_amount; returns the new remaining amount,
+    or None when it no longer covers the amount
+    """
+    remaining = func.round(model.remaining_amount - amount, 2)
+    return db.session.execute(
+        update(model)
+        .where(model.id == row_id, model.remaining_amount >= amount)
+        .values(remaining_amount=remaining, **status_values(remaining))
+        .returning(model.remaining_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def _apply(model, row_id, amount, status_values, payment, account_ids):
+    try:
+        remaining = _decrement(model, row_id, amount, status_values)
+        if remaining is None:
+            raise OverpaymentError(row_id)
+        db.session.add(payment)
+        # Core UPDATEs bypass the flush hook (and leave the session's copy stale),
+        # so log the parent row's remaining amount before and after explicitly
+        log_rows(model, [row_id], 'update', {row_id: (round(float(remaining) + amount, 2), remaining)})
+        enqueue_balance_update(*account_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return payment
+
+
+def pay_debt(debt, amount, account_id, payment_date, notes=None):
+    """Record a payment on a debt; raises OverpaymentError if it exceeds the remaining amount"""
+    amount = round(amount, 2)
+
+    def status_values(remaining):
+        return {
+            'payment_status': case(
+                (remaining <= 0, 'paid'),
+                (remaining < func.round(Debt.original_amount, 2), 'partial'),
+                else_='unpaid'
+            ),
+            'is_paid': remaining <= 0
+        }
+
+    payment = DebtPayment(
+        debt_id=debt.id,
+        amount=amount,
+        payment_date=payment_date,
+        account_id=account_id,
+        notes=notes
+    )
+    # Rebalance the payment account and the original debt account
+    return _apply(Debt, debt.id, amount, status_values, payment, (account_id, debt.account_id))
+
+
+def pay_loan(loan, amount, account_id, payment_date, notes=None):
+    """Record a payment on a loan; raises OverpaymentError if it exceeds the remaining amount"""
+    amount = round(amount, 2)
+
+    def status_values(remaining):
+        return {'is_paid': remaining <= 0}
+
+    payment = LoanPayment(
+        loan_id=loan.id,
+        amount=amount,
+        payment_date=payment_date,
+        account_id=account_id,
+        notes=notes
+    )
+    return _apply(Loan, loan.id, amount, status_values, payment, (account_id,))
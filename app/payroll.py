@@ -0,0 +1,155 @@
+"""
+Batch payroll runs and payroll cost analytics.
+
+A run pays a set of employees from one account on one date. All expense
+transactions and salary payments are written with two bulk INSERTs in a
+single transaction, and the paying account is rebalanced once.
+
+The analytics aggregate salary_payments with one grouped query per table,
+using window functions for running and share-of-total figures.
+"""
+from datetime import date, datetime
+from sqlalchemy import insert, select, func, case
+from app.models import (
+    db, bump_data_version, PayrollRun, Employee, SalaryPayment, ExpenseTransaction, ExpenseCategory
+)
+from app.jobs import enqueue_balance_update
+from app.search import index_rows
+from app.change_log import log_rows
+
+
+def run_payroll(project_id, account_id, payment_date, entries, notes=''):
+    """
+    Pay every entry in one transaction and return the PayrollRun.
+
+    `entries` is a list of dicts with employee (an Employee), base_salary,
+    deductions, bonus and commission.
+    """
+    salary_category = ExpenseCategory.query.filter_by(name_en='salaries').first()
+    category_id = salary_category.id if salary_category else 1
+    now = datetime.utcnow()
+
+    # Same formula as SalaryPayment.calculate_net_salary
+    for e in entries:
+        e['net_salary'] = e['base_salary'] - e['deductions'] + e['bonus'] + e['commission']
+
+    try:
+        payroll_run = PayrollRun(
+            project_id=project_id,
+            account_id=account_id,
+            payment_date=payment_date,
+            employee_count=len(entries),
+            total_net=round(sum(e['net_salary'] for e in entries), 2),
+            notes=notes
+        )
+        db.session.add(payroll_run)
+        db.session.flush()
+
+        expense_ids = db.session.scalars(
+            insert(ExpenseTransaction).returning(ExpenseTransaction.id, sort_by_parameter_order=True),
+            [
+                {
+                    'project_id': project_id,
+                    'account_id': account_id,
+                    'category_id': category_id,
+                    'amount': e['net_salary'],
+                    'transaction_date': payment_date,
+                    'phase': 'operating',
+                    'notes': f"راتب {e['employee'].name} - {notes}",
+                    'is_salary': True,
+                    'is_direct_cost': False,
+                    'employee_id': e['employee'].id,
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for e in entries
+            ]
+        ).all()
+
+        db.session.execute(insert(SalaryPayment), [
+            {
+                'employee_id': e['employee'].id,
+                'payment_date': payment_date,
+                'base_salary': e['base_salary'],
+                'deductions': e['deductions'],
+                'bonus': e['bonus'],
+                'commission': e['commission'],
+                'net_salary': e['net_salary'],
+                'expense_transaction_id': expense_id,
+                'payroll_run_id': payroll_run.id,
+                'notes': notes,
+                'created_at': now
+            }
+            for e, expense_id in zip(entries, expense_ids)
+        ])
+
+        # Bulk inserts bypass the flush hooks, so bump the version, index and log explicitly
+        bump_data_version([project_id])
+        index_rows(ExpenseTransaction, expense_ids)
+        log_rows(ExpenseTransaction, expense_ids, 'insert')
+        log_rows(SalaryPayment, db.session.scalars(
+            select(SalaryPayment.id).where(SalaryPayment.payroll_run_id == payroll_run.id)
+        ).all(), 'insert')
+        enqueue_balance_update(account_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return payroll_run
+
+
+def _year_bounds(year):
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def get_payroll_by_month(project_id, year):
+    """Monthly salary totals for a year with a running year-to-date net"""
+    start, end = _year_bounds(year)
+    month = func.strftime('%Y-%m', SalaryPayment.payment_date)
+    net = func.sum(SalaryPayment.net_salary)
+
+    return db.session.query(
+        month.label('month'),
+        func.count(SalaryPayment.id).label('payments'),
+        func.sum(SalaryPayment.base_salary).label('base_salary'),
+        func.sum(SalaryPayment.deductions).label('deductions'),
+        func.sum(SalaryPayment.bonus).label('bonus'),
+        func.sum(SalaryPayment.commission).label('commission'),
+        net.label('net_salary'),
+        func.sum(net).over(order_by=month).label('ytd_net')
+    ).join(Employee, SalaryPayment.employee_id == Employee.id)\
+     .filter(
+        Employee.project_id == project_id,
+        SalaryPayment.payment_date.between(start, end)
+    ).group_by(month).order_by(month).all()
+
+
+def get_payroll_by_employee(project_id, year):
+    """Per-employee salary totals for a year, share of payroll and last payment up to year end"""
+    start, end = _year_bounds(year)
+    in_year = SalaryPayment.payment_date.between(start, end)
+
+    def year_sum(column):
+        return func.coalesce(func.sum(case((in_year, column), else_=0)), 0)
+
+    net = year_sum(SalaryPayment.net_salary)
+
+    return db.session.query(
+        Employee.id.label('employee_id'),
+        Employee.name,
+        Employee.is_active,
+        func.count(case((in_year, SalaryPayment.id))).label('payments'),
+        year_sum(SalaryPayment.base_salary).label('base_salary'),
+        year_sum(SalaryPayment.deductions).label('deductions'),
+        year_sum(SalaryPayment.bonus).label('bonus'),
+        year_sum(SalaryPayment.commission).label('commission'),
+        net.label('net_salary'),
+        (net * 100.0 / func.nullif(func.sum(net).over(), 0)).label('share_pct'),
+        func.max(case((SalaryPayment.payment_date <= end, SalaryPayment.payment_date)))
+            .label('last_payment_date')
+    ).join(SalaryPayment, SalaryPayment.employee_id == Employee.id)\
+     .filter(Employee.project_id == project_id)\
+     .group_by(Employee.id)\
+     .order_by(net.desc(), Employee.name).all()
+
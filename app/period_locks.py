@@ -0,0 +1,151 @@
+"""
+Month-level period locks.
+
+Locking a month freezes its income and expense totals (per account, category,
+phase and cost type) into period_totals. The income, expenses, loans, debts
+and payroll routes refuse to add, edit or delete rows dated in a locked month,
+so the frozen totals stay equal to the detail rows. Dates in a closed fiscal
+year are refused the same way. Project totals over a date
+range read the frozen totals of the locked months the range fully covers and
+scan the detail tables only for the remaining days.
+"""
+from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, select, insert, delete, literal
+from app.models import db, bump_data_version, column_matches, PeriodLock, PeriodTotal
+from app.fiscal import CLOSED_KINDS, is_year_closed
+
+
+LOCKED_PERIOD_MESSAGE = 'لا يمكن إضافة أو تعديل أو حذف حركات في شهر مقفل أو سنة مالية مقفلة'
+
+
+class PeriodLockError(ValueError):
+    """Raised when a month cannot be locked or unlocked"""
+
+
+def month_start(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def _month_end(period_start):
+    return period_start + relativedelta(months=1) - timedelta(days=1)
+
+
+def get_period_locks(project_id):
+    return PeriodLock.query.filter_by(project_id=project_id)\
+        .order_by(PeriodLock.period_start.desc()).all()
+
+
+def is_period_locked(project_id, *days):
+    """True if any of the dates (None is ignored) falls in a locked month or a closed fiscal year"""
+    months = {month_start(day) for day in days if day}
+    if not months:
+        return False
+    locked = db.session.query(PeriodLock.id).filter(
+        PeriodLock.project_id == project_id,
+        PeriodLock.period_start.in_(months)
+    ).first() is not None
+    return locked or is_year_closed(project_id, *{m.year for m in months})
+
+
+def frozen_months(project_id, start_date=None, end_date=None):
+    """Locked months of a project lying entirely inside the range, oldest first"""
+    if not project_id:
+        return []
+    query = db.session.query(PeriodLock.period_start).filter(PeriodLock.project_id == project_id)
+    if start_date:
+        query = query.filter(PeriodLock.period_start >= start_date)
+    if end_date:
+        last_full = month_start(end_date + timedelta(days=1)) - relativedelta(months=1)
+        query = query.filter(PeriodLock.period_start <= last_full)
+    return [row.period_start for row in query.order_by(PeriodLock.period_start)]
+
+
+def _month_ranges(months):
+    """Merge consecutive month starts into (first day, last day) ranges"""
+    ranges = []
+    for period_start in sorted(months):
+        if ranges and ranges[-1][1] + timedelta(days=1) == period_start:
+            ranges[-1][1] = _month_end(period_start)
+        else:
+            ranges.append([period_start, _month_end(period_start)])
+    return ranges
+
+
+def outside_months(column, months):
+    """Conditions keeping only rows whose date column is outside the given months"""
+    return [~column.between(start, end) for start, end in _month_ranges(months)]
+
+
+def frozen_total(kind, months, account_id=None, project_id=None, **filters):
+    """Sum of frozen totals of one kind over the given months; filters match PeriodTotal columns"""
+    if not months:
+        return 0.0
+    query = db.session.query(func.sum(PeriodTotal.amount)).filter(
+        PeriodTotal.kind == kind,
+        PeriodTotal.project_id == project_id,
+        PeriodTotal.period_start.in_(months)
+    )
+    if account_id:
+        query = query.filter(PeriodTotal.account_id == account_id)
+    for column, value in filters.items():
+        query = query.filter(column_matches(getattr(PeriodTotal, column), value))
+    return float(query.scalar() or 0)
+
+
+def freeze_months(project_id, months):
+    """Write period_totals for the given months from the detail rows (no commit)"""
+    for period_start in months:
+        for kind, (model, _, extra) in CLOSED_KINDS.items():
+            table = model.__table__
+            in_month = (table.c.project_id == project_id) & \
+                table.c.transaction_date.between(period_start, _month_end(period_start))
+            group = [table.c.account_id, table.c.category_id] + [table.c[name] for name in extra]
+
+            db.session.execute(insert(PeriodTotal).from_select(
+                ['project_id', 'period_start', 'kind', 'account_id', 'category_id', *extra,
+                 'amount', 'row_count'],
+                select(
+                    literal(project_id), literal(period_start), literal(kind), *group,
+                    func.sum(table.c.amount), func.count()
+                ).where(in_month).group_by(*group)
+            ))
+
+
+def lock_period(project_id, month, today=None):
+    """Lock a finished month and freeze its totals"""
+    period_start = month_start(month)
+    if period_start >= month_start(today or date.today()):
+        raise PeriodLockError(f'{period_start:%Y-%m} has not ended yet')
+    if PeriodLock.query.filter_by(project_id=project_id, period_start=period_start).first():
+        raise PeriodLockError(f'{period_start:%Y-%m} is already locked')
+
+    try:
+        freeze_months(project_id, [period_start])
+        db.session.add(PeriodLock(project_id=project_id, period_start=period_start))
+        bump_data_version([project_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def unlock_period(project_id, month):
+    """Unlock a month and drop its frozen totals"""
+    period_start = month_start(month)
+    lock = PeriodLock.query.filter_by(project_id=project_id, period_start=period_start).first()
+    if lock is None:
+        raise PeriodLockError(f'{period_start:%Y-%m} is not locked')
+
+    try:
+        db.session.execute(delete(PeriodTotal).where(
+            PeriodTotal.project_id == project_id, PeriodTotal.period_start == period_start
+        ))
+        db.session.delete(lock)
+        bump_data_version([project_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,167 @@
+"""
+Recurring income and expense templates.
+
+`flask materialize-recurring` (run daily from cron) turns every due occurrence
+of every active template, across all projects, into income/expense rows in one
+transaction. Occurrences are claimed through recurring_occurrences, whose
+unique (recurring_id, occurrence_date) key makes a re-run, or an overlapping
+run, insert nothing twice. Claimed rows are written with one bulk INSERT per
+table, and each affected account gets a single queued balance update.
+Occurrences dated in a locked month or a closed fiscal year are skipped.
+"""
+from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import (
+    db, bump_data_version, RecurringTransaction, RecurringOccurrence, PeriodLock, FiscalYearClose,
+    IncomeTransaction, ExpenseTransaction
+)
+from app.jobs import enqueue_balance_update
+from app.search import index_rows
+from app.change_log import log_rows
+
+
+FREQUENCIES = {
+    'weekly': relativedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'quarterly': relativedelta(months=3),
+    'yearly': relativedelta(years=1),
+}
+
+FREQUENCY_LABELS = {
+    'weekly': 'أسبوعي',
+    'monthly': 'شهري',
+    'quarterly': 'ربع سنوي',
+    'yearly': 'سنوي',
+}
+
+KIND_MODELS = {
+    'income': IncomeTransaction,
+    'expense': ExpenseTransaction,
+}
+
+
+def _occurrences(start_date, frequency):
+    """Occurrence dates counted from the start, so month-end dates don't drift"""
+    step = FREQUENCIES[frequency]
+    n = 0
+    while True:
+        yield start_date + step * n
+        n += 1
+
+
+def next_occurrence(template, after):
+    """First occurrence of a template strictly after a date, or None past its end"""
+    for day in _occurrences(template.start_date, template.frequency):
+        if day > after:
+            return day if not template.end_date or day <= template.end_date else None
+
+
+def _due_dates(template, until):
+    dates = []
+    for day in _occurrences(template.start_date, template.frequency):
+        if day > until:
+            return dates
+        if day >= template.next_date:
+            dates.append(day)
+
+
+def _transaction_row(template, day, now):
+    row = {
+        'project_id': template.project_id,
+        'account_id': template.account_id,
+        'category_id': template.category_id,
+        'amount': template.amount,
+        'transaction_date': day,
+        'notes': template.notes,
+        'created_at': now,
+        'updated_at': now
+    }
+    if template.kind == 'expense':
+        row['phase'] = template.phase or 'operating'
+        row['is_direct_cost'] = bool(template.is_direct_cost)
+        row['is_salary'] = False
+    return row
+
+
+def materialize_recurring(today=None, project_id=None):
+    """
+    Create every due occurrence up to today for active templates (of one
+    project, or all). Returns (created, skipped_in_locked_periods).
+    """
+    today = today or date.today()
+    query = RecurringTransaction.query.filter(
+        RecurringTransaction.is_active == True,
+        RecurringTransaction.next_date.isnot(None),
+        RecurringTransaction.next_date <= today
+    )
+    if project_id:
+        query = query.filter(RecurringTransaction.project_id == project_id)
+    templates = {t.id: t for t in query.order_by(RecurringTransaction.id)}
+    if not templates:
+        return 0, 0
+
+    project_ids = {t.project_id for t in templates.values()}
+    locked = set(db.session.query(PeriodLock.project_id, PeriodLock.period_start).filter(
+        PeriodLock.project_id.in_(project_ids)
+    ))
+    closed = set(db.session.query(FiscalYearClose.project_id, FiscalYearClose.fiscal_year).filter(
+        FiscalYearClose.project_id.in_(project_ids)
+    ))
+
+    planned = []
+    advances = []
+    skipped = 0
+    for template in templates.values():
+        until = min(today, template.end_date) if template.end_date else today
+        for day in _due_dates(template, until):
+            if (template.project_id, day.replace(day=1)) in locked or \
+                    (template.project_id, day.year) in closed:
+                skipped += 1
+            else:
+                planned.append({'recurring_id': template.id, 'occurrence_date': day})
+        advances.append({'id': template.id, 'next_date': next_occurrence(template, until)})
+
+    now = datetime.utcnow()
+    try:
+        claimed = []
+        if planned:
+            stmt = sqlite_insert(RecurringOccurrence).values([dict(p, created_at=now) for p in planned])
+            claimed = db.session.execute(stmt.on_conflict_do_nothing().returning(
+                RecurringOccurrence.id, RecurringOccurrence.recurring_id, RecurringOccurrence.occurrence_date
+            )).all()
+
+        for kind, model in KIND_MODELS.items():
+            batch = [c for c in claimed if templates[c.recurring_id].kind == kind]
+            if not batch:
+                continue
+            ids = db.session.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                [_transaction_row(templates[c.recurring_id], c.occurrence_date, now) for c in batch]
+            ).all()
+            db.session.execute(update(RecurringOccurrence), [
+                {'id': c.id, 'transaction_id': transaction_id} for c, transaction_id in zip(batch, ids)
+            ])
+            # Bulk inserts bypass the flush hooks, so index and log explicitly
+            index_rows(model, ids)
+            log_rows(model, ids, 'insert')
+
+        db.session.execute(update(RecurringTransaction), advances)
+        if claimed:
+            touched = [templates[c.recurring_id] for c in claimed]
+            bump_data_version({t.project_id for t in touched})
+            enqueue_balance_update(*{t.account_id for t in touched})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(claimed), skipped
+
+
+def resume_template(template, today=None):
+    """Reactivate a template from its next occurrence on or after today (no backfill)"""
+    today = today or date.today()
+    template.is_active = True
+    template.next_date = next_occurrence(template, max(today, template.start_date) - timedelta(days=1))
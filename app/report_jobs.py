@@ -0,0 +1,229 @@
+"""
+All-time project reports (equity, ROI, KPIs) computed on the job queue.
+
+A viewer that finds no current result enqueues a `compute_report` job and gets
+its id back; the page polls until a worker stores the result in report_results.
+Results are tagged with the project data version (and the as-of date for
+reports relative to today), so later viewers read them straight from the table
+until the project's data changes.
+"""
+import json
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import (
+    db, Project, ExpenseTransaction, Loan, Debt, ReportResult, BackgroundJob
+)
+from app.cache import get_data_version
+from app.forecast import get_runway_forecast
+from app.jobs import enqueue_job, job_handler
+from app.utils import (
+    calculate_total_income, calculate_total_expenses, calculate_total_balance, calculate_outstanding
+)
+
+
+# report name -> (builder, depends on today's date)
+REPORT_BUILDERS = {}
+
+
+def report_builder(name, daily=False):
+    """Register a function(project, today) returning the report's template values"""
+    def decorator(func):
+        REPORT_BUILDERS[name] = (func, daily)
+        return func
+    return decorator
+
+
+def _params_key(report, today):
+    return today.isoformat() if REPORT_BUILDERS[report][1] else ''
+
+
+@report_builder('equity')
+def build_equity(project, today):
+    """Owner Capital + Retained Earnings - Liabilities"""
+    project_id = project.id
+    owner_capital = float(project.owner_capital or 0)
+
+    # Retained Earnings = Total Income - Total Operating Expenses (all time)
+    total_income = calculate_total_income(project_id=project_id)
+    total_operating_expenses = calculate_total_expenses(project_id=project_id, phase='operating')
+    retained_earnings = total_income - total_operating_expenses
+
+    # Building costs (investment)
+    building_costs = calculate_total_expenses(project_id=project_id, phase='building')
+
+    # Liabilities: Unpaid loans + Debts owed by us
+    unpaid_loans = calculate_outstanding(Loan, project_id)
+    debts_by_us = calculate_outstanding(Debt, project_id, debt_type='owed_by_us')
+    total_liabilities = unpaid_loans + debts_by_us
+
+    # Assets: Account balances + Debts owed to us
+    total_balance = calculate_total_balance(project_id=project_id)
+    debts_to_us = calculate_outstanding(Debt, project_id, debt_type='owed_to_us')
+    total_assets = total_balance + debts_to_us
+
+    return {
+        'owner_capital': owner_capital,
+        'retained_earnings': retained_earnings,
+        'building_costs': building_costs,
+        'unpaid_loans': unpaid_loans,
+        'debts_by_us': debts_by_us,
+        'total_liabilities': total_liabilities,
+        'total_assets': total_assets,
+        'debts_to_us': debts_to_us,
+        'total_balance': total_balance,
+        'net_project_value': owner_capital + retained_earnings - total_liabilities
+    }
+
+
+@report_builder('roi')
+def build_roi(project, today):
+    """Total Investment | Net Profit | ROI %"""
+    project_id = project.id
+    owner_capital = float(project.owner_capital or 0)
+
+    # Total Investment = Owner Capital + Building Costs
+    building_costs = calculate_total_expenses(project_id=project_id, phase='building')
+    total_investment = owner_capital + building_costs
+
+    # Net Profit = Total Income - Operating Expenses (all time)
+    total_income = calculate_total_income(project_id=project_id)
+    total_operating_expenses = calculate_total_expenses(project_id=project_id, phase='operating')
+    net_profit = total_income - total_operating_expenses
+
+    return {
+        'owner_capital': owner_capital,
+        'building_costs': building_costs,
+        'total_investment': total_investment,
+        'total_income': total_income,
+        'total_operating_expenses': total_operating_expenses,
+        'net_profit': net_profit,
+        'roi_pct': (net_profit / total_investment * 100) if total_investment > 0 else 0
+    }
+
+
+@report_builder('kpis', daily=True)
+def build_kpis(project, today):
+    """Burn rate, runway, margins and ROI"""
+    project_id = project.id
+    six_months_ago = today - relativedelta(months=6)
+
+    # Burn Rate (average monthly operating expenses over the last 6 months)
+    recent_expenses = calculate_total_expenses(six_months_ago, today, project_id=project_id, phase='operating')
+    months_with_data = db.session.query(
+        func.distinct(func.strftime('%Y-%m', ExpenseTransaction.transaction_date))
+    ).filter(
+        ExpenseTransaction.project_id == project_id,
+        ExpenseTransaction.phase == 'operating',
+        ExpenseTransaction.transaction_date >= six_months_ago,
+        ExpenseTransaction.transaction_date <= today
+    ).count() or 1
+    burn_rate = recent_expenses / months_with_data
+
+    # Runway (months of cash remaining at current burn rate)
+    total_cash = calculate_total_balance(project_id=project_id)
+    runway_months = (total_cash / burn_rate) if burn_rate > 0 else float('inf')
+
+    # Gross Profit & Margin
+    total_income = calculate_total_income(project_id=project_id)
+    total_direct_costs = calculate_total_expenses(project_id=project_id, phase='operating', is_direct_cost=True)
+    gross_profit = total_income - total_direct_costs
+    gross_margin_pct = (gross_profit / total_income * 100) if total_income > 0 else 0
+
+    # Net Profit & Net Margin
+    total_operating_expenses = calculate_total_expenses(project_id=project_id, phase='operating', is_direct_cost=False)
+    net_profit = gross_profit - total_operating_expenses
+    net_margin_pct = (net_profit / total_income * 100) if total_income > 0 else 0
+
+    # Operating Cost Ratio
+    total_all_operating = total_direct_costs + total_operating_expenses
+    operating_cost_ratio = (total_all_operating / total_income * 100) if total_income > 0 else 0
+
+    # ROI
+    owner_capital = float(project.owner_capital or 0)
+    building_costs = calculate_total_expenses(project_id=project_id, phase='building')
+    total_investment = owner_capital + building_costs
+    roi_pct = (net_profit / total_investment * 100) if total_investment > 0 else 0
+
+    return {
+        'burn_rate': burn_rate,
+        'total_cash': total_cash,
+        'runway_months': runway_months,
+        'runway_forecast': get_runway_forecast(project_id),
+        'gross_margin_pct': gross_margin_pct,
+        'net_margin_pct': net_margin_pct,
+        'roi_pct': roi_pct,
+        'operating_cost_ratio': operating_cost_ratio,
+        'total_income': total_income,
+        'total_direct_costs': total_direct_costs,
+        'gross_profit': gross_profit,
+        'total_operating_expenses': total_operating_expenses,
+        'net_profit': net_profit,
+        'total_investment': total_investment,
+        'building_costs': building_costs,
+        'owner_capital': owner_capital
+    }
+
+
+def get_report_result(project_id, report, today=None):
+    """Stored result of a report if it is still current, else None"""
+    today = today or date.today()
+    row = ReportResult.query.filter_by(project_id=project_id, report_type=report).first()
+    if row is None:
+        return None
+    if row.data_version != get_data_version(project_id) or row.params_key != _params_key(report, today):
+        return None
+    return json.loads(row.result)
+
+
+def request_report(project_id, report, today=None):
+    """Queue a report computation (coalesced per project and report); returns the job id"""
+    today = today or date.today()
+    dedupe_key = f'{project_id}:{report}'
+    enqueue_job('compute_report', dedupe_key=dedupe_key,
+                project_id=project_id, report=report, today=today.isoformat())
+    job_id = db.session.query(BackgroundJob.id)\
+        .filter(BackgroundJob.dedupe_key == f'compute_report:{dedupe_key}').scalar()
+    db.session.commit()
+    return job_id
+
+
+def get_report_job_status(job_id):
+    """Polling view of a report job; finished jobs are removed from the queue"""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None:
+        return {'status': 'done'}
+    return {'status': job.status, 'error': job.last_error}
+
+
+@job_handler('compute_report')
+def compute_report(project_id, report, today):
+    today = date.fromisoformat(today)
+    if get_report_result(project_id, report, today) is not None:
+        return
+    project = db.session.get(Project, project_id)
+    if project is None:
+        return
+
+    # Read the version first: writes landing mid-computation leave the result stale
+    version = get_data_version(project_id)
+    builder = REPORT_BUILDERS[report][0]
+    result = builder(project, today)
+    values = {
+        'project_id': project_id,
+        'report_type': report,
+        'params_key': _params_key(report, today),
+        'data_version': version,
+        'result': json.dumps(result),
+        'computed_at': datetime.utcnow()
+    }
+    stmt = sqlite_insert(ReportResult).values(**values)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['project_id', 'report_type'],
+        set_={key: stmt.excluded[key] for key in ('params_key', 'data_version', 'result', 'computed_at')}
+    ))
+
+    if report == 'kpis':
+        from app.kpi_snapshots import save_kpi_snapshot
+        save_kpi_snapshot(project_id, today, result, version)
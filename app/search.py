@@ -0,0 +1,253 @@
+"""
+Full-text search over notes on income, expenses, debts, loans and payments.
+
+Text is normalized in Python (diacritics and tatweel stripped, alef/ya/ta
+marbuta forms unified, the definite article dropped, Arabic-Indic digits
+mapped to ASCII) and stored in the
+FTS5 table `notes_fts`. Each row's FTS rowid encodes the source table and
+primary key as id * 8 + kind code, so the after_flush hook can update or
+remove an entry by rowid without scanning. Queries are normalized the same
+way and ranked with bm25. Snippets are cut from the original text of the
+matched rows, so they show what the user typed rather than the normalized form.
+"""
+import re
+from datetime import datetime
+from markupsafe import Markup, escape
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.models import (
+    db, _project_id_of, IncomeTransaction, ExpenseTransaction,
+    Debt, DebtPayment, Loan, LoanPayment
+)
+
+
+# kind code -> (kind name, model, date column)
+SEARCH_KINDS = {
+    1: ('income', IncomeTransaction, 'transaction_date'),
+    2: ('expense', ExpenseTransaction, 'transaction_date'),
+    3: ('debt', Debt, 'created_at'),
+    4: ('debt_payment', DebtPayment, 'payment_date'),
+    5: ('loan', Loan, 'received_date'),
+    6: ('loan_payment', LoanPayment, 'payment_date')
+}
+KIND_CODES = {model: code for code, (_, model, _) in SEARCH_KINDS.items()}
+KIND_BITS = 8
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)}
+})
+_DEFINITE_ARTICLE = re.compile(r'\bال(?=\w{2,})')
+_TOKEN = re.compile(r'\w+')
+
+SNIPPET_WORDS = 12
+
+
+def normalize_arabic(value):
+    """Normalize Arabic text so spelling variants index and match alike"""
+    if not value:
+        return ''
+    value = _DIACRITICS.sub('', value).translate(_CHAR_MAP).lower()
+    return _DEFINITE_ARTICLE.sub('', value)
+
+
+def _create_index_table(connection):
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+        "body, project_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+    ))
+
+
+def ensure_search_index():
+    """Create and backfill the FTS5 table on first start"""
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+    )).first()
+    if exists is None:
+        rebuild_search_index()
+
+
+def _display_text(obj):
+    if isinstance(obj, Debt):
+        parts = [obj.person_name, obj.notes]
+    elif isinstance(obj, Loan):
+        parts = [obj.lender_name, obj.notes]
+    else:
+        parts = [obj.notes]
+    return ' '.join(p for p in parts if p)
+
+
+def _search_text(obj):
+    return normalize_arabic(_display_text(obj))
+
+
+def _rowid(code, row_id):
+    return row_id * KIND_BITS + code
+
+
+def _index_objects(connection, session, upserts, deletes):
+    rowids = [_rowid(KIND_CODES[type(obj)], obj.id) for obj in upserts + deletes]
+    if rowids:
+        connection.execute(
+            text('DELETE FROM notes_fts WHERE rowid = :rowid'),
+            [{'rowid': r} for r in rowids]
+        )
+
+    rows = []
+    for obj in upserts:
+        body = _search_text(obj)
+        if body:
+            rows.append({
+                'rowid': _rowid(KIND_CODES[type(obj)], obj.id),
+                'body': body,
+                'project_id': _project_id_of(session, obj)
+            })
+    if rows:
+        connection.execute(
+            text('INSERT INTO notes_fts (rowid, body, project_id) VALUES (:rowid, :body, :project_id)'),
+            rows
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    upserts, deletes = [], []
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty):
+            if type(obj) in KIND_CODES and obj not in session.deleted:
+                upserts.append(obj)
+        for obj in session.deleted:
+            if type(obj) in KIND_CODES:
+                deletes.append(obj)
+        if upserts or deletes:
+            _index_objects(session.connection(), session, upserts, deletes)
+
+
+def index_rows(model, ids):
+    """Index rows written with bulk INSERT, which bypass the flush hook"""
+    if not ids:
+        return
+    objs = model.query.filter(model.id.in_(list(ids))).all()
+    _index_objects(db.session.connection(), db.session, objs, [])
+
+
+def unindex_rows(model, ids):
+    """Drop index entries of rows removed with bulk DELETE"""
+    if not ids:
+        return
+    code = KIND_CODES[model]
+    db.session.connection().execute(
+        text('DELETE FROM notes_fts WHERE rowid = :rowid'),
+        [{'rowid': _rowid(code, row_id)} for row_id in ids]
+    )
+
+
+def rebuild_search_index():
+    """Drop and repopulate notes_fts from every source table; returns row count"""
+    try:
+        connection = db.session.connection()
+        connection.execute(text('DROP TABLE IF EXISTS notes_fts'))
+        _create_index_table(connection)
+        count = 0
+        for _, model, _ in SEARCH_KINDS.values():
+            objs = model.query.all()
+            _index_objects(connection, db.session, objs, [])
+            count += len(objs)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def _query_terms(query):
+    return _TOKEN.findall(normalize_arabic(query))
+
+
+def build_match_query(query):
+    """Turn user input into an FTS5 expression: every term must match as a prefix"""
+    return ' '.join(f'"{term}"*' for term in _query_terms(query))
+
+
+def _snippet(value, terms, size=SNIPPET_WORDS):
+    """
+    Up to `size` words of the original text around the first match, with words
+    whose normalized form starts with a query term marked.
+    """
+    words = value.split()
+    matched = [
+        any(token.startswith(term) for token in _TOKEN.findall(normalize_arabic(word)) for term in terms)
+        for word in words
+    ]
+    first = matched.index(True) if True in matched else 0
+    start = max(0, min(first - 2, len(words) - size))
+    end = start + size
+
+    parts = [Markup('<mark>%s</mark>') % word if hit else escape(word)
+             for word, hit in zip(words[start:end], matched[start:end])]
+    snippet = Markup(' ').join(parts)
+    if start > 0:
+        snippet = '…' + snippet
+    if end < len(words):
+        snippet = snippet + '…'
+    return snippet
+
+
+def search_notes(project_id, query, page=1, per_page=20):
+    """
+    Ranked full-text search within a project.
+    Returns (results, total) where results hold kind, id, date, amount, snippet and obj.
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return [], 0
+    match = build_match_query(query)
+
+    params = {'match': match, 'project_id': project_id}
+    total = db.session.execute(text(
+        'SELECT count(*) FROM notes_fts WHERE notes_fts MATCH :match AND project_id = :project_id'
+    ), params).scalar()
+
+    hits = db.session.execute(text(
+        'SELECT rowid FROM notes_fts WHERE notes_fts MATCH :match AND project_id = :project_id '
+        'ORDER BY rank LIMIT :limit OFFSET :offset'
+    ), {
+        **params,
+        'limit': per_page,
+        'offset': (max(page, 1) - 1) * per_page
+    }).all()
+
+    # Load the source rows with one query per kind
+    wanted = {}
+    for hit in hits:
+        wanted.setdefault(hit.rowid % KIND_BITS, []).append(hit.rowid // KIND_BITS)
+    loaded = {}
+    for code, ids in wanted.items():
+        model = SEARCH_KINDS[code][1]
+        for obj in model.query.filter(model.id.in_(ids)).all():
+            loaded[(code, obj.id)] = obj
+
+    results = []
+    for hit in hits:
+        code, row_id = hit.rowid % KIND_BITS, hit.rowid // KIND_BITS
+        obj = loaded.get((code, row_id))
+        if obj is None:
+            continue
+        kind, _, date_column = SEARCH_KINDS[code]
+        # Debts are dated by created_at; every kind reports a plain date
+        value = getattr(obj, date_column)
+        if isinstance(value, datetime):
+            value = value.date()
+        results.append({
+            'kind': kind,
+            'id': row_id,
+            'date': value,
+            'amount': float(obj.original_amount if isinstance(obj, Debt) else obj.amount),
+            'snippet': _snippet(_display_text(obj), terms),
+            'obj': obj
+        })
+    return results, total
@@ -127,6 +127,38 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Name autocomplete: inputs with data-autocomplete-url get suggestions in a datalist
+function initAutocomplete(input) {
+    const datalist = document.createElement('datalist');
+    datalist.id = input.getAttribute('list') || ('autocomplete-' + (input.name || input.id));
+    input.setAttribute('list', datalist.id);
+    input.setAttribute('autocomplete', 'off');
+    input.parentNode.appendChild(datalist);
+
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const q = input.value.trim();
+        if (!q) return;
+        timer = setTimeout(function() {
+            fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(q))
+                .then(response => response.json())
+                .then(function(names) {
+                    datalist.innerHTML = '';
+                    names.forEach(function(name) {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        datalist.appendChild(option);
+                    });
+                });
+        }, 200);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(initAutocomplete);
+});
+
 // Show/hide custom date range based on period selection
 function toggleCustomDateRange() {
     const periodSelect = document.getElementById('periodSelect');
@@ -154,3 +186,28 @@ function toggleCustomDateRange() {
 
 // Call on page load
 toggleCustomDateRange();
+
+// Report jobs: poll the job status and reload once the result is stored
+function initJobPoller(container) {
+    const url = container.dataset.jobStatusUrl;
+    function poll() {
+        fetch(url, { cache: 'no-store' })
+            .then(response => response.json())
+            .then(function(job) {
+                if (job.status === 'done') {
+                    window.location.reload();
+                } else if (job.status === 'failed') {
+                    container.querySelector('[data-job-spinner]').classList.add('d-none');
+                    container.querySelector('[data-job-error]').classList.remove('d-none');
+                } else {
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(() => setTimeout(poll, 3000));
+    }
+    setTimeout(poll, 500);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-job-status-url]').forEach(initJobPoller);
+});
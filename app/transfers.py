@@ -0,0 +1,78 @@
+"""
+Transfers between accounts of the same project.
+
+A transfer is not income or expense, so it never reaches the P&L or the
+income/expense summaries. Creating or deleting one applies its two balance
+deltas (amount out of one account, into the other) as in-place UPDATEs in
+the same transaction as the transfer row, instead of queueing two full
+balance recomputes. Account.update_balance and the ledger checks include
+transfers, so a later recompute arrives at the same balances.
+"""
+from sqlalchemy import update
+from app.models import db, Account, Transfer
+from app.period_locks import is_period_locked, LOCKED_PERIOD_MESSAGE
+
+
+class TransferError(ValueError):
+    """Raised when a transfer cannot be recorded or deleted; the message is user-facing"""
+
+
+def _apply(transfer, sign):
+    """Move `sign * amount` from the sending to the receiving account"""
+    delta = float(transfer.amount) * sign
+    for account_id, change in ((transfer.from_account_id, -delta), (transfer.to_account_id, delta)):
+        db.session.execute(
+            update(Account)
+            .where(Account.id == account_id)
+            .values(current_balance=Account.current_balance + change)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def create_transfer(project_id, from_account_id, to_account_id, amount, transfer_date, notes=None):
+    """Record a transfer and apply it to both balances atomically"""
+    if from_account_id == to_account_id:
+        raise TransferError('لا يمكن التحويل إلى نفس الحساب')
+    if not amount or amount <= 0:
+        raise TransferError('المبلغ يجب أن يكون أكبر من صفر')
+
+    accounts = Account.query.filter(
+        Account.id.in_([from_account_id, to_account_id]),
+        Account.project_id == project_id
+    ).all()
+    if len(accounts) != 2:
+        raise TransferError('الحسابان يجب أن يكونا في نفس المشروع')
+    if accounts[0].currency != accounts[1].currency:
+        raise TransferError('لا يمكن التحويل بين حسابين بعملتين مختلفتين')
+    if is_period_locked(project_id, transfer_date):
+        raise TransferError(LOCKED_PERIOD_MESSAGE)
+
+    transfer = Transfer(
+        project_id=project_id,
+        from_account_id=from_account_id,
+        to_account_id=to_account_id,
+        amount=amount,
+        transfer_date=transfer_date,
+        notes=notes
+    )
+    try:
+        db.session.add(transfer)
+        _apply(transfer, 1)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return transfer
+
+
+def delete_transfer(transfer):
+    """Delete a transfer and reverse it on both balances atomically"""
+    if is_period_locked(transfer.project_id, transfer.transfer_date):
+        raise TransferError(LOCKED_PERIOD_MESSAGE)
+    try:
+        _apply(transfer, -1)
+        db.session.delete(transfer)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
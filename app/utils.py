@@ -1,7 +1,27 @@
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import func
-from app.models import db, IncomeTransaction, ExpenseTransaction, Account, Debt
+from sqlalchemy import func, select, union_all, literal, tuple_, case
+from sqlalchemy.orm import joinedload, aliased
+from app.models import (
+    db, column_matches, IncomeTransaction, ExpenseTransaction, Account, Debt, DebtPayment,
+    Loan, LoanPayment, ClosingTotal, PeriodTotal, Transfer
+)
+from app.ledger import debt_cash_flow, debt_payment_cash_flow
+from app.fiscal import CLOSED_KINDS, closed_total, closed_years_filter, archived_total, partial_years_filter
+from app.period_locks import frozen_months, outside_months, frozen_total
+from app.currency import conversion_target, converted, get_base_currency
+
+
+# Account statement movement kinds (also the tie-break order within a day)
+MOVEMENT_INCOME = 1
+MOVEMENT_LOAN = 2
+MOVEMENT_DEBT = 3
+MOVEMENT_DEBT_PAYMENT = 4
+MOVEMENT_LOAN_PAYMENT = 5
+MOVEMENT_EXPENSE = 6
+MOVEMENT_YEAR_CLOSE = 7  # Net of a closed fiscal year's archived income/expenses
+MOVEMENT_TRANSFER_IN = 8
+MOVEMENT_TRANSFER_OUT = 9
 
 
 def format_currency(value):
@@ -54,50 +74,71 @@ def get_date_range_filter(period, custom_start=None, custom_end=None):
         return start, today
 
 
-def calculate_total_income(start_date=None, end_date=None, account_id=None, project_id=None):
-    """Calculate total income for period, account, and project"""
-    query = db.session.query(func.sum(IncomeTransaction.amount))
+def _transaction_total(model, kind, start_date, end_date, account_id, project_id, currency, filters):
+    """
+    Detail sum plus frozen totals, closing totals of closed years inside the range
+    and archived rows of closed years it covers in part, converted when the
+    scope mixes currencies
+    """
+    currency = conversion_target(project_id, currency)
+    if currency:
+        # Frozen totals lose the per-row dates the as-of rates need, so scan the detail
+        months = []
+        amount = converted(model.amount, Account.currency, model.transaction_date, currency)
+        query = db.session.query(func.sum(amount)).join(Account, Account.id == model.account_id)
+    else:
+        # Locked months fully inside the range are read from their frozen totals
+        months = frozen_months(project_id, start_date, end_date)
+        query = db.session.query(func.sum(model.amount))
 
+    query = query.filter(*outside_months(model.transaction_date, months))
     if project_id:
-        query = query.filter(IncomeTransaction.project_id == project_id)
+        query = query.filter(model.project_id == project_id)
     if start_date:
-        query = query.filter(IncomeTransaction.transaction_date >= start_date)
+        query = query.filter(model.transaction_date >= start_date)
     if end_date:
-        query = query.filter(IncomeTransaction.transaction_date <= end_date)
+        query = query.filter(model.transaction_date <= end_date)
     if account_id:
-        query = query.filter(IncomeTransaction.account_id == account_id)
+        query = query.filter(model.account_id == account_id)
+    for column, value in filters.items():
+        query = query.filter(column_matches(getattr(model, column), value))
 
-    result = query.scalar()
-    return float(result) if result else 0.0
+    result = float(query.scalar() or 0)
+    result += frozen_total(kind, months, account_id, project_id, **filters)
+    result += closed_total(kind, start_date, end_date, account_id, project_id, currency, **filters)
+    return result + archived_total(kind, start_date, end_date, account_id, project_id, currency, **filters)
 
 
-def calculate_total_expenses(start_date=None, end_date=None, account_id=None, project_id=None):
-    """Calculate total expenses for period, account, and project"""
-    query = db.session.query(func.sum(ExpenseTransaction.amount))
+def calculate_total_income(start_date=None, end_date=None, account_id=None, project_id=None, currency=None):
+    """Calculate total income for period, account, and project (in `currency`, default base)"""
+    return _transaction_total(IncomeTransaction, 'income', start_date, end_date,
+                              account_id, project_id, currency, {})
 
-    if project_id:
-        query = query.filter(ExpenseTransaction.project_id == project_id)
-    if start_date:
-        query = query.filter(ExpenseTransaction.transaction_date >= start_date)
-    if end_date:
-        query = query.filter(ExpenseTransaction.transaction_date <= end_date)
-    if account_id:
-        query = query.filter(ExpenseTransaction.account_id == account_id)
 
-    result = query.scalar()
-    return float(result) if result else 0.0
+def calculate_total_expenses(start_date=None, end_date=None, account_id=None, project_id=None,
+                             currency=None, **filters):
+    """
+    Calculate total expenses for period, account, and project (in `currency`,
+    default base); filters such as phase= or is_direct_cost= match expense columns
+    """
+    return _transaction_total(ExpenseTransaction, 'expense', start_date, end_date,
+                              account_id, project_id, currency, filters)
 
 
-def calculate_profit_loss(start_date=None, end_date=None, account_id=None, project_id=None):
+def calculate_profit_loss(start_date=None, end_date=None, account_id=None, project_id=None, currency=None):
     """Calculate profit/loss: Income - Expenses"""
-    income = calculate_total_income(start_date, end_date, account_id, project_id)
-    expenses = calculate_total_expenses(start_date, end_date, account_id, project_id)
+    income = calculate_total_income(start_date, end_date, account_id, project_id, currency)
+    expenses = calculate_total_expenses(start_date, end_date, account_id, project_id, currency)
     return income - expenses
 
 
-def calculate_total_balance(account_id=None, project_id=None):
-    """Calculate total balance across accounts"""
-    query = db.session.query(func.sum(Account.current_balance))
+def calculate_total_balance(account_id=None, project_id=None, currency=None):
+    """Calculate total balance across accounts, converted at today's rates when needed"""
+    currency = conversion_target(project_id, currency)
+    balance = Account.current_balance
+    if currency:
+        balance = converted(balance, Account.currency, date.today(), currency)
+    query = db.session.query(func.sum(balance))
 
     if project_id:
         query = query.filter(Account.project_id == project_id)
@@ -110,6 +151,27 @@ def calculate_total_balance(account_id=None, project_id=None):
     return float(result) if result else 0.0
 
 
+def calculate_outstanding(model, project_id=None, currency=None, **filters):
+    """
+    Unpaid remaining amount of debts or loans (filters such as debt_type= match
+    model columns), converted at today's rates when needed. Debts without an
+    account are taken to be in the base currency.
+    """
+    currency = conversion_target(project_id, currency)
+    remaining = model.remaining_amount
+    if currency:
+        account_currency = func.coalesce(Account.currency, get_base_currency())
+        remaining = converted(remaining, account_currency, date.today(), currency)
+    query = db.session.query(func.sum(remaining)).filter(model.is_paid == False)
+    if currency:
+        query = query.outerjoin(Account, Account.id == model.account_id)
+    if project_id:
+        query = query.filter(model.project_id == project_id)
+    for column, value in filters.items():
+        query = query.filter(getattr(model, column) == value)
+    return float(query.scalar() or 0)
+
+
 def calculate_equity(project_id=None):
     """
     Calculate project equity: Assets - Liabilities
@@ -120,18 +182,10 @@ def calculate_equity(project_id=None):
     total_balance = calculate_total_balance(project_id=project_id)
 
     # Assets: Unpaid debts owed to us (لينا)
-    debts_to_us_query = db.session.query(func.sum(Debt.remaining_amount))\
-        .filter(Debt.debt_type == 'owed_to_us', Debt.is_paid == False)
-    if project_id:
-        debts_to_us_query = debts_to_us_query.filter(Debt.project_id == project_id)
-    debts_to_us = debts_to_us_query.scalar() or 0
+    debts_to_us = calculate_outstanding(Debt, project_id, debt_type='owed_to_us')
 
     # Liabilities: Unpaid debts owed by us (علينا)
-    debts_by_us_query = db.session.query(func.sum(Debt.remaining_amount))\
-        .filter(Debt.debt_type == 'owed_by_us', Debt.is_paid == False)
-    if project_id:
-        debts_by_us_query = debts_by_us_query.filter(Debt.project_id == project_id)
-    debts_by_us = debts_by_us_query.scalar() or 0
+    debts_by_us = calculate_outstanding(Debt, project_id, debt_type='owed_by_us')
 
     assets = float(total_balance) + float(debts_to_us)
     liabilities = float(debts_by_us)
@@ -143,8 +197,29 @@ def calculate_equity(project_id=None):
     }
 
 
-def get_upcoming_debts(days=7, project_id=None):
-    """Get debts due within specified days"""
+def get_setting(key, default=None):
+    """Read a SystemSetting value"""
+    from app.models import SystemSetting
+
+    value = db.session.query(SystemSetting.setting_value)\
+        .filter(SystemSetting.setting_key == key).scalar()
+    return value if value is not None else default
+
+
+def get_debt_warning_days():
+    """Warning window for upcoming debts/loans from the debt_warning_days setting"""
+    from flask import current_app
+
+    try:
+        return int(get_setting('debt_warning_days'))
+    except (TypeError, ValueError):
+        return current_app.config['DEBT_WARNING_DAYS']
+
+
+def get_upcoming_debts(days=None, project_id=None):
+    """Get debts due within specified days (defaults to the configured warning window)"""
+    if days is None:
+        days = get_debt_warning_days()
     today = date.today()
     due_date = today + timedelta(days=days)
 
@@ -162,42 +237,122 @@ def get_upcoming_debts(days=7, project_id=None):
     return debts
 
 
-def get_income_by_category(start_date=None, end_date=None, project_id=None):
-    """Get income grouped by category"""
-    from app.models import IncomeCategory
+# Aging buckets by days past due_date (debts without a due date are current)
+AGING_BUCKETS = ['current', '1_30', '31_60', '61_90', '90_plus']
 
-    query = db.session.query(
-        IncomeCategory.name_ar,
-        func.sum(IncomeTransaction.amount).label('total')
-    ).join(IncomeTransaction).group_by(IncomeCategory.id)
 
+def get_debt_aging(project_id, today=None):
+    """
+    Unpaid debts bucketed by days past due, per debt type, in one grouped query.
+    Returns {debt_type: {'buckets': {bucket: {'count', 'amount'}}, 'count', 'amount'}}
+    """
+    today = today or date.today()
+    days_overdue = func.julianday(today) - func.julianday(Debt.due_date)
+    bucket = case(
+        (Debt.due_date.is_(None), 'current'),
+        (days_overdue <= 0, 'current'),
+        (days_overdue <= 30, '1_30'),
+        (days_overdue <= 60, '31_60'),
+        (days_overdue <= 90, '61_90'),
+        else_='90_plus'
+    ).label('bucket')
+
+    rows = db.session.query(
+        Debt.debt_type,
+        bucket,
+        func.count(Debt.id),
+        func.sum(Debt.remaining_amount)
+    ).filter(
+        Debt.project_id == project_id,
+        Debt.is_paid == False
+    ).group_by(Debt.debt_type, bucket).all()
+
+    aging = {
+        debt_type: {
+            'buckets': {b: {'count': 0, 'amount': 0.0} for b in AGING_BUCKETS},
+            'count': 0,
+            'amount': 0.0
+        }
+        for debt_type in ('owed_to_us', 'owed_by_us')
+    }
+    for debt_type, bucket_name, count, amount in rows:
+        if debt_type not in aging:
+            continue
+        entry = aging[debt_type]
+        entry['buckets'][bucket_name] = {'count': count, 'amount': float(amount or 0)}
+        entry['count'] += count
+        entry['amount'] += float(amount or 0)
+
+    return aging
+
+
+def _category_amounts(model, kind, start_date=None, end_date=None, project_id=None, currency=None):
+    """Detail amounts plus frozen, closed-year and partial-year archived amounts per category, as one subquery"""
+    currency = conversion_target(project_id, currency)
+    months = [] if currency else frozen_months(project_id, start_date, end_date)
+    detail_amount, closed_amount = model.amount, ClosingTotal.amount
+    if currency:
+        year_end = func.date(func.printf('%04d-12-31', ClosingTotal.fiscal_year))
+        detail_amount = converted(model.amount, Account.currency, model.transaction_date, currency)
+        closed_amount = converted(ClosingTotal.amount, Account.currency, year_end, currency)
+
+    detail = select(model.category_id.label('category_id'), detail_amount.label('amount'))\
+        .where(*outside_months(model.transaction_date, months))
+    frozen = select(PeriodTotal.category_id, PeriodTotal.amount).where(
+        PeriodTotal.kind == kind, PeriodTotal.project_id == project_id, PeriodTotal.period_start.in_(months)
+    )
+    closed = select(ClosingTotal.category_id, closed_amount).where(
+        ClosingTotal.kind == kind, *closed_years_filter(start_date, end_date)
+    )
+    if currency:
+        detail = detail.join(Account, Account.id == model.account_id)
+        closed = closed.join(Account, Account.id == ClosingTotal.account_id)
     if project_id:
-        query = query.filter(IncomeTransaction.project_id == project_id)
+        detail = detail.where(model.project_id == project_id)
+        closed = closed.where(ClosingTotal.project_id == project_id)
     if start_date:
-        query = query.filter(IncomeTransaction.transaction_date >= start_date)
+        detail = detail.where(model.transaction_date >= start_date)
     if end_date:
-        query = query.filter(IncomeTransaction.transaction_date <= end_date)
+        detail = detail.where(model.transaction_date <= end_date)
+    parts = [detail, frozen, closed]
+
+    archive = CLOSED_KINDS[kind][1]
+    partial = partial_years_filter(archive, start_date, end_date)
+    if partial is not None:
+        archived_amount = archive.c.amount
+        if currency:
+            archived_amount = converted(archive.c.amount, Account.currency, archive.c.transaction_date, currency)
+        archived = select(archive.c.category_id, archived_amount).where(*partial)
+        if currency:
+            archived = archived.join(Account, Account.id == archive.c.account_id)
+        if project_id:
+            archived = archived.where(archive.c.project_id == project_id)
+        parts.append(archived)
+    return union_all(*parts).subquery()
+
+
+def get_income_by_category(start_date=None, end_date=None, project_id=None, currency=None):
+    """Get income grouped by category"""
+    from app.models import IncomeCategory
 
-    return query.all()
+    amounts = _category_amounts(IncomeTransaction, 'income', start_date, end_date, project_id, currency)
+    return db.session.query(
+        IncomeCategory.name_ar,
+        func.sum(amounts.c.amount).label('total')
+    ).join(amounts, amounts.c.category_id == IncomeCategory.id)\
+     .group_by(IncomeCategory.id).all()
 
 
-def get_expense_by_category(start_date=None, end_date=None, project_id=None):
+def get_expense_by_category(start_date=None, end_date=None, project_id=None, currency=None):
     """Get expenses grouped by category"""
     from app.models import ExpenseCategory
 
-    query = db.session.query(
+    amounts = _category_amounts(ExpenseTransaction, 'expense', start_date, end_date, project_id, currency)
+    return db.session.query(
         ExpenseCategory.name_ar,
-        func.sum(ExpenseTransaction.amount).label('total')
-    ).join(ExpenseTransaction).group_by(ExpenseCategory.id)
-
-    if project_id:
-        query = query.filter(ExpenseTransaction.project_id == project_id)
-    if start_date:
-        query = query.filter(ExpenseTransaction.transaction_date >= start_date)
-    if end_date:
-        query = query.filter(ExpenseTransaction.transaction_date <= end_date)
-
-    return query.all()
+        func.sum(amounts.c.amount).label('total')
+    ).join(amounts, amounts.c.category_id == ExpenseCategory.id)\
+     .group_by(ExpenseCategory.id).all()
 
 
 def get_project_summary(project_id):
@@ -214,17 +369,8 @@ def get_project_summary(project_id):
     ).count()
 
     # Calculate debts
-    debts_to_us_query = db.session.query(func.sum(Debt.remaining_amount))\
-        .filter(Debt.project_id == project_id,
-                Debt.debt_type == 'owed_to_us',
-                Debt.is_paid == False)
-    debts_to_us = debts_to_us_query.scalar() or 0
-
-    debts_by_us_query = db.session.query(func.sum(Debt.remaining_amount))\
-        .filter(Debt.project_id == project_id,
-                Debt.debt_type == 'owed_by_us',
-                Debt.is_paid == False)
-    debts_by_us = debts_by_us_query.scalar() or 0
+    debts_to_us = calculate_outstanding(Debt, project_id, debt_type='owed_to_us')
+    debts_by_us = calculate_outstanding(Debt, project_id, debt_type='owed_by_us')
 
     # Count active accounts
     account_count = Account.query.filter_by(
@@ -239,3 +385,306 @@ def get_project_summary(project_id):
         'debts_by_us': float(debts_by_us),
         'account_count': account_count
     }
+
+
+def get_account_statement(account, before=None, limit=20):
+    """
+    Get account movements merged chronologically with a running balance.
+    Rows are returned newest first. `before` is the keyset cursor
+    (movement_date, kind, ref_id) of the last row of the previous page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    counterpart = aliased(Account)
+    movements = union_all(
+        select(
+            IncomeTransaction.transaction_date.label('movement_date'),
+            literal(MOVEMENT_INCOME).label('kind'),
+            IncomeTransaction.id.label('ref_id'),
+            IncomeTransaction.amount.label('amount'),
+            IncomeTransaction.notes.label('notes')
+        ).where(IncomeTransaction.account_id == account.id),
+        select(
+            ExpenseTransaction.transaction_date,
+            literal(MOVEMENT_EXPENSE),
+            ExpenseTransaction.id,
+            -ExpenseTransaction.amount,
+            ExpenseTransaction.notes
+        ).where(ExpenseTransaction.account_id == account.id),
+        select(
+            Loan.received_date,
+            literal(MOVEMENT_LOAN),
+            Loan.id,
+            Loan.amount,
+            Loan.lender_name
+        ).where(Loan.account_id == account.id),
+        select(
+            LoanPayment.payment_date,
+            literal(MOVEMENT_LOAN_PAYMENT),
+            LoanPayment.id,
+            -LoanPayment.amount,
+            LoanPayment.notes
+        ).where(LoanPayment.account_id == account.id),
+        select(
+            func.date(Debt.created_at),
+            literal(MOVEMENT_DEBT),
+            Debt.id,
+            debt_cash_flow,
+            Debt.person_name
+        ).where(Debt.account_id == account.id),
+        select(
+            DebtPayment.payment_date,
+            literal(MOVEMENT_DEBT_PAYMENT),
+            DebtPayment.id,
+            debt_payment_cash_flow,
+            Debt.person_name
+        ).join(Debt, DebtPayment.debt_id == Debt.id)
+         .where(DebtPayment.account_id == account.id),
+        select(
+            Transfer.transfer_date,
+            literal(MOVEMENT_TRANSFER_IN),
+            Transfer.id,
+            Transfer.amount,
+            func.trim(func.printf('من %s - %s', counterpart.name, func.coalesce(Transfer.notes, '')), ' -')
+        ).join(counterpart, counterpart.id == Transfer.from_account_id)
+         .where(Transfer.to_account_id == account.id),
+        select(
+            Transfer.transfer_date,
+            literal(MOVEMENT_TRANSFER_OUT),
+            Transfer.id,
+            -Transfer.amount,
+            func.trim(func.printf('إلى %s - %s', counterpart.name, func.coalesce(Transfer.notes, '')), ' -')
+        ).join(counterpart, counterpart.id == Transfer.to_account_id)
+         .where(Transfer.from_account_id == account.id),
+        select(
+            func.date(func.printf('%04d-12-31', ClosingTotal.fiscal_year)),
+            literal(MOVEMENT_YEAR_CLOSE),
+            ClosingTotal.fiscal_year,
+            func.sum(case((ClosingTotal.kind == 'income', ClosingTotal.amount), else_=-ClosingTotal.amount)),
+            func.printf('إقفال السنة المالية %d', ClosingTotal.fiscal_year)
+        ).where(ClosingTotal.account_id == account.id)
+         .group_by(ClosingTotal.fiscal_year)
+    ).cte('movements')
+
+    key = (movements.c.movement_date, movements.c.kind, movements.c.ref_id)
+    conditions = [tuple_(*key) < tuple_(*before)] if before else []
+
+    # Balance after the newest row of the page: one aggregate up to the cursor
+    carried = select(func.coalesce(func.sum(movements.c.amount), 0))\
+        .where(*conditions).scalar_subquery()
+
+    page = select(movements).where(*conditions)\
+        .order_by(*(column.desc() for column in key)).limit(limit + 1).subquery()
+
+    # Walking the page newest first, each row's balance is the carried balance
+    # less the rows above it, so the window covers only the page
+    page_key = (page.c.movement_date.desc(), page.c.kind.desc(), page.c.ref_id.desc())
+    later_rows = func.sum(page.c.amount).over(order_by=page_key) - page.c.amount
+    query = select(
+        page,
+        (carried - later_rows + float(account.initial_balance or 0)).label('balance')
+    ).order_by(*page_key)
+
+    rows = db.session.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = (last.movement_date, last.kind, last.ref_id)
+
+    return rows, next_cursor
+
+
+def format_statement_cursor(cursor):
+    """Encode a statement keyset cursor for use in a query string"""
+    if not cursor:
+        return None
+    movement_date, kind, ref_id = cursor
+    return f"{movement_date.isoformat()}_{kind}_{ref_id}"
+
+
+def parse_statement_cursor(value):
+    """Decode a statement keyset cursor, ignoring malformed values"""
+    if not value:
+        return None
+    try:
+        movement_date, kind, ref_id = value.split('_')
+        return date.fromisoformat(movement_date), int(kind), int(ref_id)
+    except ValueError:
+        return None
+
+
+def get_due_calendar(days=None, today=None):
+    """
+    Overdue and upcoming unpaid debts and loans across all projects,
+    from one union query ordered by due date. Cached per day and data version.
+    """
+    from app.cache import cached_global
+
+    today = today or date.today()
+    if days is None:
+        days = get_debt_warning_days()
+    return cached_global(('due_calendar', today, days),
+                         lambda: _query_due_calendar(today, days))
+
+
+def _query_due_calendar(today, days):
+    from app.models import Project
+
+    horizon = today + timedelta(days=days)
+    obligations = union_all(
+        select(
+            literal('debt').label('kind'),
+            Debt.id.label('ref_id'),
+            Debt.project_id.label('project_id'),
+            Debt.person_name.label('counterparty'),
+            Debt.debt_type.label('direction'),
+            Debt.remaining_amount.label('amount'),
+            Debt.due_date.label('due_date')
+        ).where(
+            Debt.is_paid == False,
+            Debt.due_date.isnot(None),
+            Debt.due_date <= horizon
+        ),
+        select(
+            literal('loan'),
+            Loan.id,
+            Loan.project_id,
+            Loan.lender_name,
+            literal('owed_by_us'),
+            Loan.remaining_amount,
+            Loan.due_date
+        ).where(
+            Loan.is_paid == False,
+            Loan.due_date.isnot(None),
+            Loan.due_date <= horizon
+        )
+    ).subquery()
+
+    rows = db.session.execute(
+        select(obligations, Project.name_ar.label('project_name'))
+        .join(Project, Project.id == obligations.c.project_id)
+        .where(Project.is_active == True)
+        .order_by(obligations.c.due_date, obligations.c.kind, obligations.c.ref_id)
+    ).all()
+
+    return [
+        {
+            'kind': row.kind,
+            'id': row.ref_id,
+            'project_id': row.project_id,
+            'project_name': row.project_name,
+            'counterparty': row.counterparty,
+            'direction': row.direction,
+            'amount': float(row.amount or 0),
+            'due_date': row.due_date,
+            'days_left': (row.due_date - today).days,
+            'is_overdue': row.due_date < today
+        }
+        for row in rows
+    ]
+
+
+# === TRANSACTION LIST FILTERS ===
+# Every filter combination starts with project_id, so each query is served by
+# one of the (project_id, <column>, transaction_date) composite indexes.
+
+TRANSACTION_FACETS = {
+    IncomeTransaction: ('category_id', 'account_id'),
+    ExpenseTransaction: ('category_id', 'account_id', 'phase', 'is_salary', 'is_direct_cost')
+}
+
+
+def _parse_date_arg(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _parse_flag_arg(value):
+    return {'1': True, '0': False}.get(value)
+
+
+def parse_transaction_filters(model, args):
+    """Read list filters from request args; empty or invalid values are ignored"""
+    filters = {
+        'start_date': _parse_date_arg(args.get('start_date')),
+        'end_date': _parse_date_arg(args.get('end_date')),
+        'category_id': args.get('category_id', type=int),
+        'account_id': args.get('account_id', type=int),
+        'min_amount': args.get('min_amount', type=float),
+        'max_amount': args.get('max_amount', type=float)
+    }
+    if model is ExpenseTransaction:
+        phase = args.get('phase')
+        filters['phase'] = phase if phase in ('building', 'operating') else None
+        filters['is_salary'] = _parse_flag_arg(args.get('is_salary'))
+        filters['is_direct_cost'] = _parse_flag_arg(args.get('is_direct_cost'))
+    return filters
+
+
+def transaction_filter_conditions(model, project_id, filters):
+    """SQL conditions for the given project and parsed filters"""
+    conditions = [model.project_id == project_id]
+
+    if filters['start_date']:
+        conditions.append(model.transaction_date >= filters['start_date'])
+    if filters['end_date']:
+        conditions.append(model.transaction_date <= filters['end_date'])
+    if filters['min_amount'] is not None:
+        conditions.append(model.amount >= filters['min_amount'])
+    if filters['max_amount'] is not None:
+        conditions.append(model.amount <= filters['max_amount'])
+
+    for name in TRANSACTION_FACETS[model]:
+        value = filters.get(name)
+        if value is not None:
+            conditions.append(column_matches(getattr(model, name), value))
+
+    return conditions
+
+
+def get_transaction_facets(model, conditions, project_id=None):
+    """
+    Facet counts/amounts per value and filtered totals, from one query
+    grouped by every facet column and rolled up in Python. Amounts are in the
+    project's base currency when its accounts mix currencies.
+    """
+    names = TRANSACTION_FACETS[model]
+    columns = [getattr(model, name) for name in names]
+
+    currency = conversion_target(project_id)
+    amount = model.amount
+    if currency:
+        amount = converted(model.amount, Account.currency, model.transaction_date, currency)
+
+    query = db.session.query(
+        *columns,
+        func.count(model.id),
+        func.sum(amount)
+    )
+    if currency:
+        query = query.join(Account, Account.id == model.account_id)
+    rows = query.filter(*conditions).group_by(*columns).all()
+
+    facets = {name: {} for name in names}
+    total_count, total_amount = 0, 0.0
+    for row in rows:
+        count, amount = row[-2], float(row[-1] or 0)
+        total_count += count
+        total_amount += amount
+        for name, value in zip(names, row):
+            entry = facets[name].setdefault(value, {'count': 0, 'amount': 0.0})
+            entry['count'] += count
+            entry['amount'] += amount
+
+    return {'facets': facets, 'count': total_count, 'amount': total_amount}
+
+
+def get_filtered_transactions(model, conditions, page, per_page):
+    """One page of filtered transactions, newest first"""
+    return model.query.filter(*conditions)\
+        .options(joinedload(model.category), joinedload(model.account))\
+        .order_by(model.transaction_date.desc(), model.id.desc())\
+        .limit(per_page).offset((page - 1) * per_page).all()
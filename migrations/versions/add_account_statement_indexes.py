@@ -0,0 +1,35 @@
+"""Add account_id indexes used by the account statement
+
+Revision ID: account_statement_idx
+Revises: add_loans_enhanced
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'account_statement_idx'
+down_revision = 'add_loans_enhanced'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_income_transactions_account_id', 'income_transactions'),
+    ('ix_expense_transactions_account_id', 'expense_transactions'),
+    ('ix_debts_account_id', 'debts'),
+    ('ix_debt_payments_account_id', 'debt_payments'),
+    ('ix_loans_account_id', 'loans'),
+    ('ix_loan_payments_account_id', 'loan_payments'),
+]
+
+
+def upgrade():
+    for index_name, table in INDEXES:
+        op.create_index(index_name, table, ['account_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for index_name, table in INDEXES:
+        op.drop_index(index_name, table_name=table, if_exists=True)
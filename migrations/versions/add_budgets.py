@@ -0,0 +1,35 @@
+"""Add monthly category budgets
+
+Revision ID: add_budgets
+Revises: add_multi_currency
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_budgets'
+down_revision = 'add_multi_currency'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('budgets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['expense_categories.id'], ),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'month', 'category_id', name='uq_budgets_project_month_category')
+    )
+
+
+def downgrade():
+    op.drop_table('budgets')
@@ -0,0 +1,43 @@
+"""Add change_log and consumer checkpoints
+
+Revision ID: add_change_log
+Revises: add_kpi_snapshots
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_change_log'
+down_revision = 'add_kpi_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_log',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=50), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=10), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('account_id', sa.Integer(), nullable=True),
+        sa.Column('old_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('new_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('txn_date', sa.Date(), nullable=True),
+        sa.Column('changed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True
+    )
+    op.create_table('change_log_checkpoints',
+        sa.Column('consumer', sa.String(length=100), nullable=False),
+        sa.Column('last_seq', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('consumer')
+    )
+
+
+def downgrade():
+    op.drop_table('change_log_checkpoints')
+    op.drop_table('change_log')
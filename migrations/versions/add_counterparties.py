@@ -0,0 +1,52 @@
+"""Add counterparties table linked from debts and loans
+
+Revision ID: add_counterparties
+Revises: add_salary_payment_index
+Create Date: 2026-10-19 00:00:00.000000
+
+Existing debts and loans are linked on the next app start after the upgrade (or with
+`flask backfill-counterparties`), since name normalization runs in Python.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_counterparties'
+down_revision = 'add_salary_payment_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('counterparties',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('name_key', sa.String(length=200), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name_key')
+    )
+
+    with op.batch_alter_table('debts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counterparty_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_debts_counterparty_id', ['counterparty_id'], unique=False)
+        batch_op.create_foreign_key('fk_debts_counterparty_id', 'counterparties', ['counterparty_id'], ['id'])
+
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counterparty_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_loans_counterparty_id', ['counterparty_id'], unique=False)
+        batch_op.create_foreign_key('fk_loans_counterparty_id', 'counterparties', ['counterparty_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_loans_counterparty_id', type_='foreignkey')
+        batch_op.drop_index('ix_loans_counterparty_id')
+        batch_op.drop_column('counterparty_id')
+
+    with op.batch_alter_table('debts', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_debts_counterparty_id', type_='foreignkey')
+        batch_op.drop_index('ix_debts_counterparty_id')
+        batch_op.drop_column('counterparty_id')
+
+    op.drop_table('counterparties')
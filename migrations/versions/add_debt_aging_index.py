@@ -0,0 +1,25 @@
+"""Add composite index for the debt aging report
+
+Revision ID: add_debt_aging_index
+Revises: add_project_data_version
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_debt_aging_index'
+down_revision = 'add_project_data_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_debts_aging', 'debts',
+                    ['project_id', 'debt_type', 'is_paid', 'due_date'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_debts_aging', table_name='debts', if_exists=True)
@@ -0,0 +1,25 @@
+"""Add due-date indexes for the cross-project calendar
+
+Revision ID: add_due_date_indexes
+Revises: add_debt_aging_index
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_due_date_indexes'
+down_revision = 'add_debt_aging_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_debts_due', 'debts', ['is_paid', 'due_date'], unique=False, if_not_exists=True)
+    op.create_index('ix_loans_due', 'loans', ['is_paid', 'due_date'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_loans_due', table_name='loans', if_exists=True)
+    op.drop_index('ix_debts_due', table_name='debts', if_exists=True)
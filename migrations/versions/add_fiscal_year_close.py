@@ -0,0 +1,98 @@
+"""Add fiscal-year closes, closing totals and transaction archive tables
+
+Revision ID: add_fiscal_year_close
+Revises: add_change_log
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_fiscal_year_close'
+down_revision = 'add_change_log'
+branch_labels = None
+depends_on = None
+
+
+def _transaction_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('account_id', sa.Integer(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('transaction_date', sa.Date(), nullable=True),
+    ]
+
+
+def upgrade():
+    op.create_table('fiscal_year_closes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('fiscal_year', sa.Integer(), nullable=False),
+        sa.Column('income_total', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('expense_total', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('archived_rows', sa.Integer(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'fiscal_year', name='uq_fiscal_year_closes_project_year')
+    )
+    op.create_table('closing_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('fiscal_year', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('phase', sa.String(length=20), nullable=True),
+        sa.Column('is_direct_cost', sa.Boolean(), nullable=True),
+        sa.Column('is_salary', sa.Boolean(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_closing_totals_project_kind', 'closing_totals',
+                    ['project_id', 'kind', 'fiscal_year'], unique=False)
+    op.create_index('ix_closing_totals_account', 'closing_totals',
+                    ['account_id', 'kind'], unique=False)
+
+    op.create_table('income_transactions_archive',
+        *_transaction_columns(),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('fiscal_year', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_income_transactions_archive_project_year', 'income_transactions_archive',
+                    ['project_id', 'fiscal_year'], unique=False)
+
+    op.create_table('expense_transactions_archive',
+        *_transaction_columns(),
+        sa.Column('phase', sa.String(length=20), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('is_salary', sa.Boolean(), nullable=True),
+        sa.Column('is_direct_cost', sa.Boolean(), nullable=True),
+        sa.Column('employee_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('fiscal_year', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_expense_transactions_archive_project_year', 'expense_transactions_archive',
+                    ['project_id', 'fiscal_year'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_expense_transactions_archive_project_year', table_name='expense_transactions_archive')
+    op.drop_table('expense_transactions_archive')
+    op.drop_index('ix_income_transactions_archive_project_year', table_name='income_transactions_archive')
+    op.drop_table('income_transactions_archive')
+    op.drop_index('ix_closing_totals_account', table_name='closing_totals')
+    op.drop_index('ix_closing_totals_project_kind', table_name='closing_totals')
+    op.drop_table('closing_totals')
+    op.drop_table('fiscal_year_closes')
@@ -0,0 +1,39 @@
+"""Add kpi_snapshots for historical KPI trends
+
+Revision ID: add_kpi_snapshots
+Revises: add_report_results
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_kpi_snapshots'
+down_revision = 'add_report_results'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kpi_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('data_version', sa.Integer(), nullable=False),
+        sa.Column('burn_rate', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('total_cash', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('runway_months', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('gross_margin_pct', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('net_margin_pct', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('roi_pct', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('operating_cost_ratio', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'snapshot_date', name='uq_kpi_snapshots_project_date')
+    )
+
+
+def downgrade():
+    op.drop_table('kpi_snapshots')
@@ -0,0 +1,42 @@
+"""Add account currency and dated exchange rates
+
+Revision ID: add_multi_currency
+Revises: add_period_locks
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_multi_currency'
+down_revision = 'add_period_locks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='EGP'))
+
+    # Existing accounts hold the configured base currency
+    op.execute("""
+        UPDATE accounts
+        SET currency = COALESCE((SELECT setting_value FROM system_settings WHERE setting_key = 'currency'), 'EGP')
+    """)
+
+    op.create_table('exchange_rates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate_date', sa.Date(), nullable=False),
+        sa.Column('rate', sa.Numeric(precision=18, scale=6), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('currency', 'rate_date', name='uq_exchange_rates_currency_date')
+    )
+
+
+def downgrade():
+    op.drop_table('exchange_rates')
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.drop_column('currency')
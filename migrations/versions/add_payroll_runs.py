@@ -0,0 +1,47 @@
+"""Add payroll_runs table and salary_payments.payroll_run_id
+
+Revision ID: add_payroll_runs
+Revises: add_due_date_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_payroll_runs'
+down_revision = 'add_due_date_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payroll_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('payment_date', sa.Date(), nullable=False),
+        sa.Column('employee_count', sa.Integer(), nullable=False),
+        sa.Column('total_net', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payroll_runs_project_id', 'payroll_runs', ['project_id'], unique=False)
+
+    with op.batch_alter_table('salary_payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payroll_run_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_salary_payments_payroll_run_id', ['payroll_run_id'], unique=False)
+        batch_op.create_foreign_key('fk_salary_payments_payroll_run_id', 'payroll_runs', ['payroll_run_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('salary_payments', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_salary_payments_payroll_run_id', type_='foreignkey')
+        batch_op.drop_index('ix_salary_payments_payroll_run_id')
+        batch_op.drop_column('payroll_run_id')
+
+    op.drop_index('ix_payroll_runs_project_id', table_name='payroll_runs')
+    op.drop_table('payroll_runs')
@@ -0,0 +1,51 @@
+"""Add period locks and frozen period totals
+
+Revision ID: add_period_locks
+Revises: add_fiscal_year_close
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_period_locks'
+down_revision = 'add_fiscal_year_close'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('period_locks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'period_start', name='uq_period_locks_project_period')
+    )
+    op.create_table('period_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('phase', sa.String(length=20), nullable=True),
+        sa.Column('is_direct_cost', sa.Boolean(), nullable=True),
+        sa.Column('is_salary', sa.Boolean(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_period_totals_project_kind', 'period_totals',
+                    ['project_id', 'kind', 'period_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_period_totals_project_kind', table_name='period_totals')
+    op.drop_table('period_totals')
+    op.drop_table('period_locks')
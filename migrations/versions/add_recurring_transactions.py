@@ -0,0 +1,57 @@
+"""Add recurring income/expense templates and their occurrences
+
+Revision ID: add_recurring_transactions
+Revises: add_budgets
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_recurring_transactions'
+down_revision = 'add_budgets'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recurring_transactions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('frequency', sa.String(length=20), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('next_date', sa.Date(), nullable=True),
+        sa.Column('phase', sa.String(length=20), nullable=True),
+        sa.Column('is_direct_cost', sa.Boolean(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_recurring_due', 'recurring_transactions',
+                    ['is_active', 'next_date'], unique=False)
+    op.create_table('recurring_occurrences',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recurring_id', sa.Integer(), nullable=False),
+        sa.Column('occurrence_date', sa.Date(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['recurring_id'], ['recurring_transactions.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('recurring_id', 'occurrence_date', name='uq_recurring_occurrences_date')
+    )
+
+
+def downgrade():
+    op.drop_table('recurring_occurrences')
+    op.drop_index('ix_recurring_due', table_name='recurring_transactions')
+    op.drop_table('recurring_transactions')
@@ -0,0 +1,34 @@
+"""Add report_results for asynchronously computed reports
+
+Revision ID: add_report_results
+Revises: add_transaction_filter_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_report_results'
+down_revision = 'add_transaction_filter_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_results',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('report_type', sa.String(length=30), nullable=False),
+        sa.Column('params_key', sa.String(length=50), nullable=False, server_default=''),
+        sa.Column('data_version', sa.Integer(), nullable=False),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'report_type', name='uq_report_results_project_report')
+    )
+
+
+def downgrade():
+    op.drop_table('report_results')
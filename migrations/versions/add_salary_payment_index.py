@@ -0,0 +1,24 @@
+"""Add salary_payments (employee_id, payment_date) index for payroll analytics
+
+Revision ID: add_salary_payment_index
+Revises: add_payroll_runs
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_salary_payment_index'
+down_revision = 'add_payroll_runs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_salary_payments_employee_date', 'salary_payments',
+                    ['employee_id', 'payment_date'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_salary_payments_employee_date', table_name='salary_payments')
@@ -0,0 +1,40 @@
+"""Make income and expense ids AUTOINCREMENT
+
+Revision ID: add_transaction_autoincrement
+Revises: rekey_counterparties
+Create Date: 2026-10-19 00:00:00.000000
+
+Closing a fiscal year moves rows into the archive tables; without
+AUTOINCREMENT SQLite may hand their ids out again, and reopening the year
+then collides. The sequence starts above every detail and archived id.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_transaction_autoincrement'
+down_revision = 'rekey_counterparties'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('income_transactions', 'expense_transactions')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+        op.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) "
+            f"SELECT '{table}', max(id) FROM (SELECT id FROM {table} "
+            f"UNION ALL SELECT id FROM {table}_archive) HAVING max(id) IS NOT NULL"
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -0,0 +1,37 @@
+"""Add composite indexes for filtered income/expense lists
+
+Revision ID: add_transaction_filter_indexes
+Revises: add_counterparties
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_transaction_filter_indexes'
+down_revision = 'add_counterparties'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_income_project_date', 'income_transactions', ['project_id', 'transaction_date']),
+    ('ix_income_project_category', 'income_transactions', ['project_id', 'category_id', 'transaction_date']),
+    ('ix_income_project_account', 'income_transactions', ['project_id', 'account_id', 'transaction_date']),
+    ('ix_expense_project_date', 'expense_transactions', ['project_id', 'transaction_date']),
+    ('ix_expense_project_category', 'expense_transactions', ['project_id', 'category_id', 'transaction_date']),
+    ('ix_expense_project_account', 'expense_transactions', ['project_id', 'account_id', 'transaction_date']),
+    ('ix_expense_project_phase', 'expense_transactions', ['project_id', 'phase', 'is_direct_cost', 'transaction_date']),
+    ('ix_expense_project_salary', 'expense_transactions', ['project_id', 'is_salary', 'transaction_date']),
+]
+
+
+def upgrade():
+    for index_name, table, columns in INDEXES:
+        op.create_index(index_name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for index_name, table, columns in INDEXES:
+        op.drop_index(index_name, table_name=table, if_exists=True)
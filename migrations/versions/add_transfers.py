@@ -0,0 +1,40 @@
+"""Add transfers between accounts
+
+Revision ID: add_transfers
+Revises: add_recurring_transactions
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_transfers'
+down_revision = 'add_recurring_transactions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('transfers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('from_account_id', sa.Integer(), nullable=False),
+        sa.Column('to_account_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('transfer_date', sa.Date(), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['from_account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['to_account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_transfers_from_account_id', 'transfers', ['from_account_id'], unique=False)
+    op.create_index('ix_transfers_to_account_id', 'transfers', ['to_account_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transfers_to_account_id', table_name='transfers')
+    op.drop_index('ix_transfers_from_account_id', table_name='transfers')
+    op.drop_table('transfers')
@@ -0,0 +1,31 @@
+"""Rebuild counterparties with the narrower name key
+
+Revision ID: rekey_counterparties
+Revises: add_transfers
+Create Date: 2026-10-19 00:00:00.000000
+
+The name key no longer drops the definite article, so counterparties merged
+under the old key are unlinked and removed here. Debts and loans are linked
+again on the next app start after the upgrade (or with
+`flask backfill-counterparties`), since the key is computed in Python.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'rekey_counterparties'
+down_revision = 'add_transfers'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('UPDATE debts SET counterparty_id = NULL')
+    op.execute('UPDATE loans SET counterparty_id = NULL')
+    op.execute('DELETE FROM counterparties')
+
+
+def downgrade():
+    # Links are rebuilt on the next app start with whichever key is in use
+    op.execute('UPDATE debts SET counterparty_id = NULL')
+    op.execute('UPDATE loans SET counterparty_id = NULL')
+    op.execute('DELETE FROM counterparties')
@@ -17,7 +17,8 @@ if project_home not in sys.path:
 os.environ['FLASK_ENV'] = 'production'
 
 # Import create_app from your app package
-from app import create_app
+from app import create_app, start_job_workers
 
 # Create the application instance
 application = create_app('production')
+start_job_workers(application)
@@ -2,10 +2,11 @@
 """
 Local development server for Shalabi Verse Financial System
 """
-from app import create_app
+from app import create_app, start_job_workers
 
 if __name__ == '__main__':
     app = create_app('development')
+    start_job_workers(app)
     print("\n" + "="*60)
     print("Shalabi Verse Financial Management System")
     print("Starting development server...")
@@ -9,7 +9,8 @@ if project_home not in sys.path:
 # Set environment to production
 os.environ['FLASK_ENV'] = 'production'
 
-from app import create_app
+from app import create_app, start_job_workers
 
 # Create application instance
 application = create_app('production')
+start_job_workers(application)